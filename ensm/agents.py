@@ -1,7 +1,65 @@
 from collections import defaultdict
 from typing import Dict, Set
 import numpy as np
-import random
+import hashlib
+
+
+class FrequencyDistribution(object):
+    """
+    Distribution of the initial frequencies of the sub-populations. The frequencies of each space (the norms
+    of a context, or the actions of a context with a norm) are either integer weights drawn uniformly from
+    [low, high] and normalised to sum up to 1, or drawn from a symmetric Dirichlet distribution
+    """
+
+    DISTRIBUTIONS = ("uniform", "dirichlet")
+
+    def __init__(
+        self,
+        distribution: str = "uniform",
+        low: int = 70,
+        high: int = 100,
+        alpha: float = 1.0,
+    ):
+        """
+        Creates a distribution of initial frequencies
+        :param distribution: 'uniform' or 'dirichlet'
+        :param low: lowest weight of the uniform distribution
+        :param high: highest weight of the uniform distribution
+        :param alpha: concentration of the Dirichlet distribution
+        """
+        assert (
+            distribution in FrequencyDistribution.DISTRIBUTIONS
+        ), f"Unknown distribution of initial frequencies {distribution}"
+        assert 0 < low <= high, f"Invalid range of uniform weights [{low}, {high}]"
+        assert alpha > 0, f"Invalid Dirichlet concentration {alpha}"
+
+        self._distribution = distribution
+        self._low = low
+        self._high = high
+        self._alpha = alpha
+
+    def draw(self, rng: np.random.Generator, sizes: list):
+        """
+        Draws the frequencies of several spaces at once
+        :param rng: random number generator
+        :param sizes: list with the size of each space
+        :return: flat array with the frequencies of each space, one after the other
+        """
+        sizes = np.asarray(sizes, dtype=np.int64)
+        if self._distribution == "uniform":
+            weights = rng.integers(
+                self._low, self._high, size=int(sizes.sum()), endpoint=True
+            ).astype(np.float64)
+        else:
+            # Normalised independent gamma variates are Dirichlet distributed
+            weights = rng.standard_gamma(self._alpha, size=int(sizes.sum()))
+
+        offsets = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        return weights / np.repeat(np.add.reduceat(weights, offsets), sizes)
+
+    @property
+    def distribution(self):
+        return self._distribution
 
 
 class AgentSubPopulation(object):
@@ -15,6 +73,8 @@ class AgentSubPopulation(object):
         payoffs: dict,
         action_spaces: Dict[str, Set],
         norm_spaces: Dict[str, Set],
+        rng: np.random.Generator = None,
+        distribution: FrequencyDistribution = None,
     ):
         """
         Initialises an agent sub-population with a given frequency, a dictionary of payoffs for each triplet
@@ -25,24 +85,37 @@ class AgentSubPopulation(object):
         :param proportion: proportion of agents with the profile in a MAS
         :param payoffs: base payoff that an agent expects to obtain when playing a particular role of a game and
         a given combination of actions is played by all the players of the game (including the agent itself).
-        This variable should be a dictionary of (game, role, action_combination) -> player payoff
+        This variable should be a dictionary of game -> PayoffTable of action_combination -> payoff of each role
         :param action_spaces: dictionary of agent contexts to the sets of actions that can be performed in them
         :param norm_spaces: dictionary of agent contexts to their applicable norms
+        :param rng: random number generator of the initial frequencies (None for a generator seeded with fresh
+        entropy from the operating system)
+        :param distribution: FrequencyDistribution of the initial frequencies (None for integer weights drawn
+        uniformly from [70, 100])
         """
         self._name = name
         self._proportion = proportion
         self._payoffs = payoffs
+        self._payoff_profile = None
+
+        # Draw the initial frequencies of the norms of each context and of the actions of each context with
+        # each norm at once, in this order
+        rng = rng if rng is not None else np.random.default_rng()
+        distribution = distribution or FrequencyDistribution()
+        norms_lists = {c: list(norm_spaces[c]) for c in norm_spaces}
+        actions_lists = {c: list(action_spaces[c]) for c in norm_spaces}
+        sizes = [len(norms_lists[c]) for c in norm_spaces] + [
+            len(actions_lists[c]) for c in norm_spaces for _ in norms_lists[c]
+        ]
+        freqs = iter(
+            np.split(distribution.draw(rng=rng, sizes=sizes), np.cumsum(sizes)[:-1])
+        )
 
         # Frequencies of each norm in each possible context that the sub-population may encounter in all games.
         # This data structure is of the form: context -> norm -> frequency
         self._norm_freqs = defaultdict(lambda: defaultdict(np.float64))
         for context in norm_spaces:
-            norms_list = list(norm_spaces[context])
-            norm_freqs = [random.randint(70, 100) for _ in norms_list]
-            for i in range(len(norms_list)):
-                self._norm_freqs[context][norms_list[i]] = np.float64(
-                    norm_freqs[i] / sum(norm_freqs)
-                )
+            self._norm_freqs[context].update(zip(norms_lists[context], next(freqs)))
 
         # Split of the sub-population by norms, where each sub-sub-population has a different norm for
         # each context they may encounter in the MAS, and hence, may have different frequencies for each
@@ -52,14 +125,10 @@ class AgentSubPopulation(object):
             lambda: defaultdict(lambda: defaultdict(np.float64))
         )
         for context in norm_spaces:
-            for norm in norm_spaces[context]:
-
-                actions_list = list(action_spaces[context])
-                action_freqs = [random.randint(70, 100) for _ in actions_list]
-                for i in range(len(actions_list)):
-                    self._action_freqs[context][norm][actions_list[i]] = np.float64(
-                        action_freqs[i] / sum(action_freqs)
-                    )
+            for norm in norms_lists[context]:
+                self._action_freqs[context][norm].update(
+                    zip(actions_lists[context], next(freqs))
+                )
 
         # Fitness (expected average payoff) of the sub-population with a given norm when it repeatedly
         # interacts in a coordination context with other agents from its same sub-population and
@@ -78,6 +147,28 @@ class AgentSubPopulation(object):
     def payoff(self):
         return self._payoffs
 
+    @property
+    def payoff_profile(self):
+        """
+        Returns a hashable key that identifies the payoffs of the sub-population, so that sub-populations with
+        identical payoffs in every game (no matter their proportion or frequencies) have the same profile
+        """
+        if self._payoff_profile is None:
+            self._payoff_profile = tuple(
+                sorted(
+                    (
+                        game.name,
+                        repr(table.action_spaces),
+                        table.array.shape,
+                        hashlib.sha1(
+                            np.ascontiguousarray(table.array, dtype=np.float64)
+                        ).hexdigest(),
+                    )
+                    for game, table in self._payoffs.items()
+                )
+            )
+        return self._payoff_profile
+
     @property
     def norm_freqs(self):
         """ Returns dictionary of the form context -> norm -> frequency """
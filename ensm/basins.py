@@ -0,0 +1,211 @@
+from ensm.ensm import ENSM
+from typing import Callable
+import numpy as np
+
+
+class Attractor(object):
+    """ An attractor of the evolutionary dynamics, found by running the ENSM from some initial condition """
+
+    def __init__(self, label: int, state: np.ndarray, summary: dict):
+        """
+        Creates an attractor
+        :param label: integer identifier of the attractor
+        :param state: state vector of the ENSM once it converged to the attractor
+        :param summary: dictionary of context -> dominant action in the attractor
+        """
+        self._label = label
+        self._state = state
+        self._summary = summary
+        self._num_samples = 0
+        self._total_generations = 0
+
+    def add_sample(self, num_generations: int):
+        """
+        Keeps track of a new initial condition that ended up in the basin of the attractor
+        :param num_generations: number of generations that the sample evolved before being labelled
+        """
+        self._num_samples += 1
+        self._total_generations += num_generations
+
+    @property
+    def label(self):
+        return self._label
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def summary(self):
+        return self._summary
+
+    @property
+    def num_samples(self):
+        return self._num_samples
+
+    @property
+    def mean_generations(self):
+        if self._num_samples == 0:
+            return 0.0
+        return self._total_generations / self._num_samples
+
+    def __str__(self):
+        return "{}: {} ({} samples)".format(
+            self._label, self._summary, self._num_samples
+        )
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class AttractorRegistry(object):
+    """ Registry of the attractors found so far, which can be queried for the attractor near a given state """
+
+    def __init__(self, radius: float):
+        """
+        Creates an empty registry of attractors
+        :param radius: maximum distance (in max-norm) between a state and an attractor for the state to be
+        considered within the neighbourhood of the attractor
+        """
+        self._radius = radius
+        self._attractors = []
+        self._states = None
+
+    def match(self, state: np.ndarray):
+        """
+        Returns the attractor whose neighbourhood contains a given state, if any
+        :param state: state vector of an ENSM
+        :return: the nearest Attractor within the registry radius, or None if there is no such attractor
+        """
+        if not self._attractors:
+            return None
+
+        # Compare the state with all known attractors at once and keep the nearest one
+        distances = np.max(
+            np.abs(self._states[: len(self._attractors)] - state), axis=1
+        )
+        nearest = int(np.argmin(distances))
+        if distances[nearest] > self._radius:
+            return None
+
+        return self._attractors[nearest]
+
+    def register(self, state: np.ndarray, summary: dict):
+        """
+        Adds a new attractor to the registry
+        :param state: state vector of an ENSM that converged to the attractor
+        :param summary: dictionary of context -> dominant action in the attractor
+        :return: the new Attractor
+        """
+        attractor = Attractor(label=len(self._attractors), state=state, summary=summary)
+
+        # Grow the array of attractor states geometrically to keep registration amortised
+        if self._states is None:
+            self._states = np.empty((8, state.size), dtype=np.float64)
+        elif len(self._attractors) == self._states.shape[0]:
+            self._states = np.concatenate([self._states, np.empty_like(self._states)])
+
+        self._states[len(self._attractors)] = state
+        self._attractors.append(attractor)
+
+        return attractor
+
+    @property
+    def attractors(self):
+        return list(self._attractors)
+
+
+class BasinMapper(object):
+    """
+    Maps the basins of attraction of the evolutionary dynamics by running the ENSM from many different
+    initial conditions, and labelling each of them with the attractor that they end up in
+    """
+
+    # Label of the samples that did not reach any attractor before timing out
+    UNRESOLVED = -1
+
+    # Label of the samples whose dynamics were found to cycle
+    CYCLING = -2
+
+    def __init__(
+        self,
+        ensm_factory: Callable[[], ENSM],
+        radius: float = 1e-3,
+        batch_size: int = 64,
+        check_interval: int = 1,
+    ):
+        """
+        Creates a basin mapper
+        :param ensm_factory: function that creates a new ENSM with (randomly) initialised sub-populations
+        :param radius: radius of the neighbourhood of each attractor. A trajectory is stopped as soon as it
+        enters the neighbourhood of a known attractor, instead of running until convergence
+        :param batch_size: number of trajectories that are evolved together
+        :param check_interval: number of generations between two checks of the known attractors
+        """
+        self._ensm_factory = ensm_factory
+        self._registry = AttractorRegistry(radius=radius)
+        self._batch_size = batch_size
+        self._check_interval = check_interval
+
+    def map(self, num_samples: int):
+        """
+        Runs the ENSM from a number of initial conditions and labels each of them with its attractor
+        :param num_samples: number of initial conditions to sample
+        :return: tuple (initial_states, labels, num_generations), where initial_states is an array with the
+        initial state vector of each sample, labels is an array with the label of the attractor of each sample
+        (or UNRESOLVED/CYCLING), and num_generations is the number of generations that each sample evolved for
+        """
+        initial_states = None
+        labels = np.full(num_samples, self.UNRESOLVED, dtype=np.int64)
+        num_generations = np.zeros(num_samples, dtype=np.int64)
+
+        for start in range(0, num_samples, self._batch_size):
+            batch = []
+            for sample in range(start, min(start + self._batch_size, num_samples)):
+                ensm = self._ensm_factory()
+                state = ensm.state_vector()
+                if initial_states is None:
+                    initial_states = np.empty((num_samples, state.size), np.float64)
+                initial_states[sample] = state
+                batch.append((sample, ensm))
+
+            # Evolve all the trajectories of the batch in lockstep, dropping each of them as soon as
+            # it is labelled with an attractor or it times out
+            while batch:
+                running = []
+                for sample, ensm in batch:
+                    ensm.evolve()
+
+                    attractor = None
+                    if (
+                        ensm.converged
+                        or ensm.num_generations % self._check_interval == 0
+                    ):
+                        state = ensm.state_vector()
+                        attractor = self._registry.match(state)
+
+                        if attractor is None and ensm.converged:
+                            attractor = self._registry.register(
+                                state=state, summary=ensm.dominant_actions()
+                            )
+
+                    if attractor is not None:
+                        attractor.add_sample(ensm.num_generations)
+                        labels[sample] = attractor.label
+                        num_generations[sample] = ensm.num_generations
+                    elif ensm.cycling:
+                        labels[sample] = self.CYCLING
+                        num_generations[sample] = ensm.num_generations
+                    elif ensm.timed_out:
+                        num_generations[sample] = ensm.num_generations
+                    else:
+                        running.append((sample, ensm))
+
+                batch = running
+
+        return initial_states, labels, num_generations
+
+    @property
+    def attractors(self):
+        """ Returns the list of attractors found so far """
+        return self._registry.attractors
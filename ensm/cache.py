@@ -0,0 +1,214 @@
+from collections.abc import Mapping
+from ast import literal_eval
+import ensm
+import hashlib
+import sqlite3
+import pickle
+import json
+import time
+import os
+
+
+class ResultCache(object):
+    """
+    Local store of the results of previous runs, addressed by a hash of their normalised configuration, their
+    seed and the version of the engine. The store is an SQLite database, so that several worker processes can
+    safely share it, and it evicts the least recently used results once it exceeds a maximum size
+    """
+
+    def __init__(self, path: str, max_size: int = 1 << 30, timeout: float = 60.0):
+        """
+        Opens (or creates) a result store
+        :param path: path of the database file
+        :param max_size: maximum total size (in bytes) of the stored results
+        :param timeout: seconds to wait for other processes to release the database
+        """
+        self._path = path
+        self._max_size = max_size
+        self._timeout = timeout
+
+        # Number of lookups that found (hits) or did not find (misses) a result
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, size INTEGER, last_access REAL, payload BLOB)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)"
+            )
+
+    def _connect(self, write: bool = True):
+        """
+        Opens a connection to the database in one transaction
+        :param write: whether the transaction writes to the database. Writers take the write lock when the
+        transaction begins, whereas readers read a snapshot without waiting for the writers
+        :return: a _Transaction with the connection
+        """
+        connection = sqlite3.connect(
+            self._path, timeout=self._timeout, isolation_level=None
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        return _Transaction(connection, mode="IMMEDIATE" if write else "DEFERRED")
+
+    @staticmethod
+    def key(config: dict, seed: int = None, initial_state: dict = None):
+        """
+        Computes the key of a run
+        :param config: configuration of the run
+        :param seed: seed of the run
+        :param initial_state: state that the run was seeded with (see ENSM.warm_start)
+        :return: hexadecimal digest of the normalised configuration (ignoring the descriptive name of the MAS),
+        the seed, the initial state and the version of the engine
+        """
+        content = json.dumps(
+            {
+                "config": _normalise({k: v for k, v in config.items() if k != "name"}),
+                "seed": seed,
+                "initial_state": initial_state,
+                "engine": ensm.__version__,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def get(self, key: str):
+        """
+        Returns the stored result of a run, refreshing its last access time
+        :param key: key of the run
+        :return: the stored result, or None if the run is not stored
+        """
+        with self._connect(write=False) as connection:
+            row = connection.execute(
+                "SELECT payload FROM results WHERE key = ?", (key,)
+            ).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        # Only hits take the write lock, to refresh the last access time that evictions are based on
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key),
+            )
+
+        self.hits += 1
+        return pickle.loads(row[0])
+
+    def put(self, key: str, result):
+        """
+        Stores the result of a run, evicting the least recently used results if the store gets too large
+        :param key: key of the run
+        :param result: result of the run (any picklable object)
+        """
+        payload = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                (key, len(payload), time.time(), payload),
+            )
+
+            total_size = connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()[0]
+            rows = connection.execute(
+                "SELECT key, size FROM results ORDER BY last_access"
+            )
+            evicted = []
+            for old_key, size in rows:
+                if total_size <= self._max_size:
+                    break
+                if old_key != key:
+                    evicted.append((old_key,))
+                    total_size -= size
+
+            connection.executemany("DELETE FROM results WHERE key = ?", evicted)
+
+    def __len__(self):
+        with self._connect(write=False) as connection:
+            return connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    @property
+    def path(self):
+        return self._path
+
+
+class _Transaction(object):
+    """
+    Context manager that runs the statements of a connection in one transaction, either immediate (write-locked
+    from the start) or deferred (reading a snapshot until its first write)
+    """
+
+    def __init__(self, connection: sqlite3.Connection, mode: str = "IMMEDIATE"):
+        self._connection = connection
+        self._mode = mode
+
+    def __enter__(self):
+        self._connection.execute(f"BEGIN {self._mode}")
+        return self._connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self._connection.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        finally:
+            self._connection.close()
+
+
+def _normalise(value):
+    """
+    Normalises a configuration so that equivalent configurations have the same representation: mappings are
+    converted to dictionaries, action combinations to their canonical representation, numbers to floats and
+    the files of payoff tables to the digest of their contents
+    :param value: configuration (or part of it)
+    :return: normalised configuration, serialisable as JSON
+    """
+    if isinstance(value, Mapping):
+        if "file" in value:
+            return dict(
+                _normalise({k: v for k, v in value.items() if k != "file"}),
+                file=_file_digest(value["file"]),
+            )
+
+        normalised = {}
+        for k, v in value.items():
+            if isinstance(k, str) and k.startswith("("):
+                k = repr(literal_eval(k))
+            normalised[str(k)] = _normalise(v)
+        return normalised
+
+    if isinstance(value, (list, tuple)):
+        return [_normalise(v) for v in value]
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    return str(value)
+
+
+# Dictionary of (path, modification time, size) -> digest of the contents of the files of payoff tables
+_file_digests = {}
+
+
+def _file_digest(path: str):
+    """
+    Returns the digest of the contents of a file, hashing it only if it changed since it was last hashed
+    :param path: path of the file
+    :return: hexadecimal SHA-256 digest of the file
+    """
+    stat = os.stat(path)
+    file_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if file_key not in _file_digests:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        _file_digests[file_key] = digest.hexdigest()
+
+    return _file_digests[file_key]
@@ -0,0 +1,395 @@
+from collections.abc import Mapping
+from ensm.cache import ResultCache, _Transaction
+from ast import literal_eval
+import sqlite3
+import time
+import os
+
+
+class RunCatalog(object):
+    """
+    Local index of the runs of the ENSM, so that the runs with a given outcome, parameter values or dominant
+    actions and norms can be found without loading their result files. The catalog is an SQLite database with
+    one row per run and indexed tables with the scalar parameters of its configuration and its dominant action
+    (of each sub-population and of the whole population) and dominant norm in each context, so that several
+    worker processes can register their runs in it
+    """
+
+    def __init__(self, path: str, timeout: float = 60.0):
+        """
+        Opens (or creates) a run catalog
+        :param path: path of the database file
+        :param timeout: seconds to wait for other processes to release the database
+        """
+        self._path = path
+        self._timeout = timeout
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT, name TEXT, seed INTEGER, outcome TEXT, "
+                "num_generations INTEGER, cycle_period INTEGER, created REAL, result_path TEXT, "
+                "trajectory_path TEXT)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS parameters ("
+                "run_id INTEGER, name TEXT, number REAL, text TEXT)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS dominant_actions ("
+                "run_id INTEGER, sub_population TEXT, context TEXT, action TEXT)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS dominant_norms ("
+                "run_id INTEGER, context TEXT, norm TEXT)"
+            )
+
+            for statement in [
+                "runs_outcome ON runs (outcome, num_generations)",
+                "runs_key ON runs (key, result_path)",
+                "parameters_number ON parameters (name, number, run_id)",
+                "parameters_text ON parameters (name, text, run_id)",
+                "parameters_run ON parameters (run_id)",
+                "dominant_actions_context ON dominant_actions (context, action, sub_population, run_id)",
+                "dominant_actions_run ON dominant_actions (run_id)",
+                "dominant_norms_context ON dominant_norms (context, norm, run_id)",
+                "dominant_norms_run ON dominant_norms (run_id)",
+            ]:
+                connection.execute(f"CREATE INDEX IF NOT EXISTS {statement}")
+
+    def _connect(self):
+        connection = sqlite3.connect(
+            self._path, timeout=self._timeout, isolation_level=None
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        return _Transaction(connection)
+
+    def register(
+        self,
+        config: dict,
+        result: dict,
+        seed: int = None,
+        initial_state: dict = None,
+        result_path: str = None,
+        trajectory_path: str = None,
+    ):
+        """
+        Registers a run. Registering again a run with the same key (see ResultCache.key) and result path
+        replaces it
+        :param config: configuration of the run
+        :param result: result of the run, with its final 'state' (see ENSM.snapshot) and its 'summary'
+        (see ENSM.summary)
+        :param seed: seed of the run
+        :param initial_state: state that the run was seeded with (see ENSM.warm_start)
+        :param result_path: path of the file where the result of the run is saved
+        :param trajectory_path: path of the file where the trajectory of the run is saved
+        (see TrajectoryHistory.save)
+        :return: id of the run in the catalog
+        """
+        key = ResultCache.key(config=config, seed=seed, initial_state=initial_state)
+        summary = result["summary"]
+
+        parameters = []
+        for name, value in flatten(config):
+            if isinstance(value, (bool, int, float)):
+                parameters.append((name, float(value), None))
+            else:
+                parameters.append((name, None, str(value)))
+
+        dominant_actions = [
+            (None, context, action)
+            for context, action in summary["dominant_actions"].items()
+        ] + [
+            (sub_population, context, action)
+            for sub_population, contexts in _dominant_actions(result["state"]).items()
+            for context, action in contexts.items()
+        ]
+
+        with self._connect() as connection:
+            old_ids = [
+                (run_id,)
+                for run_id, in connection.execute(
+                    "SELECT id FROM runs WHERE key = ? AND result_path IS ?",
+                    (key, result_path),
+                )
+            ]
+            for table, column in [
+                ("runs", "id"),
+                ("parameters", "run_id"),
+                ("dominant_actions", "run_id"),
+                ("dominant_norms", "run_id"),
+            ]:
+                connection.executemany(
+                    f"DELETE FROM {table} WHERE {column} = ?", old_ids
+                )
+
+            run_id = connection.execute(
+                "INSERT INTO runs (key, name, seed, outcome, num_generations, cycle_period, created, "
+                "result_path, trajectory_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    config.get("name"),
+                    seed,
+                    summary["outcome"],
+                    summary["num_generations"],
+                    summary["cycle_period"],
+                    time.time(),
+                    result_path,
+                    trajectory_path,
+                ),
+            ).lastrowid
+
+            connection.executemany(
+                "INSERT INTO parameters VALUES (?, ?, ?, ?)",
+                [(run_id,) + parameter for parameter in parameters],
+            )
+            connection.executemany(
+                "INSERT INTO dominant_actions VALUES (?, ?, ?, ?)",
+                [(run_id,) + dominant for dominant in dominant_actions],
+            )
+            connection.executemany(
+                "INSERT INTO dominant_norms VALUES (?, ?, ?)",
+                [
+                    (run_id, context, norm)
+                    for context, norm in summary["dominant_norms"].items()
+                ],
+            )
+
+        return run_id
+
+    def query(
+        self,
+        outcome: str = None,
+        min_generations: int = None,
+        max_generations: int = None,
+        parameters: dict = None,
+        dominant_actions: list = None,
+        dominant_norms: list = None,
+        limit: int = None,
+    ):
+        """
+        Finds the runs that match all the given conditions. For example, the runs in which the prudent
+        drivers converged to stop in the intersection context are:
+
+            catalog.query(outcome='converged', dominant_actions=[('prudent', 'intersection', 'stop')])
+
+        :param outcome: outcome of the runs ('converged', 'cycling' or 'timed out')
+        :param min_generations: minimum number of generations of the runs
+        :param max_generations: maximum number of generations of the runs
+        :param parameters: dictionary of dotted path of a configuration parameter (see flatten) -> its value,
+        or a (lowest, highest) tuple with the range of its numeric value
+        :param dominant_actions: list of (sub-population name, context, action), with None as the
+        sub-population name to match the dominant action of the whole population
+        :param dominant_norms: list of (context, norm name)
+        :param limit: maximum number of runs to return (None for all)
+        :return: list of dictionaries with the 'id', 'name', 'seed', 'outcome', 'num_generations', 'result_path'
+        and 'trajectory_path' of each run, newest first
+        """
+        conditions = []
+        arguments = []
+
+        if outcome is not None:
+            conditions.append("outcome = ?")
+            arguments.append(outcome)
+        if min_generations is not None:
+            conditions.append("num_generations >= ?")
+            arguments.append(min_generations)
+        if max_generations is not None:
+            conditions.append("num_generations <= ?")
+            arguments.append(max_generations)
+
+        for name, value in (parameters or {}).items():
+            if isinstance(value, tuple):
+                conditions.append(
+                    "id IN (SELECT run_id FROM parameters WHERE name = ? AND number BETWEEN ? AND ?)"
+                )
+                arguments.extend([name, float(value[0]), float(value[1])])
+            elif isinstance(value, (bool, int, float)):
+                conditions.append(
+                    "id IN (SELECT run_id FROM parameters WHERE name = ? AND number = ?)"
+                )
+                arguments.extend([name, float(value)])
+            else:
+                conditions.append(
+                    "id IN (SELECT run_id FROM parameters WHERE name = ? AND text = ?)"
+                )
+                arguments.extend([name, str(value)])
+
+        for sub_population, context, action in dominant_actions or []:
+            conditions.append(
+                "id IN (SELECT run_id FROM dominant_actions "
+                "WHERE context = ? AND action = ? AND sub_population IS ?)"
+            )
+            arguments.extend([context, action, sub_population])
+
+        for context, norm in dominant_norms or []:
+            conditions.append(
+                "id IN (SELECT run_id FROM dominant_norms WHERE context = ? AND norm IS ?)"
+            )
+            arguments.extend([context, norm])
+
+        statement = (
+            "SELECT id, name, seed, outcome, num_generations, result_path, trajectory_path FROM runs"
+            + (" WHERE " + " AND ".join(conditions) if conditions else "")
+            + " ORDER BY id DESC"
+        )
+        if limit is not None:
+            statement += " LIMIT ?"
+            arguments.append(limit)
+
+        with self._connect() as connection:
+            rows = connection.execute(statement, arguments).fetchall()
+
+        columns = [
+            "id",
+            "name",
+            "seed",
+            "outcome",
+            "num_generations",
+            "result_path",
+            "trajectory_path",
+        ]
+        return [dict(zip(columns, row)) for row in rows]
+
+    def describe(self, run_ids: list):
+        """
+        Returns the details of some runs, to compare them
+        :param run_ids: list of ids of runs
+        :return: list with a dictionary per run (in the given order) with the fields returned by query, the
+        'cycle_period', the 'parameters' (dictionary of dotted path -> value), the 'dominant_actions'
+        (dictionary of sub-population name, or None for the whole population -> context -> action) and the
+        'dominant_norms' (dictionary of context -> norm name)
+        """
+        runs = {}
+        with self._connect() as connection:
+            for run_id in run_ids:
+                row = connection.execute(
+                    "SELECT id, name, seed, outcome, num_generations, result_path, trajectory_path, "
+                    "cycle_period FROM runs WHERE id = ?",
+                    (run_id,),
+                ).fetchone()
+                if row is None:
+                    continue
+
+                run = dict(
+                    zip(
+                        [
+                            "id",
+                            "name",
+                            "seed",
+                            "outcome",
+                            "num_generations",
+                            "result_path",
+                            "trajectory_path",
+                            "cycle_period",
+                        ],
+                        row,
+                    )
+                )
+                run["parameters"] = {
+                    name: number if text is None else text
+                    for name, number, text in connection.execute(
+                        "SELECT name, number, text FROM parameters WHERE run_id = ?",
+                        (run_id,),
+                    )
+                }
+                run["dominant_actions"] = {}
+                for sub_population, context, action in connection.execute(
+                    "SELECT sub_population, context, action FROM dominant_actions WHERE run_id = ?",
+                    (run_id,),
+                ):
+                    run["dominant_actions"].setdefault(sub_population, {})[
+                        context
+                    ] = action
+                run["dominant_norms"] = dict(
+                    connection.execute(
+                        "SELECT context, norm FROM dominant_norms WHERE run_id = ?",
+                        (run_id,),
+                    )
+                )
+                runs[run_id] = run
+
+        return [runs[run_id] for run_id in run_ids if run_id in runs]
+
+    def actions(self):
+        """
+        Returns the actions that are dominant in some run in each context
+        :return: dictionary of context -> sorted list of actions
+        """
+        actions = {}
+        with self._connect() as connection:
+            for context, action in connection.execute(
+                "SELECT DISTINCT context, action FROM dominant_actions ORDER BY context, action"
+            ):
+                actions.setdefault(context, []).append(action)
+        return actions
+
+    def sub_populations(self):
+        """ Returns the sorted names of the sub-populations of the registered runs """
+        with self._connect() as connection:
+            return [
+                name
+                for name, in connection.execute(
+                    "SELECT DISTINCT sub_population FROM dominant_actions "
+                    "WHERE sub_population IS NOT NULL ORDER BY sub_population"
+                )
+            ]
+
+    def __len__(self):
+        with self._connect() as connection:
+            return connection.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    @property
+    def path(self):
+        return self._path
+
+
+def flatten(config, prefix: str = ""):
+    """
+    Lists the scalar parameters of a configuration with their dotted paths, where list items are referenced by
+    their index and action combinations by their canonical tuple representation (the paths accepted by the
+    continuations and sweeps of sense.py, e.g., "population.1.gamePayoffs.0.payoffs.('go', 'stop').0")
+    :param config: configuration (or part of it)
+    :param prefix: dotted path of the configuration
+    :return: list of (dotted path, value)
+    """
+    if isinstance(config, Mapping):
+        items = []
+        for k, v in config.items():
+            if isinstance(k, str) and k.startswith("("):
+                k = repr(literal_eval(k))
+            items.append((str(k), v))
+    elif isinstance(config, (list, tuple)):
+        items = [(str(i), v) for i, v in enumerate(config)]
+    else:
+        return [(prefix, config)] if config is not None else []
+
+    parameters = []
+    for k, v in items:
+        parameters.extend(flatten(v, prefix=f"{prefix}.{k}" if prefix else k))
+    return parameters
+
+
+def _dominant_actions(state: dict):
+    """
+    Returns the action that each sub-population most frequently performs in each context, averaged across norms
+    :param state: state of a run (see ENSM.snapshot)
+    :return: dictionary of sub-population name -> context -> action
+    """
+    dominant_actions = {}
+    for sub_population, contexts in state["action_freqs"].items():
+        for context, norms in contexts.items():
+            action_freqs = {}
+            for norm, freqs in norms.items():
+                for action, freq in freqs.items():
+                    action_freqs[action] = (
+                        action_freqs.get(action, 0.0)
+                        + state["norm_freqs"][context][norm] * freq
+                    )
+            dominant_actions.setdefault(sub_population, {})[context] = max(
+                action_freqs, key=action_freqs.get
+            )
+    return dominant_actions
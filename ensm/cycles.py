@@ -0,0 +1,198 @@
+import numpy as np
+
+
+class CycleDetector(object):
+    """
+    Online detector of periodic and quasi-periodic behaviour of the evolutionary dynamics. The states of the
+    recent generations are kept in a recurrence window, and a cycle is detected when the state keeps returning
+    close to where it was one period ago, after having moved away from it, with a stable period and amplitude.
+
+    The distances of the new state to the states in the window are kept incrementally: by the triangle inequality,
+    the distance of a stored state to the new state is at least its distance to the previous state minus the step
+    between both states. Only the distances whose lower bound is within the tolerance are recomputed, so dynamics
+    that move away from their past states do not scan the whole window every generation
+    """
+
+    # Margin of the lower bounds of the distances, for the rounding of their updates
+    BOUND_MARGIN = 1e-12
+
+    def __init__(
+        self,
+        contexts: list,
+        action_spaces: dict,
+        tolerance: float,
+        window: int = 1000,
+        repetitions: int = 2,
+    ):
+        """
+        Creates a cycle detector
+        :param contexts: list of contexts
+        :param action_spaces: dictionary of context -> actions
+        :param tolerance: maximum distance (in max-norm) between two states for one to be considered a
+        recurrence of the other. It also bounds the change of amplitude between consecutive periods
+        :param window: number of recent generations in which recurrences are searched
+        :param repetitions: number of full periods that the state must keep recurring before a cycle is detected
+        """
+        self._contexts = list(contexts)
+        self._action_spaces = action_spaces
+        self._tolerance = tolerance
+        self._window = window
+        self._repetitions = repetitions
+        self._num_observations = 0
+
+        # Slices of the actions of each context in the mean action frequencies, to compute cycle amplitudes
+        self._context_slices = {}
+        offset = 0
+        for context in self._contexts:
+            num_actions = len(action_spaces[context])
+            self._context_slices[context] = slice(offset, offset + num_actions)
+            offset += num_actions
+
+        # Recurrence window with the states and mean action frequencies of the recent generations, and
+        # the lower bounds of the distances of the states in the window to the last observed state
+        self._states = None
+        self._context_freqs = np.zeros((window, offset), dtype=np.float64)
+        self._distance_bounds = np.zeros(window, dtype=np.float64)
+
+        # Period of the current run of recurrences, and the generations in which the run started
+        # and in which the last recurrence was found
+        self._period = None
+        self._run_start = None
+        self._last_recurrence = None
+
+        self._amplitudes = None
+
+    def observe(self, generation: int, state: np.ndarray, context_freqs: dict):
+        """
+        Observes the state of a new generation
+        :param generation: number of the generation
+        :param state: state vector of the ENSM
+        :param context_freqs: dictionary of context -> action -> mean frequency
+        :return: True if the dynamics are cycling
+        """
+        if self._states is None:
+            self._states = np.zeros((self._window, state.size), dtype=np.float64)
+
+        period = self._find_recurrence(state)
+
+        row = self._num_observations % self._window
+        self._states[row] = state
+        self._distance_bounds[row] = 0.0
+        self._context_freqs[row] = [
+            context_freqs[c][a] for c in self._contexts for a in self._action_spaces[c]
+        ]
+        self._num_observations += 1
+
+        # Keep track of the run of recurrences with (approximately) the same period. Quasi-periodic
+        # dynamics may miss some recurrences, so the run only ends if there is none for a whole period
+        if period is None:
+            if (
+                self._period is not None
+                and generation - self._last_recurrence > self._period
+            ):
+                self._period = None
+                self._run_start = None
+            return False
+
+        # Returns after several periods (quasi-periodic dynamics) are also consistent with the run
+        if self._period is None:
+            self._run_start = generation
+            self._period = period
+        else:
+            num_periods = max(1, int(round(period / self._period)))
+            if abs(period - num_periods * self._period) > max(1, period // 20):
+                self._run_start = generation
+                self._period = period
+            elif num_periods == 1:
+                self._period = period
+        self._last_recurrence = generation
+
+        if generation - self._run_start < self._repetitions * self._period:
+            return False
+
+        # Compute the amplitude of the oscillation of each context over the last two periods. Discard
+        # cycles that are within the tolerance or whose amplitude is still changing (damped oscillations)
+        period = self._period
+        if 2 * period > min(self._num_observations, self._window):
+            return False
+
+        last_amplitudes = self._compute_amplitudes(lags=range(period))
+        previous_amplitudes = self._compute_amplitudes(lags=range(period, 2 * period))
+
+        if max(last_amplitudes.values()) <= self._tolerance:
+            return False
+        if any(
+            abs(last_amplitudes[c] - previous_amplitudes[c]) > self._tolerance
+            for c in self._contexts
+        ):
+            return False
+
+        self._amplitudes = last_amplitudes
+        return True
+
+    def _find_recurrence(self, state: np.ndarray):
+        """
+        Searches the recurrence window for the most recent return of the dynamics close to a state,
+        after having moved away from it
+        :param state: state vector of the ENSM
+        :return: number of generations since the return, or None if there is no return in the window
+        """
+        num_lags = min(self._num_observations, self._window)
+        if num_lags < 2:
+            return None
+
+        # Lower bounds of the distances between the state and the state of each previous generation, most
+        # recent first, given the step from the last observed state
+        rows = (self._num_observations - np.arange(1, num_lags + 1)) % self._window
+        step = np.max(np.abs(state - self._states[rows[0]]))
+        self._distance_bounds[rows] -= step
+
+        # Compute the distances whose lower bound is within the tolerance. The others are not recurrences
+        distances = self._distance_bounds[rows]
+        candidates = np.flatnonzero(distances <= self._tolerance + self.BOUND_MARGIN)
+        distances[candidates] = np.max(
+            np.abs(self._states[rows[candidates]] - state), axis=1
+        )
+        self._distance_bounds[rows] = distances
+        near = distances <= self._tolerance
+
+        # Skip the generations in which the dynamics have not moved away from the state yet
+        away = np.flatnonzero(~near)
+        if away.size == 0:
+            return None
+
+        returns = np.flatnonzero(near[away[0] :])
+        if returns.size == 0:
+            return None
+
+        # The dynamics may stay close to the state for several generations when they return. Take
+        # the closest generation of the return as the one that is one period ago
+        start = away[0] + returns[0]
+        left = np.flatnonzero(~near[start:])
+        stop = start + left[0] if left.size > 0 else num_lags
+
+        return int(start + np.argmin(distances[start:stop]) + 1)
+
+    def _compute_amplitudes(self, lags: range):
+        """
+        Computes the amplitude of the oscillation of the mean action frequencies of each context
+        :param lags: lags of the generations to consider, relative to the last observed generation
+        :return: dictionary of context -> amplitude
+        """
+        rows = [(self._num_observations - 1 - lag) % self._window for lag in lags]
+        freqs = self._context_freqs[rows]
+
+        return {
+            c: float(np.max(np.ptp(freqs[:, self._context_slices[c]], axis=0)))
+            for c in self._contexts
+        }
+
+    @property
+    def period(self):
+        """ Returns the period (in generations) of the current run of recurrences """
+        return self._period
+
+    @property
+    def amplitudes(self):
+        """ Returns a dictionary of context -> amplitude of the oscillation of its action frequencies """
+        return self._amplitudes
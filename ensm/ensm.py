@@ -1,6 +1,9 @@
 from ensm.strategies import StrategyReplicator
 from ensm.agents import AgentSubPopulation
-from ensm.norms import NormReplicator
+from ensm.norms import NormReplicator, Norm
+from ensm.history import StateLayout, TrajectoryHistory
+from ensm.cycles import CycleDetector
+from ensm.pruning import ActiveSet
 from ensm.games import GamesNetwork
 from ensm.mas import MAS
 
@@ -19,6 +22,14 @@ class ENSM(object):
         max_generations: int,
         stability_margin: float,
         min_num_stable_generations: int,
+        history_size: int = 0,
+        cycle_tolerance: float = None,
+        cycle_window: int = 1000,
+        cycle_repetitions: int = 2,
+        collapse_payoff_profiles: bool = True,
+        extinction_threshold: float = None,
+        replicator: str = "standard",
+        selection_strength: float = 1.0,
     ):
         """
 
@@ -28,7 +39,28 @@ class ENSM(object):
         :param norm_spaces:
         :param max_generations:
         :param stability_margin:
+        :param history_size: number of past generations to keep in the trajectory history (0 to disable it)
+        :param cycle_tolerance: maximum distance between two states for one to be a recurrence of the other when
+        detecting cycles (None to disable cycle detection)
+        :param cycle_window: number of recent generations in which cycles are searched
+        :param cycle_repetitions: number of full periods that must recur before a cycle is detected
+        :param collapse_payoff_profiles: whether to compute the fitness once per group of sub-populations
+        with identical payoffs, instead of once per sub-population
+        :param extinction_threshold: frequency at or below which actions are pruned from the computation of the
+        dynamics (None to disable pruning). Pruning is exact at the floor of the standard replicator, 1e-10 (see
+        ActiveSet), and is not supported by the 'log' replicator, whose frequencies have no floor
+        :param replicator: replicator equation of the strategies, either 'standard' (x' = x f / mean f) or 'log'
+        (the exponential replicator x' = x exp(s f) / sum x exp(s f), computed in log space)
+        :param selection_strength: selection strength s of the 'log' replicator
         """
+        assert replicator in (
+            "standard",
+            "log",
+        ), f"Unknown replicator '{replicator}', must be 'standard' or 'log'"
+        assert (
+            extinction_threshold is None or replicator == "standard"
+        ), "Extinction pruning requires the 'standard' replicator"
+
         self._min_num_stable_generations = min_num_stable_generations
         self._stability_margin = stability_margin
         self._max_generations = max_generations
@@ -37,6 +69,9 @@ class ENSM(object):
         self._games_net = games_net
         self._mas = mas
 
+        # Immutable, integer-indexed topology of the games network, over which the engines iterate
+        self._topology = games_net.freeze()
+
         self._must_evolve_norms = False
         self._num_generations = 0
         self._num_stable_generations = 0
@@ -44,6 +79,7 @@ class ENSM(object):
 
         self._converged = False
         self._timeout = False
+        self._cycling = False
 
         # To save the action frequencies for each context/norm before replication
         self._old_action_freqs = defaultdict(dict)
@@ -91,20 +127,74 @@ class ENSM(object):
 
         # Dictionary of game -> role -> action -> frequency that stores the overall frequency with which
         # the agents in the MAS population will perform a given action when playing a role of a game,
-        # no matter their profile (that is, it is averaged across all sub-populations)
-        self._mean_action_freqs_by_game = {
-            g: {
-                r: {
-                    a: np.float64(1 / len(g.action_space(r))) for a in g.action_space(r)
-                }
+        # no matter their profile (that is, it is averaged across all sub-populations). All the roles
+        # of a symmetric game share the same frequencies, averaged across roles
+        self._mean_action_freqs_by_game = {}
+        for g in games_net.games.values():
+            role_freqs = [
+                {a: np.float64(1 / len(g.action_space(r))) for a in g.action_space(r)}
                 for r in range(g.num_roles)
-            }
-            for g in games_net.games.values()
-        }
+            ]
+            if g.symmetric:
+                role_freqs = [role_freqs[0]] * g.num_roles
+            self._mean_action_freqs_by_game[g] = dict(enumerate(role_freqs))
+
+        # Groups of sub-populations with identical payoffs, which share their fitness computation
+        if collapse_payoff_profiles:
+            self._payoff_groups = StrategyReplicator.group_by_payoff_profile(
+                mas.population
+            )
+        else:
+            self._payoff_groups = [
+                [sub_population] for sub_population in mas.population
+            ]
+
+        # Payoff penalties of the agents that violate the sanctioned norms of each context
+        self._sanction_penalties = StrategyReplicator.sanction_penalties(
+            action_spaces=action_spaces, norm_spaces=norm_spaces
+        )
+
+        # Actions that have not gone extinct, which are the only ones that are evolved
+        self._active_set = None
+        if extinction_threshold is not None:
+            self._active_set = ActiveSet(
+                contexts=self._topology.contexts,
+                action_spaces=action_spaces,
+                threshold=extinction_threshold,
+            )
+
+        # Log-weights of the action frequencies of each context for the 'log' replicator, computed
+        # from the action frequencies of the population when it starts evolving
+        self._replicator = replicator
+        self._selection_strength = selection_strength
+        self._log_freqs = None
 
         # Set up action frequencies
         self._update_action_frequencies()
 
+        # Bounded history of the last generations, laid out in flat arrays
+        self._layout = StateLayout(
+            population=mas.population,
+            contexts=self._topology.contexts,
+            action_spaces=action_spaces,
+            norm_spaces=norm_spaces,
+        )
+        self._history = None
+        if history_size > 0:
+            self._history = TrajectoryHistory(size=history_size, layout=self._layout)
+            self._record_history()
+
+        # Online detection of periodic behaviour, to stop the runs that will never converge
+        self._cycle_detector = None
+        if cycle_tolerance is not None:
+            self._cycle_detector = CycleDetector(
+                contexts=self._topology.contexts,
+                action_spaces=action_spaces,
+                tolerance=cycle_tolerance,
+                window=cycle_window,
+                repetitions=cycle_repetitions,
+            )
+
     def evolve(self):
         """
 
@@ -118,13 +208,17 @@ class ENSM(object):
         self._evolve_strategies()
         self._update_action_frequencies()
 
+        # Prune the actions that went extinct, once their last frequencies are taken into account
+        if self._active_set is not None:
+            self._active_set.prune(population=self.mas.population)
+
         # Evaluate norms in terms of their utility to achieve the MAS goals. Replicate norms based on their utility
         if self._must_evolve_norms:
             self._evolve_norms()
 
         # Get population fitnesses organised by context
         context_fitness = defaultdict(dict)
-        for context in self._games_net.contexts:
+        for context in self._topology.contexts:
             for sub_population in self.mas.population:
                 context_fitness[context][sub_population] = sub_population.fitness[
                     context
@@ -133,36 +227,111 @@ class ENSM(object):
         self._converged = self._check_convergence()
         self._timeout = self._num_generations > self._max_generations
 
+        if self._cycle_detector is not None and not self._converged:
+            self._cycling = self._cycle_detector.observe(
+                generation=self._num_generations,
+                state=self.state_vector(),
+                context_freqs=self._mean_action_freqs_by_context,
+            )
+
+        if self._history is not None:
+            self._record_history()
+
         return self._old_action_freqs
 
+    def _record_history(self):
+        """ Records the current generation in the trajectory history """
+        self._history.record(
+            generation=self._num_generations, norm_freqs=self._norm_freqs
+        )
+
     def _evolve_strategies(self):
         """ Evolve strategies """
-        for sub_population in self.mas.population:
 
-            # Backup sub-population action frequencies
-            self._old_action_freqs[sub_population] = deepcopy(
-                sub_population.action_freqs
+        # Update the fitness of the active actions, and reinstate the extinct actions that would grow
+        active_set = self._active_set
+        base_fitness = self._update_fitness(active_set=active_set)
+        if active_set is not None:
+            active_set.resurrect(
+                population=self.mas.population,
+                base_fitness=base_fitness,
+                sanction_penalties=self._sanction_penalties,
             )
 
-            # Update sub-population fitness and replicate
-            StrategyReplicator.update_fitness(
-                sub_population=sub_population,
+        # Backup sub-population action frequencies. The frequencies of extinct actions are frozen
+        for sub_population in self.mas.population:
+            if active_set is None:
+                self._old_action_freqs[sub_population] = deepcopy(
+                    sub_population.action_freqs
+                )
+                continue
+
+            self._old_action_freqs[sub_population] = {
+                context: {
+                    norm: {a: action_freqs[a] for a in active_set.actions(context)}
+                    for norm, action_freqs in norms.items()
+                }
+                for context, norms in sub_population.action_freqs.items()
+            }
+
+        # Replicate each sub-population based on its fitness
+        if self._replicator == "log":
+            if self._log_freqs is None:
+                self._log_freqs = StrategyReplicator.log_frequencies(
+                    population=self.mas.population,
+                    contexts=self._topology.contexts,
+                    action_spaces=self.action_spaces,
+                    norm_spaces=self.norm_spaces,
+                )
+            StrategyReplicator.replicate_log(
+                population=self.mas.population,
                 games_net=self._games_net,
                 action_spaces=self.action_spaces,
                 norm_spaces=self.norm_spaces,
-                mean_action_freqs_by_game=self._mean_action_freqs_by_game,
-                fitness_aggregation=min,
+                log_freqs=self._log_freqs,
+                selection_strength=self._selection_strength,
             )
-            StrategyReplicator.replicate(
-                sub_population=sub_population,
+        else:
+            for sub_population in self.mas.population:
+                StrategyReplicator.replicate(
+                    sub_population=sub_population,
+                    games_net=self._games_net,
+                    action_spaces=self.action_spaces,
+                    norm_spaces=self.norm_spaces,
+                    active_set=active_set,
+                )
+
+    def _update_fitness(self, active_set: ActiveSet = None):
+        """
+        Updates the fitness of one sub-population per payoff profile and shares it with the rest
+        :param active_set: ActiveSet with the active actions (None for all, see StrategyReplicator.update_fitness)
+        :return: dictionary of sub-population -> context -> array with the fitness of each action of the context
+        before sanctions
+        """
+        base_fitness = {}
+        for leader, *members in self._payoff_groups:
+            base_fitness[leader] = StrategyReplicator.update_fitness(
+                sub_population=leader,
                 games_net=self._games_net,
                 action_spaces=self.action_spaces,
                 norm_spaces=self.norm_spaces,
+                mean_action_freqs_by_game=self._mean_action_freqs_by_game,
+                fitness_aggregation=min,
+                sanction_penalties=self._sanction_penalties,
+                active_set=active_set,
             )
+            if members:
+                StrategyReplicator.share_fitness(
+                    sub_population=leader, members=members, norm_spaces=self.norm_spaces
+                )
+            for member in members:
+                base_fitness[member] = base_fitness[leader]
+
+        return base_fitness
 
     def _evolve_norms(self):
         """ Evolve norms """
-        for context in self.games_net.contexts:
+        for context in self._topology.contexts:
             NormReplicator.update_utilities(
                 context=context,
                 games_net=self.games_net,
@@ -179,11 +348,17 @@ class ENSM(object):
     def _update_action_frequencies(self):
         """
         Computes the probabilities that the agents will perform each action combination in each game
-        given their current configuration (in terms of strategy/norm frequencies)
+        given their current configuration (in terms of strategy/norm frequencies). With pruning, only the
+        frequencies of the active actions change
         :return:
         """
-        for context in self.games_net.contexts:
-            for action in self.action_spaces[context]:
+        active_set = self._active_set
+        for context in self._topology.contexts:
+            actions = self.action_spaces[context]
+            if active_set is not None:
+                actions = active_set.actions(context)
+
+            for action in actions:
                 mean_action_freq = np.float64(0)
 
                 for norm in self.norm_spaces[context]:
@@ -216,14 +391,15 @@ class ENSM(object):
                 self._mean_action_freqs_by_context[context][action] = mean_action_freq
 
         # Compute the global action frequencies per game and role, averaged across all norms and sub-populations
-        for game, role in [
-            (game, role)
-            for game in self.games_net.games.values()
-            for role in range(game.num_roles)
-        ]:
-            for action in game.action_space(role):
-                contexts_playing = self.games_net.contexts_playing(game, role)
-
+        for game, role in self._topology.game_roles:
+            if game.symmetric:
+                continue
+            contexts_playing = self._topology.contexts_playing(game, role)
+            actions = game.action_space(role)
+            if active_set is not None:
+                actions = active_set.game_actions(game, role, contexts_playing)
+
+            for action in actions:
                 action_freq = np.float64(
                     sum(
                         self._mean_action_freqs_by_context[context][action]
@@ -234,6 +410,38 @@ class ENSM(object):
 
                 self._mean_action_freqs_by_game[game][role][action] = action_freq
 
+        # The players of symmetric games may play any role, so their frequencies are averaged across roles
+        for game in self._games_net.games.values():
+            if not game.symmetric:
+                continue
+            role_contexts = [
+                self._topology.contexts_playing(game, role)
+                for role in range(game.num_roles)
+            ]
+            actions = game.action_space(0)
+            if active_set is not None:
+                active = {
+                    a
+                    for role, contexts_playing in enumerate(role_contexts)
+                    for a in active_set.game_actions(game, role, contexts_playing)
+                }
+                actions = [a for a in actions if a in active]
+
+            for action in actions:
+                action_freq = np.float64(
+                    sum(
+                        sum(
+                            self._mean_action_freqs_by_context[context][action]
+                            for context in contexts_playing
+                        )
+                        / np.float64(len(contexts_playing))
+                        for contexts_playing in role_contexts
+                    )
+                    / np.float64(game.num_roles)
+                )
+
+                self._mean_action_freqs_by_game[game][0][action] = action_freq
+
     def _check_convergence(self):
         """
 
@@ -241,17 +449,14 @@ class ENSM(object):
         """
         stable = True
 
-        for sub_population, context, norm, action in [
-            (p, c, n, a)
+        # Only the backed up frequencies may have changed (see _evolve_strategies)
+        for sub_population, context, norm, action, old_action_freq in (
+            (p, c, n, a, freq)
             for p in self.mas.population
-            for c in self.games_net.contexts
-            for n in self.norm_spaces[c]
-            for a in self._action_spaces[c]
-        ]:
-
-            old_action_freq = self._old_action_freqs[sub_population][context][norm][
-                action
-            ]
+            for c, norms in self._old_action_freqs[p].items()
+            for n, freqs in norms.items()
+            for a, freq in freqs.items()
+        ):
             curr_action_freq = sub_population.action_freqs[context][norm][action]
 
             if abs(old_action_freq - curr_action_freq) > self._stability_margin:
@@ -262,6 +467,147 @@ class ENSM(object):
 
         return self._num_stable_generations >= self._min_num_stable_generations
 
+    def state_vector(self):
+        """
+        Returns the current state of the evolutionary process as a flat array that contains the action
+        frequencies of each sub-population, context, norm and action (in this order), followed by
+        the frequencies of each norm in each context
+        :return: numpy array with the state of the process
+        """
+        return np.concatenate(
+            [
+                self._layout.pack_actions("action_freqs"),
+                self._layout.pack_norms(self._norm_freqs),
+            ]
+        )
+
+    def dominant_actions(self):
+        """
+        Returns the action that is most frequently performed in each context, averaged across all
+        norms and sub-populations
+        :return: dictionary of context -> action
+        """
+        return {
+            context: max(action_freqs, key=action_freqs.get)
+            for context, action_freqs in self._mean_action_freqs_by_context.items()
+        }
+
+    def dominant_norms(self):
+        """
+        Returns the name of the most frequent norm in each context
+        :return: dictionary of context -> norm name
+        """
+        return {
+            context: Norm.name_of(max(norm_freqs, key=norm_freqs.get))
+            for context, norm_freqs in self._norm_freqs.items()
+        }
+
+    def snapshot(self):
+        """
+        Returns the state of the evolutionary process in plain dictionaries keyed by the names of the
+        sub-populations, contexts, norms and actions, so that it can be stored or used to seed other runs
+        :return: dictionary with the 'action_freqs' of the form sub-population -> context -> norm -> action
+        -> frequency, and the 'norm_freqs' of the form context -> norm -> frequency
+        """
+        return {
+            "action_freqs": {
+                str(sub_population): {
+                    c: {
+                        Norm.name_of(n): {
+                            a: float(sub_population.action_freqs[c][n][a])
+                            for a in self.action_spaces[c]
+                        }
+                        for n in self.norm_spaces[c]
+                    }
+                    for c in self._topology.contexts
+                }
+                for sub_population in self.mas.population
+            },
+            "norm_freqs": {
+                c: {
+                    Norm.name_of(n): float(self._norm_freqs[c][n])
+                    for n in self.norm_spaces[c]
+                }
+                for c in self._topology.contexts
+            },
+        }
+
+    def warm_start(self, snapshot: dict):
+        """
+        Seeds the evolutionary process with the state of another run (see snapshot), matching the entries of both
+        states by the names of their sub-populations, contexts, norms and actions. The entries that are not
+        in the snapshot keep their current value, and the frequencies are renormalised to sum up to 1
+        :param snapshot: state of another run
+        :return: number of action and norm frequencies taken from the snapshot
+        """
+        num_matched = 0
+
+        for sub_population in self.mas.population:
+            sub_population_state = snapshot["action_freqs"].get(str(sub_population), {})
+
+            for context in self._topology.contexts:
+                context_state = sub_population_state.get(context, {})
+
+                for norm in self.norm_spaces[context]:
+                    norm_state = context_state.get(Norm.name_of(norm), {})
+                    action_freqs = sub_population.action_freqs[context][norm]
+
+                    matched = [
+                        a for a in self.action_spaces[context] if a in norm_state
+                    ]
+                    for action in matched:
+                        action_freqs[action] = np.float64(norm_state[action])
+                    num_matched += len(matched)
+
+                    if matched:
+                        total_freq = np.sum(
+                            [action_freqs[a] for a in self.action_spaces[context]]
+                        )
+                        for action in self.action_spaces[context]:
+                            action_freqs[action] /= total_freq
+
+        for context in self._topology.contexts:
+            context_state = snapshot["norm_freqs"].get(context, {})
+            norm_freqs = self._norm_freqs[context]
+
+            matched = [
+                n for n in self.norm_spaces[context] if Norm.name_of(n) in context_state
+            ]
+            for norm in matched:
+                norm_freqs[norm] = np.float64(context_state[Norm.name_of(norm)])
+            num_matched += len(matched)
+
+            if matched:
+                total_freq = np.sum([norm_freqs[n] for n in self.norm_spaces[context]])
+                for norm in self.norm_spaces[context]:
+                    norm_freqs[norm] /= total_freq
+
+        # Reinstate all actions, refresh the mean action frequencies of the MAS with the new state, and
+        # the log-weights of the replicator with the new action frequencies
+        if self._active_set is not None:
+            self._active_set.reset()
+        self._update_action_frequencies()
+        self._log_freqs = None
+        if self._history is not None:
+            self._record_history()
+
+        return num_matched
+
+    def summary(self):
+        """
+        Returns a summary of the outcome of the evolutionary process
+        :return: dictionary with the outcome, the number of generations, the period and amplitudes of the
+        detected cycle (if any) and the dominant actions and norms of each context
+        """
+        return {
+            "outcome": self.outcome,
+            "num_generations": self._num_generations,
+            "cycle_period": self.cycle_period,
+            "cycle_amplitudes": self.cycle_amplitudes,
+            "dominant_actions": self.dominant_actions(),
+            "dominant_norms": self.dominant_norms(),
+        }
+
     @property
     def mas(self):
         return self._mas
@@ -278,6 +624,61 @@ class ENSM(object):
     def timed_out(self):
         return self._timeout
 
+    @property
+    def cycling(self):
+        return self._cycling
+
+    @property
+    def cycle_period(self):
+        """ Returns the period (in generations) of the detected cycle, or None if the ENSM is not cycling """
+        return self._cycle_detector.period if self._cycling else None
+
+    @property
+    def cycle_amplitudes(self):
+        """ Returns a dictionary of context -> amplitude of the detected cycle, or None if the ENSM is not cycling """
+        return self._cycle_detector.amplitudes if self._cycling else None
+
+    @property
+    def finished(self):
+        """ Returns whether the evolutionary process has converged, timed out or has been found to cycle """
+        return self._converged or self._timeout or self._cycling
+
+    @property
+    def outcome(self):
+        """ Returns the outcome of the evolutionary process: 'converged', 'cycling', 'timed out' or None """
+        if self._converged:
+            return "converged"
+        if self._cycling:
+            return "cycling"
+        if self._timeout:
+            return "timed out"
+        return None
+
+    @property
+    def norm_freqs(self):
+        """ Returns dictionary of the form context -> norm -> frequency """
+        return self._norm_freqs
+
+    @property
+    def mean_action_freqs_by_context(self):
+        """ Returns dictionary of the form context -> action -> frequency """
+        return self._mean_action_freqs_by_context
+
+    @property
+    def history(self):
+        """ Returns the TrajectoryHistory of the last generations, or None if it is disabled """
+        return self._history
+
+    @property
+    def layout(self):
+        """ Returns the StateLayout of the state vector """
+        return self._layout
+
+    @property
+    def active_set(self):
+        """ Returns the ActiveSet of the actions and norms that are evolved, or None if pruning is disabled """
+        return self._active_set
+
     @property
     def games_net(self):
         return self._games_net
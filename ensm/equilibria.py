@@ -0,0 +1,261 @@
+from ensm.payoffs import PayoffTable
+from ensm.norms import Norm
+from ensm.ensm import ENSM
+from typing import List
+import numpy as np
+import itertools
+
+
+class EquilibriumSolver(object):
+    """
+    Solver of the Nash equilibria of 2-player games by support enumeration. For each pair of supports of
+    equal size, the mixed strategies that make the opponent indifferent between the actions of its support
+    are computed, and kept if they are probability distributions and no action outside the support is a better
+    response. This finds all the equilibria of non-degenerate games. All payoff variants of a batch are
+    solved at once, one linear system per support pair and variant
+    """
+
+    @staticmethod
+    def solve(table: PayoffTable, tol: float = 1e-9):
+        """
+        Computes the Nash equilibria of the payoffs of a 2-player game
+        :param table: PayoffTable of action combination -> payoff of each role
+        :param tol: numerical tolerance of the equilibrium conditions
+        :return: list of equilibria, each a list with the mixed strategy of each role as a dictionary of
+        action -> probability
+        """
+        return EquilibriumSolver.solve_tables(tables=[table], tol=tol)[0]
+
+    @staticmethod
+    def solve_tables(tables: List[PayoffTable], tol: float = 1e-9):
+        """
+        Computes the Nash equilibria of several variants of the payoffs of the same 2-player game
+        :param tables: list of PayoffTable with the same action spaces
+        :param tol: numerical tolerance of the equilibrium conditions
+        :return: list with the equilibria of each variant (see solve)
+        """
+        action_spaces = tables[0].action_spaces
+        assert (
+            len(action_spaces) == 2
+        ), "Equilibria can only be solved for 2-player games"
+        assert all(
+            table.action_spaces == action_spaces for table in tables
+        ), "All payoff variants must have the same action spaces"
+
+        payoffs = np.stack([np.asarray(table.array) for table in tables])
+        row_strategies, col_strategies = EquilibriumSolver.solve_batch(
+            row_payoffs=payoffs[..., 0], col_payoffs=payoffs[..., 1], tol=tol
+        )
+
+        return [
+            [
+                [
+                    dict(zip(action_spaces[0], x.tolist())),
+                    dict(zip(action_spaces[1], y.tolist())),
+                ]
+                for x, y in zip(xs, ys)
+            ]
+            for xs, ys in zip(row_strategies, col_strategies)
+        ]
+
+    @staticmethod
+    def solve_batch(
+        row_payoffs: np.ndarray, col_payoffs: np.ndarray, tol: float = 1e-9
+    ):
+        """
+        Computes the Nash equilibria of a batch of bimatrix games by support enumeration
+        :param row_payoffs: array of shape (variants, m, n) with the payoffs of the row player
+        :param col_payoffs: array of shape (variants, m, n) with the payoffs of the column player
+        :param tol: numerical tolerance of the equilibrium conditions
+        :return: tuple (row_strategies, col_strategies), each a list with an array of shape (equilibria, m)
+        (respectively (equilibria, n)) per variant
+        """
+        num_variants, m, n = row_payoffs.shape
+        row_strategies = [[] for _ in range(num_variants)]
+        col_strategies = [[] for _ in range(num_variants)]
+
+        for k in range(1, min(m, n) + 1):
+            for rows, cols in itertools.product(
+                itertools.combinations(range(m), k), itertools.combinations(range(n), k)
+            ):
+                rows, cols = list(rows), list(cols)
+
+                # Column strategy that makes the row player indifferent within its support,
+                # and row strategy that makes the column player indifferent within its support
+                y, u, solved_y = EquilibriumSolver._indifference(
+                    row_payoffs[:, rows][:, :, cols]
+                )
+                x, v, solved_x = EquilibriumSolver._indifference(
+                    np.swapaxes(col_payoffs[:, rows][:, :, cols], 1, 2)
+                )
+
+                full_x = np.zeros((num_variants, m))
+                full_x[:, rows] = x
+                full_y = np.zeros((num_variants, n))
+                full_y[:, cols] = y
+
+                # Keep the solutions that are distributions and where no action is a better response
+                row_utilities = np.einsum("vij,vj->vi", row_payoffs, full_y)
+                col_utilities = np.einsum("vij,vi->vj", col_payoffs, full_x)
+                valid = (
+                    solved_x
+                    & solved_y
+                    & np.all(x >= -tol, axis=1)
+                    & np.all(y >= -tol, axis=1)
+                    & np.all(row_utilities <= u[:, np.newaxis] + tol, axis=1)
+                    & np.all(col_utilities <= v[:, np.newaxis] + tol, axis=1)
+                )
+
+                for variant in np.flatnonzero(valid):
+                    row_strategies[variant].append(np.clip(full_x[variant], 0, 1) + 0.0)
+                    col_strategies[variant].append(np.clip(full_y[variant], 0, 1) + 0.0)
+
+        return (
+            [np.array(xs).reshape(-1, m) for xs in row_strategies],
+            [np.array(ys).reshape(-1, n) for ys in col_strategies],
+        )
+
+    @staticmethod
+    def _indifference(payoffs: np.ndarray):
+        """
+        Solves the strategy of the opponent that makes a player indifferent between the actions of its support
+        :param payoffs: array of shape (variants, k, k) with the payoffs of the player (rows) restricted to
+        its support and the support of the opponent (columns)
+        :return: tuple (strategy, utility, solved) with the opponent strategies of shape (variants, k), the
+        utilities of the player and a mask of the variants whose system is not singular
+        """
+        num_variants, k, _ = payoffs.shape
+
+        # System [payoffs, -1; 1, 0] [strategy; utility] = [0; 1]
+        system = np.zeros((num_variants, k + 1, k + 1))
+        system[:, :k, :k] = payoffs
+        system[:, :k, k] = -1
+        system[:, k, :k] = 1
+        rhs = np.zeros((num_variants, k + 1))
+        rhs[:, k] = 1
+
+        solved = np.abs(np.linalg.det(system)) > 1e-12
+        solution = np.zeros((num_variants, k + 1))
+        if np.any(solved):
+            solution[solved] = np.linalg.solve(
+                system[solved], rhs[solved][..., np.newaxis]
+            )[..., 0]
+
+        return solution[:, :k], solution[:, k], solved
+
+    @staticmethod
+    def population_equilibria(ensm: ENSM, tol: float = 1e-9):
+        """
+        Computes the Nash equilibria of the payoffs of each sub-population in each 2-player game of an ENSM
+        :param ensm: an ENSM
+        :param tol: numerical tolerance of the equilibrium conditions
+        :return: dictionary of (sub-population name, game name) -> list of equilibria (see solve)
+        """
+        equilibria = {}
+        for game in ensm.games_net.games.values():
+            if game.num_roles != 2:
+                continue
+
+            population = ensm.mas.population
+            all_equilibria = EquilibriumSolver.solve_tables(
+                tables=[sub_population.payoff[game] for sub_population in population],
+                tol=tol,
+            )
+            for sub_population, game_equilibria in zip(population, all_equilibria):
+                equilibria[(str(sub_population), game.name)] = game_equilibria
+
+        return equilibria
+
+    @staticmethod
+    def seed(ensm: ENSM, equilibria: dict, mixing: float = 0.01):
+        """
+        Seeds an ENSM near given equilibria. The action frequencies of each context of a sub-population that only
+        plays one game role are set to the equilibrium strategy of the role, mixed with the current frequencies
+        so that no action is extinct from the start. Contexts that play several games keep their frequencies,
+        since the equilibria of each game are unrelated and their strategies cannot be combined
+        :param ensm: an ENSM
+        :param equilibria: dictionary of (sub-population name, game name) -> equilibrium (see solve)
+        :param mixing: weight of the current frequencies in the seeded frequencies
+        :return: number of action frequencies seeded
+        """
+        topology = ensm.games_net.topology
+        snapshot = {"action_freqs": {}, "norm_freqs": {}}
+
+        for sub_population in ensm.mas.population:
+            contexts_state = snapshot["action_freqs"][str(sub_population)] = {}
+
+            for context in topology.contexts:
+                played_roles = topology.played_roles(context)
+                if len(played_roles) != 1:
+                    continue
+
+                game, role = played_roles[0]
+                if (str(sub_population), game.name) not in equilibria:
+                    continue
+
+                strategy = equilibria[(str(sub_population), game.name)][role]
+                contexts_state[context] = {
+                    Norm.name_of(norm): {
+                        action: (1 - mixing) * strategy.get(action, 0.0)
+                        + mixing * sub_population.action_freqs[context][norm][action]
+                        for action in ensm.action_spaces[context]
+                    }
+                    for norm in ensm.norm_spaces[context]
+                }
+
+        return ensm.warm_start(snapshot=snapshot)
+
+    @staticmethod
+    def cross_check(ensm: ENSM, equilibria: dict):
+        """
+        Compares the strategies that each sub-population of an ENSM plays in each game with the equilibria
+        of its payoffs. The strategy of a sub-population in a game role is its action frequencies averaged
+        across norms (weighted by their frequency) and the contexts that play the role
+        :param ensm: an ENSM
+        :param equilibria: dictionary of (sub-population name, game name) -> list of equilibria (see solve)
+        :return: dictionary of (sub-population name, game name) -> (index of the nearest equilibrium, distance)
+        where the distance is the maximum absolute difference of the action frequencies
+        """
+        topology = ensm.games_net.topology
+        results = {}
+
+        for sub_population in ensm.mas.population:
+            for game in ensm.games_net.games.values():
+                game_equilibria = equilibria.get((str(sub_population), game.name))
+                if not game_equilibria:
+                    continue
+
+                strategy = []
+                for role in range(game.num_roles):
+                    contexts = topology.contexts_playing(game, role)
+                    strategy.append(
+                        {
+                            action: np.mean(
+                                [
+                                    sum(
+                                        ensm.norm_freqs[c][n]
+                                        * sub_population.action_freqs[c][n][action]
+                                        for n in ensm.norm_spaces[c]
+                                    )
+                                    for c in contexts
+                                ]
+                            )
+                            for action in game.action_space(role)
+                        }
+                    )
+
+                distances = [
+                    max(
+                        abs(strategy[role][a] - equilibrium[role].get(a, 0.0))
+                        for role in range(game.num_roles)
+                        for a in strategy[role]
+                    )
+                    for equilibrium in game_equilibria
+                ]
+                nearest = int(np.argmin(distances))
+                results[(str(sub_population), game.name)] = (
+                    nearest,
+                    float(distances[nearest]),
+                )
+
+        return results
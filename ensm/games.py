@@ -1,3 +1,5 @@
+from ensm.symmetry import SymmetricReduction
+from ensm.payoffs import PayoffTable
 from collections import defaultdict
 from typing import List, Dict
 
@@ -5,30 +7,74 @@ from typing import List, Dict
 class Game(object):
     """ A strategic situation played between two or more players that interact, each playing one role of the game """
 
-    def __init__(self, name, contexts, utilities, sanctions=None):
+    def __init__(self, name, contexts, utilities, sanctions=None, symmetric=False):
         """
         Creates a game
         :param name: descriptive name of the game
         :param contexts: individual contexts of each player of the aame from their own perspective
-        :param utilities: dictionary of action lists (action combinations) to their payoffs
+        :param utilities: dictionary of action lists (action combinations) to their payoffs, or a PayoffTable
+        :param sanctions: list of sanctions (payoff penalties of the agents that violate a norm) with which
+        the norms of the contexts of the game can be enforced. None if norms are not sanctioned
+        :param symmetric: whether the roles of the game are interchangeable (see SymmetricReduction). The players
+        of a symmetric game draw their actions from the same frequencies, no matter the role they play
         """
         self._player_contexts = contexts
         self._utilities = utilities
         self._name = name
         self._sanctions = sanctions
+        self._reduction = None
 
-        # Create action spaces of each role of the game
+        # Create action spaces of each role of the game. Payoff tables already declare the action
+        # space of each role, otherwise collect the actions of each role in order of appearance
         self._action_spaces = defaultdict(list)
-        for role in range(self.num_roles):
+        if isinstance(utilities, PayoffTable):
+            for role, actions in enumerate(utilities.action_spaces):
+                self._action_spaces[role] = actions
+        else:
+            seen_actions = defaultdict(set)
             for ac_comb in self._utilities:
+                for role in range(self.num_roles):
 
-                action = ac_comb[role]
-                if action not in self._action_spaces[role]:
-                    self._action_spaces[role].append(ac_comb[role])
+                    action = ac_comb[role]
+                    if action not in seen_actions[role]:
+                        seen_actions[role].add(action)
+                        self._action_spaces[role].append(action)
+
+        self._symmetric = False
+        self.set_symmetric(symmetric)
+
+    def set_symmetric(self, symmetric: bool):
+        """ Declares whether the roles of the game are interchangeable """
+        assert not symmetric or all(
+            self.action_space(r) == self.action_space(0) for r in range(self.num_roles)
+        ), f"The roles of symmetric game {self._name} must have the same action space"
+
+        self._symmetric = bool(symmetric)
+        self._reduction = None
+
+    def detect_symmetry(self, payoff_tables: list, role_contexts: list):
+        """
+        Declares the game symmetric if the payoffs of every sub-population in the game are symmetric and
+        every role is played by the same contexts. Otherwise, pooling the roles would mix the frequencies
+        of different contexts
+        :param payoff_tables: list with the PayoffTable of each sub-population in the game
+        :param role_contexts: list with the contexts that play each role of the game
+        :return: whether the game is symmetric
+        """
+        self.set_symmetric(
+            all(set(contexts) == set(role_contexts[0]) for contexts in role_contexts)
+            and all(SymmetricReduction.is_symmetric(table) for table in payoff_tables)
+        )
+        return self._symmetric
 
     def utility(self, action_combination: tuple):
         return self._utilities[action_combination]
 
+    @property
+    def utilities(self):
+        """ Returns the dictionary (or PayoffTable) of action combinations to utilities """
+        return self._utilities
+
     def action_space(self, role):
         return self._action_spaces[role]
 
@@ -48,6 +94,20 @@ class Game(object):
     def sanctions(self):
         return self._sanctions
 
+    @property
+    def symmetric(self):
+        return self._symmetric
+
+    @property
+    def reduction(self):
+        """ Returns the SymmetricReduction of the fitness computation of a symmetric game """
+        assert self._symmetric, f"Game {self._name} is not symmetric"
+        if self._reduction is None:
+            self._reduction = SymmetricReduction(
+                num_roles=self.num_roles, actions=self.action_space(0)
+            )
+        return self._reduction
+
     def __str__(self):
         return self.name
 
@@ -55,21 +115,104 @@ class Game(object):
         return self.__str__()
 
 
+class NetworkTopology(object):
+    """
+    Immutable, integer-indexed topology of a games network. The contexts and the (game, role) pairs of the
+    network are numbered, and the relations between them are resolved once into tuples of contexts and
+    (game, role) pairs, ordered by their numbers, which the engines iterate over directly
+    """
+
+    def __init__(
+        self,
+        contexts: list,
+        game_roles: list,
+        contexts_per_role: list,
+        dependencies_per_role: list,
+    ):
+        """
+        Compiles the topology of a games network
+        :param contexts: list of contexts
+        :param game_roles: list of (game, role) pairs
+        :param contexts_per_role: list with the indices of the contexts playing each (game, role) pair
+        :param dependencies_per_role: list with the indices of the (game, role) pairs that each (game, role)
+        pair depends on
+        """
+        self._contexts = tuple(contexts)
+        self._game_roles = tuple(game_roles)
+
+        # Reverse indices from contexts and (game, role) pairs to their numbers
+        self._context_index = {c: i for i, c in enumerate(self._contexts)}
+        self._game_role_index = {gr: i for i, gr in enumerate(self._game_roles)}
+
+        # (game, role) -> contexts, its transpose context -> (game, role), and (game, role) -> (game, role)
+        # dependencies
+        roles_per_context = [[] for _ in self._contexts]
+        for game_role, contexts_idx in enumerate(contexts_per_role):
+            for context in contexts_idx:
+                roles_per_context[context].append(game_role)
+
+        self._contexts_playing = self._resolve(contexts_per_role, self._contexts)
+        self._played_roles = self._resolve(roles_per_context, self._game_roles)
+        self._dependencies = self._resolve(dependencies_per_role, self._game_roles)
+
+    @staticmethod
+    def _resolve(adjacency: list, entries: tuple):
+        """
+        Resolves adjacency lists of indices to tuples of entries
+        :param adjacency: list with the indices of the neighbours of each entry
+        :param entries: tuple of the entries that the indices refer to
+        :return: tuple with the tuple of neighbours of each entry, ordered by their indices
+        """
+        return tuple(
+            tuple(entries[j] for j in sorted(neighbours)) for neighbours in adjacency
+        )
+
+    def contexts_playing(self, game, role):
+        """ Returns the tuple of contexts that apply to (can play) a given role of a game """
+        return self._contexts_playing[self._game_role_index[(game, role)]]
+
+    def played_roles(self, context):
+        """ Returns the tuple of (game, role) pairs to which a context is applicable """
+        return self._played_roles[self._context_index[context]]
+
+    def dependencies(self, game, role):
+        """ Returns the tuple of (game, role) pairs that a role of a game depends on """
+        return self._dependencies[self._game_role_index[(game, role)]]
+
+    def context_index(self, context):
+        return self._context_index[context]
+
+    def game_role_index(self, game, role):
+        return self._game_role_index[(game, role)]
+
+    @property
+    def contexts(self):
+        return self._contexts
+
+    @property
+    def game_roles(self):
+        return self._game_roles
+
+
 class GamesNetwork(object):
     """ A network of games and the dependencies between their roles """
 
     def __init__(self, games: Dict[str, Game], dependencies: List[tuple]):
         self._dependencies = defaultdict(lambda: defaultdict(set))
+        self._dependency_pairs = []
         # self._contexts_graph = nx.DiGraph()
         self._games = games
+        self._topology = None
 
-        # Add each agent context from each game as a new coordination context to regulate
-        self._contexts_per_role = defaultdict(lambda: defaultdict(set))
+        # Add each agent context from each game as a new coordination context to regulate. The contexts
+        # of each role are kept in insertion-ordered dictionaries (used as ordered sets), so that iterating
+        # them does not depend on string hashing and runs are reproducible
+        self._contexts_per_role = defaultdict(lambda: defaultdict(dict))
         self._roles_per_context = defaultdict(lambda: defaultdict(set))
 
         for game in games.values():
             for role, ctxt in enumerate(game.contexts):
-                self._contexts_per_role[game][role].add(ctxt)
+                self._contexts_per_role[game][role][ctxt] = None
                 self._roles_per_context[ctxt][game].add(role)
 
         for (game_role_a, game_role_b) in dependencies:
@@ -81,8 +224,11 @@ class GamesNetwork(object):
         :param game_role_a: tuple of the form (game, role)
         :param game_role_b: tuple of the form (game, role)
         """
+        assert self._topology is None, "Cannot add dependencies to a frozen network"
+
         game_a, role_a = game_role_a
         game_b, role_b = game_role_b
+        self._dependency_pairs.append((game_role_a, game_role_b))
         self._dependencies[game_a][role_a].add(game_role_b)
         self._dependencies[game_b][role_b].add(game_role_a)
 
@@ -93,14 +239,47 @@ class GamesNetwork(object):
             joint_context = " & ".join(
                 [game_a.contexts[role_a], game_b.contexts[role_b]]
             )
-            self._contexts_per_role[game_a][role_a].add(joint_context)
-            self._contexts_per_role[game_b][role_b].add(joint_context)
+            self._contexts_per_role[game_a][role_a][joint_context] = None
+            self._contexts_per_role[game_b][role_b][joint_context] = None
             self._roles_per_context[joint_context][game_a].add(role_a)
             self._roles_per_context[joint_context][game_b].add(role_b)
 
             # # Add the joint context as parent of the two joined contexts
             # self._contexts_graph.add_edges_from([(joint_context, context_a), (joint_context, context_b)])
 
+    def freeze(self):
+        """
+        Compiles the network into an immutable, integer-indexed NetworkTopology. Once frozen, no more
+        dependencies can be added to the network
+        :return: the NetworkTopology of the network
+        """
+        if self._topology is not None:
+            return self._topology
+
+        contexts = list(self._roles_per_context.keys())
+        context_index = {c: i for i, c in enumerate(contexts)}
+        game_roles = [
+            (game, role)
+            for game in self._games.values()
+            for role in range(game.num_roles)
+        ]
+        game_role_index = {gr: i for i, gr in enumerate(game_roles)}
+
+        self._topology = NetworkTopology(
+            contexts=contexts,
+            game_roles=game_roles,
+            contexts_per_role=[
+                [context_index[c] for c in self.contexts_playing(game, role)]
+                for game, role in game_roles
+            ],
+            dependencies_per_role=[
+                [game_role_index[gr] for gr in self.dependencies(game, role)]
+                for game, role in game_roles
+            ],
+        )
+
+        return self._topology
+
     def dependencies(self, game, role):
         """
         Returns the dependencies of game's role with the roles of other games
@@ -108,24 +287,38 @@ class GamesNetwork(object):
         :param role: a game's role
         :return: set of dependencies of a game
         """
-        return self._dependencies[game][role]
+        return self._dependencies.get(game, {}).get(role, set())
 
     def contexts_playing(self, game, role):
         """
-        Returns the set of contexts that apply to (can play) a given role of a game
+        Returns the contexts that apply to (can play) a given role of a game
         :param game: a game
         :param role: the role of a game
-        :return: set of contexts applicable to the game's role
+        :return: tuple of contexts applicable to the game's role, in the order they were added
         """
-        return self._contexts_per_role[game][role]
+        return tuple(self._contexts_per_role.get(game, {}).get(role, {}))
 
     def played_roles(self, context):
         """
-        Returns a dictionary of games roles to which a context is applicable
+        Returns the game roles to which a context is applicable
         :param context: an agent's context
-        :return: a dictionary of game roles where the context is applicable
+        :return: tuple of (game, role) pairs where the context is applicable
         """
-        return self._roles_per_context[context]
+        return tuple(
+            (game, role)
+            for game, roles in self._roles_per_context.get(context, {}).items()
+            for role in sorted(roles)
+        )
+
+    @property
+    def dependency_pairs(self):
+        """ Returns the list of ((game, role), (game, role)) dependencies, in the order they were added """
+        return list(self._dependency_pairs)
+
+    @property
+    def topology(self):
+        """ Returns the NetworkTopology of the network, freezing it if it was not frozen yet """
+        return self.freeze()
 
     @property
     def games(self):
@@ -134,4 +327,6 @@ class GamesNetwork(object):
 
     @property
     def contexts(self):
+        if self._topology is not None:
+            return self._topology.contexts
         return list(self._roles_per_context.keys())
@@ -0,0 +1,265 @@
+from ensm.norms import Norm
+import numpy as np
+import os
+
+
+class StateLayout(object):
+    """
+    Layout of the state of an ENSM in flat arrays. Action frequencies (and fitnesses) are laid out by
+    sub-population, context, norm and action (in this order), and norm frequencies by context and norm
+    """
+
+    def __init__(
+        self, population: list, contexts: list, action_spaces: dict, norm_spaces: dict
+    ):
+        """
+        Computes the position of each entry of the state in the flat arrays
+        :param population: list of AgentSubPopulation
+        :param contexts: list of contexts
+        :param action_spaces: dictionary of context -> actions
+        :param norm_spaces: dictionary of context -> norms
+        """
+        self._population = list(population)
+        self._contexts = list(contexts)
+        self._action_spaces = action_spaces
+        self._norm_spaces = norm_spaces
+
+        # Dictionary of (sub-population, context, norm) -> slice of its actions in the action arrays
+        self._action_slices = {}
+        offset = 0
+        for sub_population in self._population:
+            for context in self._contexts:
+                for norm in norm_spaces[context]:
+                    num_actions = len(action_spaces[context])
+                    self._action_slices[(sub_population, context, norm)] = slice(
+                        offset, offset + num_actions
+                    )
+                    offset += num_actions
+        self._num_actions = offset
+
+        # Dictionary of context -> slice of its norms in the norm arrays
+        self._norm_slices = {}
+        offset = 0
+        for context in self._contexts:
+            self._norm_slices[context] = slice(
+                offset, offset + len(norm_spaces[context])
+            )
+            offset += len(norm_spaces[context])
+        self._num_norms = offset
+
+    def pack_actions(self, attribute: str):
+        """
+        Packs an attribute of the sub-populations of the form context -> norm -> action -> value
+        (e.g., 'action_freqs' or 'fitness') in a flat array
+        :param attribute: name of the attribute of the sub-populations
+        :return: numpy array with the values
+        """
+        return np.fromiter(
+            (
+                getattr(sub_population, attribute)[c][n][a]
+                for sub_population in self._population
+                for c in self._contexts
+                for n in self._norm_spaces[c]
+                for a in self._action_spaces[c]
+            ),
+            dtype=np.float64,
+            count=self._num_actions,
+        )
+
+    def pack_norms(self, norm_freqs: dict):
+        """
+        Packs a dictionary of the form context -> norm -> frequency in a flat array
+        :param norm_freqs: dictionary of norm frequencies
+        :return: numpy array with the frequencies
+        """
+        return np.fromiter(
+            (norm_freqs[c][n] for c in self._contexts for n in self._norm_spaces[c]),
+            dtype=np.float64,
+            count=self._num_norms,
+        )
+
+    def action_slice(self, sub_population, context, norm):
+        """ Returns the slice of the actions of a (sub-population, context, norm) in the action arrays """
+        return self._action_slices[(sub_population, context, norm)]
+
+    def norm_slice(self, context):
+        """ Returns the slice of the norms of a context in the norm arrays """
+        return self._norm_slices[context]
+
+    def action_keys(self):
+        """ Returns the (sub-population, context, norm, action) of each entry of the action arrays, in order """
+        return [
+            (sub_population, c, n, a)
+            for sub_population in self._population
+            for c in self._contexts
+            for n in self._norm_spaces[c]
+            for a in self._action_spaces[c]
+        ]
+
+    def norm_keys(self):
+        """ Returns the (context, norm) of each entry of the norm arrays, in order """
+        return [(c, n) for c in self._contexts for n in self._norm_spaces[c]]
+
+    @property
+    def num_actions(self):
+        """ Returns the number of (sub-population, context, norm, action) entries """
+        return self._num_actions
+
+    @property
+    def num_norms(self):
+        """ Returns the number of (context, norm) entries """
+        return self._num_norms
+
+
+class TrajectoryHistory(object):
+    """
+    Bounded history of the last generations of an ENSM, stored in preallocated arrays. Each generation is
+    written twice in a buffer of twice the size of the history, so that the last generations are always
+    contiguous in memory and can be returned as views, without copying them
+    """
+
+    def __init__(self, size: int, layout: StateLayout):
+        """
+        Creates an empty history
+        :param size: maximum number of generations kept in the history
+        :param layout: layout of the state of the ENSM
+        """
+        assert size > 0, "The size of the history must be at least 1"
+
+        self._size = size
+        self._layout = layout
+        self._num_records = 0
+
+        self._generations = np.zeros(2 * size, dtype=np.int64)
+        self._action_freqs = np.zeros((2 * size, layout.num_actions), dtype=np.float64)
+        self._fitness = np.zeros((2 * size, layout.num_actions), dtype=np.float64)
+        self._norm_freqs = np.zeros((2 * size, layout.num_norms), dtype=np.float64)
+
+    def record(self, generation: int, norm_freqs: dict):
+        """
+        Records the state of a generation, overwriting the oldest generation if the history is full
+        :param generation: number of the generation
+        :param norm_freqs: dictionary of context -> norm -> frequency
+        """
+        # Recording the last generation again (e.g., after seeding its state) overwrites it
+        last_row = (self._num_records - 1) % self._size
+        if self._num_records > 0 and self._generations[last_row] == generation:
+            self._num_records -= 1
+
+        row = self._num_records % self._size
+        rows = [row, row + self._size]
+
+        self._generations[rows] = generation
+        self._action_freqs[rows] = self._layout.pack_actions("action_freqs")
+        self._fitness[rows] = self._layout.pack_actions("fitness")
+        self._norm_freqs[rows] = self._layout.pack_norms(norm_freqs)
+
+        self._num_records += 1
+
+    def _window(self):
+        """ Returns the slice of the buffer rows that contain the recorded generations, oldest first """
+        if self._num_records <= self._size:
+            return slice(0, self._num_records)
+
+        start = self._num_records % self._size
+        return slice(start, start + self._size)
+
+    def _row(self, generation: int):
+        """ Returns the buffer row of a recorded generation """
+        window = self._window()
+        generations = self._generations[window]
+
+        assert (
+            len(generations) > 0 and generations[0] <= generation <= generations[-1]
+        ), f"Generation {generation} is not in the history"
+
+        return window.start + int(generation - generations[0])
+
+    @staticmethod
+    def _read_only(array: np.ndarray):
+        view = array.view()
+        view.flags.writeable = False
+        return view
+
+    @property
+    def generations(self):
+        """ Returns the numbers of the recorded generations, oldest first """
+        return self._read_only(self._generations[self._window()])
+
+    def action_freqs_at(self, generation: int):
+        """ Returns the flat array of action frequencies of a generation (see StateLayout) """
+        return self._read_only(self._action_freqs[self._row(generation)])
+
+    def fitness_at(self, generation: int):
+        """ Returns the flat array of fitnesses of a generation (see StateLayout) """
+        return self._read_only(self._fitness[self._row(generation)])
+
+    def norm_freqs_at(self, generation: int):
+        """ Returns the flat array of norm frequencies of a generation (see StateLayout) """
+        return self._read_only(self._norm_freqs[self._row(generation)])
+
+    def action_freqs_of(self, sub_population, context, norm):
+        """
+        Returns the action frequencies of a (sub-population, context, norm) over the recorded generations
+        :return: array of shape (generations, actions), oldest generation first
+        """
+        columns = self._layout.action_slice(sub_population, context, norm)
+        return self._read_only(self._action_freqs[self._window(), columns])
+
+    def fitness_of(self, sub_population, context, norm):
+        """
+        Returns the action fitnesses of a (sub-population, context, norm) over the recorded generations
+        :return: array of shape (generations, actions), oldest generation first
+        """
+        columns = self._layout.action_slice(sub_population, context, norm)
+        return self._read_only(self._fitness[self._window(), columns])
+
+    def norm_freqs_of(self, context):
+        """
+        Returns the norm frequencies of a context over the recorded generations
+        :return: array of shape (generations, norms), oldest generation first
+        """
+        columns = self._layout.norm_slice(context)
+        return self._read_only(self._norm_freqs[self._window(), columns])
+
+    def save(self, path: str, key: str = None):
+        """
+        Saves the recorded generations to a NumPy archive, with the arrays of the generations, action
+        frequencies, fitnesses and norm frequencies (oldest generation first), and the sub-population,
+        context, norm and action of each of their columns
+        :param path: path of the archive
+        :param key: key of the run (see ResultCache.key), saved in the archive to identify the run (None to
+        not save it)
+        """
+        action_keys = self._layout.action_keys()
+        norm_keys = self._layout.norm_keys()
+        window = self._window()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(
+            path,
+            generations=self._generations[window],
+            action_freqs=self._action_freqs[window],
+            fitness=self._fitness[window],
+            norm_freqs=self._norm_freqs[window],
+            action_columns=np.array(
+                [[str(sp), c, str(Norm.name_of(n)), a] for sp, c, n, a in action_keys],
+                dtype=str,
+            ).reshape(len(action_keys), 4),
+            norm_columns=np.array(
+                [[c, str(Norm.name_of(n))] for c, n in norm_keys], dtype=str
+            ).reshape(len(norm_keys), 2),
+            key=np.array("" if key is None else key),
+        )
+
+    @property
+    def layout(self):
+        return self._layout
+
+    @property
+    def size(self):
+        return self._size
+
+    def __len__(self):
+        return min(self._num_records, self._size)
@@ -26,6 +26,16 @@ class Norm(object):
     def sanction(self):
         return self._sanction
 
+    @property
+    def name(self):
+        """ Returns a description of the norm that does not depend on its identifier """
+        return "({}) -> {} / {}".format(self._context, self._action, self._sanction)
+
+    @staticmethod
+    def name_of(norm):
+        """ Returns the name of a norm, or None for the empty norm of unregulated contexts """
+        return None if norm is None else norm.name
+
     def __str__(self):
         return "{}: ({}) -> {} / {}".format(
             self._id, self._context, self._action, self._sanction
@@ -35,10 +45,14 @@ class Norm(object):
         return self.__str__()
 
     def __eq__(self, other):
-        return self._context == other.context and self.action == other.action
+        return (
+            self._context == other.context
+            and self.action == other.action
+            and self.sanction == other.sanction
+        )
 
     def __hash__(self):
-        return hash(repr(self.context + self.action))
+        return hash((self.context, self.action, self.sanction))
 
 
 class NormReplicator(object):
@@ -68,11 +82,7 @@ class NormReplicator(object):
         for norm in norm_space:
             mean_utility = np.float64(0)
 
-            for game, role in [
-                (game, role)
-                for game, roles in games_net.played_roles(context)
-                for role in roles
-            ]:
+            for game, role in games_net.topology.played_roles(context):
 
                 # Get all action combinations that can be played in the game and in which the agent
                 # playing the given role is performing the specified action
@@ -0,0 +1,217 @@
+from collections.abc import Mapping
+from functools import partial
+from typing import List
+import numpy as np
+import itertools
+import hashlib
+import os
+
+
+class PayoffTable(Mapping):
+    """
+    A dense table of values indexed by the action combinations of a game. The table is backed by an array
+    with one axis per role of the game, where the position of each action along the axis of a role is given
+    by the action space of the role. Each entry of the array may be a scalar (e.g., the utility of the game)
+    or a vector (e.g., the payoff of each role of the game)
+    """
+
+    def __init__(self, array: np.ndarray, action_spaces: List[list]):
+        """
+        Creates a payoff table
+        :param array: array of shape (|A_0|, ..., |A_n-1|, ...) where A_i is the action space of role i
+        :param action_spaces: list with the ordered action space of each role
+        """
+        self._array = array
+        self._action_spaces = [list(actions) for actions in action_spaces]
+        self._action_indices = [
+            {action: i for i, action in enumerate(actions)}
+            for actions in self._action_spaces
+        ]
+
+        assert array.shape[: len(self._action_spaces)] == tuple(
+            len(actions) for actions in self._action_spaces
+        ), f"Payoff array of shape {array.shape} does not match action spaces {self._action_spaces}"
+
+    def __getitem__(self, action_combination: tuple):
+        index = tuple(
+            self._action_indices[role][action]
+            for role, action in enumerate(action_combination)
+        )
+        return self._array[index]
+
+    def __iter__(self):
+        return itertools.product(*self._action_spaces)
+
+    def __len__(self):
+        return int(np.prod([len(actions) for actions in self._action_spaces]))
+
+    @property
+    def array(self):
+        """ Returns the array backing the table """
+        return self._array
+
+    @property
+    def action_spaces(self):
+        """ Returns the ordered action space of each role """
+        return self._action_spaces
+
+    @property
+    def num_roles(self):
+        return len(self._action_spaces)
+
+    @staticmethod
+    def from_mapping(mapping: dict, action_spaces: List[list]):
+        """
+        Creates a payoff table from a dictionary of action combinations to values
+        :param mapping: dictionary of action combination -> value (scalar or list of values)
+        :param action_spaces: list with the ordered action space of each role
+        :return: a PayoffTable
+        :raises KeyError: if the mapping has action combinations that are not in the action spaces
+        """
+        shape = tuple(len(actions) for actions in action_spaces)
+        value_shape = np.shape(next(iter(mapping.values())))
+        array = np.empty(shape + value_shape, dtype=np.float64)
+
+        table = PayoffTable(array=array, action_spaces=action_spaces)
+
+        # Action combinations with unknown actions (e.g., typos in a configuration) would be silently ignored
+        unknown = [
+            action_combination
+            for action_combination in mapping
+            if len(action_combination) != table.num_roles
+            or any(
+                action not in table._action_indices[role]
+                for role, action in enumerate(action_combination)
+            )
+        ]
+        if unknown:
+            raise KeyError(
+                f"Unknown action combinations {unknown} for action spaces {table.action_spaces}"
+            )
+
+        for action_combination in table:
+            assert (
+                action_combination in mapping
+            ), f"Missing payoff of action combination {action_combination}"
+
+            index = tuple(
+                table._action_indices[role][action]
+                for role, action in enumerate(action_combination)
+            )
+            array[index] = mapping[action_combination]
+
+        return table
+
+
+def is_table_file(table_cfg):
+    """
+    Returns whether the configuration of a table of utilities or payoffs references an array file,
+    instead of listing the values of each action combination
+    :param table_cfg: configuration of the table
+    :return: True if the table is stored in a file
+    """
+    return isinstance(table_cfg, Mapping) and "file" in table_cfg
+
+
+def load_payoff_table(
+    table_cfg, num_roles: int, action_spaces: List[list] = None, cache_dir: str = None
+):
+    """
+    Loads a table of utilities or payoffs from an array file. The configuration of the table is of the form:
+
+        file: path to a .npy, .npz or .csv file
+        key: name of the array within a .npz file (optional, defaults to its first array)
+        actions: ordered action space of each role (optional if action_spaces is provided)
+
+    Arrays in .npy files are memory-mapped, so that they are never fully loaded in memory. Arrays in .npz and
+    .csv files are loaded in memory, unless a cache directory is given, where they are converted to .npy files
+    (see _cached_npy) that are memory-mapped and reused while they are newer than the original files. CSV files
+    must contain one row per action combination (in row-major order of the action spaces) and one column per
+    value
+    :param table_cfg: configuration of the table
+    :param num_roles: number of roles of the game
+    :param action_spaces: ordered action space of each role of the game. The actions declared by the table
+    must match them
+    :param cache_dir: directory of the .npy copies of .npz and .csv files (None to load them in memory)
+    :return: a PayoffTable
+    """
+    path = table_cfg["file"]
+    table_action_spaces = table_cfg.get("actions", action_spaces)
+
+    assert table_action_spaces is not None, f"Missing 'actions' of payoff table {path}"
+    assert (
+        len(table_action_spaces) == num_roles
+    ), f"Payoff table {path} must declare the actions of {num_roles} roles"
+    assert action_spaces is None or [list(a) for a in table_action_spaces] == [
+        list(a) for a in action_spaces
+    ], f"The actions {table_action_spaces} of payoff table {path} do not match the actions {action_spaces} of its game"
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        return PayoffTable(
+            array=np.load(path, mmap_mode="r"), action_spaces=table_action_spaces
+        )
+    elif extension == ".npz":
+        key = table_cfg.get("key")
+        suffix = f".{key}.npy" if key is not None else ".npy"
+        load = partial(_load_npz_array, path=path, key=key)
+    elif extension == ".csv":
+        suffix = ".npy"
+        load = partial(
+            _load_csv_array,
+            path=path,
+            shape=tuple(len(actions) for actions in table_action_spaces),
+        )
+    else:
+        raise ValueError(f"Unsupported payoff table format: {path}")
+
+    if cache_dir is None:
+        array = load()
+    else:
+        array = np.load(
+            _cached_npy(path=path, suffix=suffix, load=load, cache_dir=cache_dir),
+            mmap_mode="r",
+        )
+    return PayoffTable(array=array, action_spaces=table_action_spaces)
+
+
+def _cached_npy(path: str, suffix: str, load, cache_dir: str):
+    """
+    Returns the path of a .npy copy of the array of a file in a cache directory, (re)writing it if it is missing
+    or older than the file. The copy is written to a temporary file and then renamed, so that processes that load
+    the same table concurrently never read a partially written copy
+    :param path: path of the original file
+    :param suffix: suffix appended to the name of the copy
+    :param load: function that loads the array of the original file
+    :param cache_dir: directory of the copies
+    :return: path of the .npy copy
+    """
+    # Files with the same name in different directories have their own copies
+    path_hash = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:16]
+    npy_path = os.path.join(cache_dir, f"{os.path.basename(path)}.{path_hash}{suffix}")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    if not os.path.exists(npy_path) or os.path.getmtime(npy_path) < os.path.getmtime(
+        path
+    ):
+        temp_path = f"{npy_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            np.save(f, load())
+        os.replace(temp_path, npy_path)
+
+    return npy_path
+
+
+def _load_npz_array(path: str, key: str = None):
+    """ Loads an array of a .npz file (its first array if no key is given) """
+    with np.load(path) as arrays:
+        return arrays[key if key is not None else arrays.files[0]]
+
+
+def _load_csv_array(path: str, shape: tuple):
+    """ Loads a CSV table with one row per action combination as an array of the given shape of actions """
+    array = np.loadtxt(path, delimiter=",", dtype=np.float64, ndmin=2)
+    array = array.reshape(shape + (array.shape[1],))
+    if array.shape[-1] == 1:
+        array = array[..., 0]
+    return array
@@ -0,0 +1,224 @@
+import numpy as np
+
+
+class ActiveSet(object):
+    """
+    Set of the actions of each context that take part in the evolutionary dynamics. The standard replicator clips
+    the frequencies of the actions at a floor of 1e-10 (see StrategyReplicator.replicate), where the actions that
+    go extinct stay for as long as their fitness is not above the mean fitness. Actions whose frequency is at or
+    below an extinction threshold in every sub-population and norm of a context are pruned from replication and
+    from the action combinations played by the other players, and their frequencies are frozen. Every generation,
+    the fitness of the extinct actions is computed against the active ones, and those that would grow in some
+    sub-population and norm are reinstated before replication.
+
+    With the threshold at the floor (the default), the frozen frequencies are those that replication would keep,
+    and extinct actions are reinstated in the same generation in which they would start to grow, so pruning only
+    neglects the payoffs of the action combinations with extinct actions of other players, weighted by their
+    frequency (at most the floor). Higher thresholds also freeze actions that are still decaying towards the floor,
+    which then invade from higher frequencies than they would without pruning. Norms are not pruned, since their
+    frequencies do not evolve (see NormReplicator)
+    """
+
+    def __init__(self, contexts: list, action_spaces: dict, threshold: float = 1e-10):
+        """
+        Creates an active set with all the actions of each context
+        :param contexts: list of contexts
+        :param action_spaces: dictionary of context -> actions
+        :param threshold: frequency at or below which actions are considered extinct
+        """
+        assert threshold > 0, "The extinction threshold must be positive"
+
+        self._contexts = list(contexts)
+        self._action_spaces = action_spaces
+        self._threshold = threshold
+
+        # Dictionaries of context -> indices (and names) of the active and extinct actions in its action space
+        self._action_indices = {}
+        self._extinct_indices = {}
+        self._actions = {}
+        self._inactive_actions = {}
+        self.reset()
+
+    def reset(self):
+        """ Reinstates all actions (e.g., when the frequencies are set from another state) """
+        for context in self._contexts:
+            self._set_active(
+                context=context,
+                action_mask=np.ones(len(self._action_spaces[context]), dtype=bool),
+            )
+
+        # Dictionary of (game, role) -> active actions, cached until the active set changes
+        self._game_actions = {}
+
+    def resurrect(
+        self, population: list, base_fitness: dict, sanction_penalties: dict = None
+    ):
+        """
+        Reinstates the extinct actions that would grow in some sub-population and norm, that is, whose fitness
+        is above the mean fitness of the active actions, and sets their fitness. The fitness of the active actions
+        must have been computed
+        :param population: list of AgentSubPopulation
+        :param base_fitness: dictionary of sub-population -> context -> array with the fitness of each action
+        of the context before sanctions (see StrategyReplicator.update_fitness)
+        :param sanction_penalties: dictionary of context -> array of shape (norms, actions) with the penalties
+        of norm violators (see StrategyReplicator.sanction_penalties). None if norms are not sanctioned
+        """
+        changed = False
+
+        for context in self._contexts:
+            extinct = self._extinct_indices[context]
+            if len(extinct) == 0:
+                continue
+
+            actions = self._actions[context]
+            extinct_actions = self._inactive_actions[context]
+            penalties = 0.0
+            if sanction_penalties is not None:
+                penalties = sanction_penalties[context][:, extinct]
+
+            grows = np.zeros(len(extinct), dtype=bool)
+            extinct_fitness = {}
+            for sub_population in population:
+                freqs, fitness = self._active_arrays(
+                    sub_population=sub_population, context=context, actions=actions
+                )
+                mean_fitness = np.sum(freqs * fitness, axis=1, keepdims=True)
+
+                # The frequency of an action grows if its fitness divided by the mean fitness is above 1
+                extinct_fitness[sub_population] = (
+                    np.broadcast_to(
+                        base_fitness[sub_population][context][extinct],
+                        (len(freqs), len(extinct)),
+                    )
+                    - penalties
+                )
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    grows |= np.any(
+                        extinct_fitness[sub_population] / mean_fitness > 1, axis=0
+                    )
+
+            if not np.any(grows):
+                continue
+
+            for sub_population, fitness in extinct_fitness.items():
+                for norm, norm_fitness in zip(
+                    sub_population.fitness[context], fitness[:, grows]
+                ):
+                    sub_population.fitness[context][norm].update(
+                        zip(
+                            [a for a, g in zip(extinct_actions, grows) if g],
+                            norm_fitness,
+                        )
+                    )
+
+            action_mask = np.zeros(len(self._action_spaces[context]), dtype=bool)
+            action_mask[self._action_indices[context]] = True
+            action_mask[extinct[grows]] = True
+            self._set_active(context=context, action_mask=action_mask)
+            changed = True
+
+        if changed:
+            self._game_actions = {}
+
+    def prune(self, population: list):
+        """
+        Removes from the active set the actions whose frequency is at or below the threshold in every
+        sub-population and norm of their context
+        :param population: list of AgentSubPopulation
+        """
+        changed = False
+
+        for context in self._contexts:
+            actions = self._actions[context]
+
+            alive = np.zeros(len(actions), dtype=bool)
+            for sub_population in population:
+                action_freqs = sub_population.action_freqs[context]
+                alive |= np.any(
+                    np.array(
+                        [[freqs[a] for a in actions] for freqs in action_freqs.values()]
+                    )
+                    > self._threshold,
+                    axis=0,
+                )
+
+            if np.all(alive):
+                continue
+
+            action_mask = np.zeros(len(self._action_spaces[context]), dtype=bool)
+            action_mask[self._action_indices[context][alive]] = True
+            self._set_active(context=context, action_mask=action_mask)
+            changed = True
+
+        if changed:
+            self._game_actions = {}
+
+    @staticmethod
+    def _active_arrays(sub_population, context, actions: list):
+        """
+        Returns the frequencies and fitnesses of some actions of a sub-population in a context
+        :return: tuple of arrays of shape (norms, actions)
+        """
+        freqs = np.array(
+            [
+                [action_freqs[a] for a in actions]
+                for action_freqs in sub_population.action_freqs[context].values()
+            ],
+            dtype=np.float64,
+        )
+        fitness = np.array(
+            [
+                [action_fitnesses[a] for a in actions]
+                for action_fitnesses in sub_population.fitness[context].values()
+            ],
+            dtype=np.float64,
+        )
+        return freqs, fitness
+
+    def _set_active(self, context, action_mask: np.ndarray):
+        action_space = self._action_spaces[context]
+        self._action_indices[context] = np.flatnonzero(action_mask)
+        self._extinct_indices[context] = np.flatnonzero(~action_mask)
+        self._actions[context] = [
+            action_space[i] for i in self._action_indices[context]
+        ]
+        self._inactive_actions[context] = [
+            action_space[i] for i in self._extinct_indices[context]
+        ]
+
+    def actions(self, context):
+        """ Returns the active actions of a context, in the order of its action space """
+        return self._actions[context]
+
+    def inactive_actions(self, context):
+        """ Returns the extinct actions of a context, in the order of its action space """
+        return self._inactive_actions[context]
+
+    def action_indices(self, context):
+        """ Returns the indices of the active actions of a context in its action space """
+        return self._action_indices[context]
+
+    def game_actions(self, game, role: int, contexts_playing: tuple):
+        """
+        Returns the actions of a game role that are active in some context that plays it
+        :param game: a game
+        :param role: a role of the game
+        :param contexts_playing: contexts that play the role of the game
+        :return: list of actions, in the order of the action space of the role
+        """
+        if (game, role) not in self._game_actions:
+            active = {a for c in contexts_playing for a in self._actions[c]}
+            self._game_actions[(game, role)] = [
+                a for a in game.action_space(role) if a in active
+            ]
+
+        return self._game_actions[(game, role)]
+
+    @property
+    def num_actions(self):
+        """ Returns the number of active (context, action) entries """
+        return sum(len(indices) for indices in self._action_indices.values())
+
+    @property
+    def threshold(self):
+        return self._threshold
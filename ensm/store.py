@@ -0,0 +1,186 @@
+from ensm.games import Game, GamesNetwork
+from ensm.payoffs import PayoffTable
+import numpy as np
+import struct
+import json
+import os
+
+
+class ModelStore(object):
+    """
+    Store of the compiled model of a MAS (its games, their utilities, the dependencies of the games network
+    and the payoffs of each sub-population) in a single file. The model is published once, and then any number
+    of processes can attach to it: the utility and payoff tables are read-only views of the memory-mapped file,
+    so the operating system shares a single copy of them between all processes. Placing the file in a
+    memory-backed file system (e.g., /dev/shm) keeps it in shared memory
+    """
+
+    # Alignment (in bytes) of the arrays within the file
+    ALIGNMENT = 64
+
+    def __init__(self, path: str):
+        """
+        Creates a store of a compiled model
+        :param path: path of the file of the store
+        """
+        self._path = path
+
+    def publish(self, games_net: GamesNetwork, payoffs: dict, key: str = None):
+        """
+        Publishes a compiled model in the store, replacing any previous model atomically
+        :param games_net: the games network of the MAS
+        :param payoffs: dictionary of sub-population name -> game -> PayoffTable
+        :param key: identifier of the model (e.g., a hash of its configuration)
+        """
+        arrays = []
+
+        def add_table(table: PayoffTable):
+            arrays.append(np.ascontiguousarray(table.array, dtype=np.float64))
+            return {
+                "array": len(arrays) - 1,
+                "action_spaces": table.action_spaces,
+            }
+
+        manifest = {
+            "key": key,
+            "games": [
+                {
+                    "name": game.name,
+                    "contexts": list(game.contexts),
+                    "sanctions": game.sanctions,
+                    "symmetric": game.symmetric,
+                    "utilities": add_table(self._to_table(game)),
+                }
+                for game in games_net.games.values()
+            ],
+            "dependencies": [
+                [game_a.name, role_a, game_b.name, role_b]
+                for (game_a, role_a), (game_b, role_b) in games_net.dependency_pairs
+            ],
+            "payoffs": {
+                name: {game.name: add_table(table) for game, table in tables.items()}
+                for name, tables in payoffs.items()
+            },
+        }
+
+        # Lay out the arrays after the manifest, each of them aligned. The manifest includes the layout,
+        # so grow the space reserved for it until it fits
+        header_size = self._align(8 + len(json.dumps(manifest)))
+        while True:
+            offset = header_size
+            manifest["arrays"] = []
+            for array in arrays:
+                manifest["arrays"].append(
+                    {"offset": offset, "shape": list(array.shape)}
+                )
+                offset = self._align(offset + array.nbytes)
+
+            encoded_manifest = json.dumps(manifest).encode()
+            if 8 + len(encoded_manifest) <= header_size:
+                break
+            header_size = self._align(8 + len(encoded_manifest))
+
+        # Write to a temporary file and rename it, so that processes never attach to a partial model
+        tmp_path = f"{self._path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(struct.pack("<Q", len(encoded_manifest)))
+            f.write(encoded_manifest)
+            for array, layout in zip(arrays, manifest["arrays"]):
+                f.seek(layout["offset"])
+                array.tofile(f)
+            f.truncate(max(offset, header_size))
+        os.replace(tmp_path, self._path)
+
+    def attach(self, key: str = None):
+        """
+        Attaches to the compiled model of the store, without copying its tables
+        :param key: identifier of the expected model (None to attach to any model)
+        :return: tuple (games_net, payoffs) where payoffs is a dictionary of sub-population name -> game ->
+        PayoffTable. All tables are read-only views of the memory-mapped store. None if a key is given and
+        the store does not hold its model
+        """
+        # Read the manifest and map the arrays from the same open file, since another process may replace
+        # the model in the meantime
+        try:
+            with open(self._path, "rb") as f:
+                manifest = self._read_manifest(f)
+                if key is not None and manifest["key"] != key:
+                    return None
+                buffer = np.memmap(f, dtype=np.uint8, mode="r")
+        except FileNotFoundError:
+            if key is not None:
+                return None
+            raise
+
+        def attach_table(table_cfg: dict):
+            layout = manifest["arrays"][table_cfg["array"]]
+            array = np.ndarray(
+                shape=tuple(layout["shape"]),
+                dtype=np.float64,
+                buffer=buffer,
+                offset=layout["offset"],
+            )
+            return PayoffTable(array=array, action_spaces=table_cfg["action_spaces"])
+
+        games = {
+            game_cfg["name"]: Game(
+                name=game_cfg["name"],
+                contexts=game_cfg["contexts"],
+                utilities=attach_table(game_cfg["utilities"]),
+                sanctions=game_cfg["sanctions"],
+                symmetric=game_cfg.get("symmetric", False),
+            )
+            for game_cfg in manifest["games"]
+        }
+        games_net = GamesNetwork(
+            games=games,
+            dependencies=[
+                ((games[name_a], role_a), (games[name_b], role_b))
+                for name_a, role_a, name_b, role_b in manifest["dependencies"]
+            ],
+        )
+        games_net.freeze()
+
+        payoffs = {
+            name: {
+                games[game_name]: attach_table(table_cfg)
+                for game_name, table_cfg in tables.items()
+            }
+            for name, tables in manifest["payoffs"].items()
+        }
+
+        return games_net, payoffs
+
+    def manifest(self):
+        """ Returns the manifest of the compiled model of the store """
+        with open(self._path, "rb") as f:
+            return self._read_manifest(f)
+
+    @property
+    def key(self):
+        """ Returns the identifier of the model in the store, or None if there is no model """
+        if not os.path.exists(self._path):
+            return None
+        return self.manifest()["key"]
+
+    @property
+    def path(self):
+        return self._path
+
+    @staticmethod
+    def _read_manifest(f):
+        (size,) = struct.unpack("<Q", f.read(8))
+        return json.loads(f.read(size).decode())
+
+    @staticmethod
+    def _to_table(game: Game):
+        """ Returns the utilities of a game as a PayoffTable """
+        if isinstance(game.utilities, PayoffTable):
+            return game.utilities
+        return PayoffTable.from_mapping(
+            mapping=game.utilities,
+            action_spaces=[game.action_space(r) for r in range(game.num_roles)],
+        )
+
+    def _align(self, offset: int):
+        return -(-offset // self.ALIGNMENT) * self.ALIGNMENT
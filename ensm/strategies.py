@@ -1,11 +1,39 @@
 from ensm.agents import AgentSubPopulation
 from ensm.games import GamesNetwork, Game
+from ensm.pruning import ActiveSet
 from ensm.norms import Norm
 import numpy as np
-import itertools
 
 
 class StrategyReplicator(object):
+    @staticmethod
+    def sanction_penalties(action_spaces: dict, norm_spaces: dict):
+        """
+        Computes the payoff penalty that the agents with each norm receive when performing each action,
+        that is, the sanction of the norm if the action violates it (it is not the action prescribed by the norm)
+        :param action_spaces: dictionary of context -> actions
+        :param norm_spaces: dictionary of context -> norms
+        :return: dictionary of context -> array of shape (norms, actions) with the penalties
+        """
+        penalties = {}
+        for context in norm_spaces:
+            penalties[context] = np.array(
+                [
+                    [
+                        0.0
+                        if norm is None
+                        or norm.sanction is None
+                        or norm.action == action
+                        else norm.sanction
+                        for action in action_spaces[context]
+                    ]
+                    for norm in norm_spaces[context]
+                ],
+                dtype=np.float64,
+            ).reshape(len(norm_spaces[context]), len(action_spaces[context]))
+
+        return penalties
+
     @staticmethod
     def update_fitness(
         sub_population: AgentSubPopulation,
@@ -14,6 +42,8 @@ class StrategyReplicator(object):
         norm_spaces: dict,
         mean_action_freqs_by_game: dict,
         fitness_aggregation,
+        sanction_penalties: dict = None,
+        active_set: ActiveSet = None,
     ):
         """
 
@@ -23,35 +53,119 @@ class StrategyReplicator(object):
         :param norm_spaces:
         :param mean_action_freqs_by_game:
         :param fitness_aggregation:
-        :return:
+        :param sanction_penalties: dictionary of context -> array of shape (norms, actions) with the
+        penalties of norm violators (see sanction_penalties). None if norms are not sanctioned
+        :param active_set: ActiveSet with the active actions (None for all). Only the action combinations with
+        active actions of the other players are played, and only the fitness of the active actions is stored (extinct
+        actions keep their last fitness)
+        :return: dictionary of context -> array with the fitness of each action of the context before sanctions
         """
 
-        for context in games_net.contexts:
-            for action in action_spaces[context]:
-                for norm in norm_spaces[context]:
-                    all_fitnesses = []
-
-                    # Compute the fitness values of the sub-population in each co-dependent game that
-                    # they play when they perceive the context
-                    all_played_roles = games_net.played_roles(context).items()
-                    for game, role in [
-                        (game, role)
-                        for game, roles in all_played_roles
-                        for role in roles
-                    ]:
-                        fitness_in_game = StrategyReplicator._compute_fitness_in_game(
+        topology = games_net.topology
+
+        # Fitness of each action in each symmetric game, which is the same for all roles, and in each
+        # role of the other games
+        symmetric_fitness = {}
+        game_fitness = {}
+        base_fitnesses = {}
+
+        for context in topology.contexts:
+            action_space = action_spaces[context]
+            norm_space = norm_spaces[context]
+            penalties = (
+                None if sanction_penalties is None else sanction_penalties[context]
+            )
+
+            base_fitness = np.empty(len(action_space), dtype=np.float64)
+
+            for i, action in enumerate(action_space):
+                all_fitnesses = []
+
+                # Compute the fitness values of the sub-population in each co-dependent game that
+                # they play when they perceive the context
+                for game, role in topology.played_roles(context):
+                    if game.symmetric:
+                        if game not in symmetric_fitness:
+                            symmetric_fitness[game] = game.reduction.fitness(
+                                table=sub_population.payoff[game],
+                                action_freqs=mean_action_freqs_by_game[game][0],
+                            )
+                        all_fitnesses.append(symmetric_fitness[game].get(action, 0.0))
+                        continue
+
+                    if (game, role) not in game_fitness:
+                        game_fitness[
+                            (game, role)
+                        ] = StrategyReplicator._compute_fitness_in_game(
                             game=game,
                             role=role,
-                            action=action,
                             sub_population=sub_population,
                             mean_action_freqs_by_game=mean_action_freqs_by_game,
+                            opponent_action_spaces=None
+                            if active_set is None
+                            else [
+                                active_set.game_actions(
+                                    game, r, topology.contexts_playing(game, r)
+                                )
+                                for r in range(game.num_roles)
+                            ],
                         )
-                        all_fitnesses.append(fitness_in_game)
+                    all_fitnesses.append(game_fitness[(game, role)].get(action, 0.0))
 
-                    # Aggregate all fitness using a pre-defined fitness aggregation function
-                    sub_population.fitness[context][norm][action] = fitness_aggregation(
-                        all_fitnesses
-                    )
+                # Aggregate all fitness using a pre-defined fitness aggregation function
+                base_fitness[i] = fitness_aggregation(all_fitnesses)
+
+            base_fitnesses[context] = base_fitness
+
+            # The base fitness of extinct actions is only used to decide whether they are reinstated
+            if active_set is not None:
+                action_space = active_set.actions(context)
+                base_fitness = base_fitness[active_set.action_indices(context)]
+                if penalties is not None:
+                    penalties = penalties[:, active_set.action_indices(context)]
+
+            # The base fitness of each action does not depend on the norm of the agents. Sanctions are
+            # then applied to the agents that violate their norms as a broadcast adjustment
+            norm_fitness = np.broadcast_to(
+                base_fitness, (len(norm_space), len(action_space))
+            )
+            if penalties is not None:
+                norm_fitness = norm_fitness - penalties
+
+            for norm, fitness in zip(norm_space, norm_fitness):
+                sub_population.fitness[context][norm].update(zip(action_space, fitness))
+
+        return base_fitnesses
+
+    @staticmethod
+    def group_by_payoff_profile(population: list):
+        """
+        Groups the sub-populations of a population that have identical payoffs. The fitness of the
+        sub-populations of a group is the same, so it only needs to be computed once per group
+        :param population: list of AgentSubPopulation
+        :return: list of groups (lists) of AgentSubPopulation, in order of appearance in the population
+        """
+        groups = {}
+        for sub_population in population:
+            groups.setdefault(sub_population.payoff_profile, []).append(sub_population)
+
+        return list(groups.values())
+
+    @staticmethod
+    def share_fitness(
+        sub_population: AgentSubPopulation, members: list, norm_spaces: dict
+    ):
+        """
+        Copies the fitness of a sub-population to other sub-populations with its same payoff profile
+        :param sub_population: sub-population whose fitness has been updated
+        :param members: list of AgentSubPopulation with the same payoff profile
+        :param norm_spaces: dictionary of context -> norms
+        """
+        for context, norms in norm_spaces.items():
+            for norm in norms:
+                fitness = sub_population.fitness[context][norm]
+                for member in members:
+                    member.fitness[context][norm].update(fitness)
 
     @staticmethod
     def replicate(
@@ -59,6 +173,7 @@ class StrategyReplicator(object):
         games_net: GamesNetwork,
         action_spaces: dict,
         norm_spaces: dict,
+        active_set: ActiveSet = None,
     ):
         """
 
@@ -66,10 +181,16 @@ class StrategyReplicator(object):
         :param games_net:
         :param action_spaces:
         :param norm_spaces:
+        :param active_set: ActiveSet with the actions to replicate (None for all). The frequencies of extinct
+        actions are frozen
         :return:
         """
-        for context in games_net.contexts:
+        for context in games_net.topology.contexts:
             action_space = action_spaces[context]
+            inactive_actions = []
+            if active_set is not None:
+                action_space = active_set.actions(context)
+                inactive_actions = active_set.inactive_actions(context)
 
             for norm in norm_spaces[context]:
 
@@ -93,76 +214,142 @@ class StrategyReplicator(object):
                         1e-10,
                     )
 
-                # Normalise so that all action frequencies sum up to 1 (just in case due to float point precision)
-                total_freq = np.sum([action_freqs[a] for a in action_space])
+                # Normalise so that all action frequencies sum up to 1 (just in case due to float point precision).
+                # The frozen frequencies of extinct actions are kept as they are
+                frozen_freq = np.sum([action_freqs[a] for a in inactive_actions])
+                total_freq = np.sum([action_freqs[a] for a in action_space]) / (
+                    1 - frozen_freq
+                )
                 for action in action_space:
                     action_freqs[action] /= total_freq
 
     @staticmethod
-    def _compute_fitness_in_game(
-        game: Game,
-        role: int,
-        action: str,
-        sub_population: AgentSubPopulation,
-        mean_action_freqs_by_game: dict,
+    def log_frequencies(
+        population: list, contexts: list, action_spaces: dict, norm_spaces: dict
     ):
         """
+        Computes the log-weights of the action frequencies of a population, as used by replicate_log
+        :param population: list of AgentSubPopulation
+        :param contexts: list of contexts
+        :param action_spaces: dictionary of context -> actions
+        :param norm_spaces: dictionary of context -> norms
+        :return: dictionary of context -> array of shape (sub-populations, norms, actions) with the logarithm
+        of the action frequencies
+        """
+        with np.errstate(divide="ignore"):
+            return {
+                context: np.log(
+                    np.array(
+                        [
+                            [
+                                [
+                                    sub_population.action_freqs[context][n][a]
+                                    for a in action_spaces[context]
+                                ]
+                                for n in norm_spaces[context]
+                            ]
+                            for sub_population in population
+                        ],
+                        dtype=np.float64,
+                    ).reshape(
+                        len(population),
+                        len(norm_spaces[context]),
+                        len(action_spaces[context]),
+                    )
+                )
+                for context in contexts
+            }
 
-        :param game:
-        :param role:
-        :param action:
-        :param sub_population:
-        :param mean_action_freqs_by_game:
-        :return:
+    @staticmethod
+    def replicate_log(
+        population: list,
+        games_net: GamesNetwork,
+        action_spaces: dict,
+        norm_spaces: dict,
+        log_freqs: dict,
+        selection_strength: float = 1.0,
+    ):
         """
-        fitness = np.float64(0)
-
-        # Get all action combinations that can be played in the game and in which the agent
-        # playing the given role is performing the specified action
-        action_spaces = [game.action_space(role) for role in range(game.num_roles)]
-        action_combinations = [
-            ac for ac in itertools.product(*action_spaces) if ac[role] == action
-        ]
-
-        # Get the payoff of the player with the given role once all the players of the game
-        # perform each combination of actions. Accumulate the payoff in the fitness computation
-        # by weighting it with the frequency with which the action combination is played in the game,
-        # computed as the joint mean frequency of each action in the action combination
-        for action_combination in action_combinations:
-            payoff_in_game_role = sub_population.payoff[game][action_combination][role]
-
-            joint_action_freq = StrategyReplicator._get_action_combination_frequency(
-                game=game,
-                action_combination=action_combination,
-                reference_role=role,
-                mean_action_freqs_by_game=mean_action_freqs_by_game,
+        Replicates the action frequencies of a population with the exponential replicator equation, that is,
+        x'(a) = x(a) exp(s f(a)) / sum_b x(b) exp(s f(b)), where s is the selection strength. Frequencies are kept
+        as log-weights, so that the update is an addition followed by a log-sum-exp normalisation of all the
+        sub-populations and norms of each context at once. The update is invariant to shifts of the fitness,
+        so negative payoffs are handled as any other, and no frequency ever reaches zero in log space
+        :param population: list of AgentSubPopulation
+        :param games_net: the games network of the MAS
+        :param action_spaces: dictionary of context -> actions
+        :param norm_spaces: dictionary of context -> norms
+        :param log_freqs: dictionary of context -> array of shape (sub-populations, norms, actions) with the
+        log-weights of the action frequencies (see log_frequencies), which is updated in place
+        :param selection_strength: selection strength of the update
+        """
+        for context in games_net.topology.contexts:
+            action_space = action_spaces[context]
+            norm_space = norm_spaces[context]
+            weights = log_freqs[context]
+
+            fitness = np.array(
+                [
+                    [
+                        [sub_population.fitness[context][n][a] for a in action_space]
+                        for n in norm_space
+                    ]
+                    for sub_population in population
+                ],
+                dtype=np.float64,
+            ).reshape(len(population), len(norm_space), len(action_space))
+
+            # Normalise in log space
+            updated = weights + selection_strength * fitness
+            max_weight = np.max(updated, axis=-1, keepdims=True)
+            updated -= max_weight + np.log(
+                np.sum(np.exp(updated - max_weight), axis=-1, keepdims=True)
             )
-            fitness += payoff_in_game_role * joint_action_freq
+            weights[...] = updated
 
-        return fitness
+            freqs = np.exp(updated)
+            for sub_population, sub_population_freqs in zip(population, freqs):
+                for norm, norm_freqs in zip(norm_space, sub_population_freqs):
+                    sub_population.action_freqs[context][norm].update(
+                        zip(action_space, norm_freqs)
+                    )
 
     @staticmethod
-    def _get_action_combination_frequency(
+    def _compute_fitness_in_game(
         game: Game,
-        action_combination: tuple,
-        reference_role: int,
+        role: int,
+        sub_population: AgentSubPopulation,
         mean_action_freqs_by_game: dict,
+        opponent_action_spaces: list = None,
     ):
-
         """
-        Returns the joint probability that the agents of a MAS will play the game by adopting
-        a given combination of actions when playing each role
-        :return:
+        Computes the expected payoff of each action of the player of a role of a game against the players of
+        the other roles, who draw their actions from the mean frequencies of their roles
+        :param game: a game
+        :param role: the role of the player in the game
+        :param sub_population: AgentSubPopulation with the payoffs of the player
+        :param mean_action_freqs_by_game: dictionary of game -> role -> action -> mean frequency
+        :param opponent_action_spaces: list with the actions of each role that the other players can perform
+        (None for the whole action space of each role). Combinations with other actions are skipped
+        :return: dictionary of action -> fitness
         """
-        # Get roles not played by the reference agent
-        roles = [r for r in range(len(action_combination)) if r != reference_role]
+        # Contract the payoffs of the role with the mean frequencies of each other role, from the last role
+        # to the first, so that the payoff of each action combination is weighted by its joint frequency
+        payoffs = np.asarray(sub_population.payoff[game].array)[..., role]
+        for r in reversed(range(game.num_roles)):
+            if r == role:
+                continue
 
-        # Get the global (mean) frequency of the action played by each role and mutiply them all
-        # to compute the frequency of the action combination
-        action_freqs = [
-            mean_action_freqs_by_game[game][role][action_combination[role]]
-            for role in roles
-        ]
-        action_comb_freq = np.prod(action_freqs)
+            role_freqs = mean_action_freqs_by_game[game][r]
+            if opponent_action_spaces is None:
+                freqs = [role_freqs[a] for a in game.action_space(r)]
+            else:
+                actions = set(opponent_action_spaces[r])
+                freqs = [
+                    role_freqs[a] if a in actions else 0.0 for a in game.action_space(r)
+                ]
+            payoffs = np.tensordot(
+                payoffs, np.array(freqs, dtype=np.float64), axes=(r, 0)
+            )
 
-        return action_comb_freq
+        return dict(zip(game.action_space(role), payoffs))
@@ -0,0 +1,219 @@
+from typing import Callable, List
+import numpy as np
+import itertools
+
+
+class AdaptiveSweep(object):
+    """
+    Sweep of a box of parameter values that concentrates the runs near the boundaries between the regions with
+    different outcomes (phase boundaries). The box is first divided in a coarse grid of cells, whose corners
+    are run. The cells whose corners have different outcomes are then recursively subdivided in halves along
+    each parameter, running the new corners, up to a maximum depth. All points lie on the grid of the finest
+    resolution, and the runs of each level are evaluated in a single (possibly parallel) batch
+    """
+
+    def __init__(
+        self,
+        run_point: Callable,
+        bounds: List[tuple],
+        initial_points: int = 5,
+        max_depth: int = 3,
+        classify: Callable = None,
+    ):
+        """
+        Creates an adaptive sweep
+        :param run_point: function that runs a point (a tuple of parameter values) and returns its summary
+        (see ENSM.summary). It must be picklable to evaluate the points in parallel
+        :param bounds: list with the (lowest, highest) value of each parameter
+        :param initial_points: number of points of the coarse grid along each parameter
+        :param max_depth: maximum number of times that a cell of the coarse grid is subdivided
+        :param classify: function that returns the class (a hashable value) of the outcome of a summary
+        (None to classify outcomes by their dominant actions and norms, see classify)
+        """
+        assert (
+            initial_points >= 2
+        ), "The coarse grid must have at least 2 points per parameter"
+        assert max_depth >= 0, "The maximum depth must be non-negative"
+
+        self._run_point = run_point
+        self._bounds = [(float(low), float(high)) for low, high in bounds]
+        self._max_depth = max_depth
+        self._classify = classify or AdaptiveSweep.classify
+
+        # Number of intervals of the finest grid along each parameter, and size of the coarse cells in them
+        self._cell_size = 2 ** max_depth
+        self._resolution = (initial_points - 1) * self._cell_size
+
+        # Dictionary of grid point (tuple of integer coordinates) -> summary and class index of its run
+        self._summaries = {}
+        self._labels = {}
+        self._classes = []
+
+        # Cells (lowest corner, size) that were not subdivided
+        self._leaves = []
+        self._num_levels = 0
+
+    @staticmethod
+    def classify(summary: dict):
+        """
+        Classifies the outcome of a run by whether it converged, cycled or timed out, and by the dominant action
+        and norm of each context
+        :param summary: summary of the run (see ENSM.summary)
+        :return: tuple (outcome, dominant) where dominant is a tuple of (context, dominant action, dominant norm),
+        sorted by context
+        """
+        return (
+            summary["outcome"],
+            tuple(
+                sorted(
+                    (context, action, summary["dominant_norms"].get(context))
+                    for context, action in summary["dominant_actions"].items()
+                )
+            ),
+        )
+
+    def run(self, executor=None):
+        """
+        Runs the sweep
+        :param executor: concurrent.futures.Executor to run the points of each level in parallel (None to run
+        them sequentially)
+        :return: self
+        """
+        num_dims = len(self._bounds)
+        num_cells = self._resolution // self._cell_size
+        cells = [
+            (tuple(c * self._cell_size for c in corner), self._cell_size)
+            for corner in itertools.product(range(num_cells), repeat=num_dims)
+        ]
+
+        while cells:
+            self._evaluate(
+                points={p for cell in cells for p in self._corners(*cell)},
+                executor=executor,
+            )
+            self._num_levels += 1
+
+            # Subdivide the cells whose corners disagree, unless they are already at the finest resolution
+            next_cells = []
+            for corner, size in cells:
+                labels = {self._labels[p] for p in self._corners(corner, size)}
+                if len(labels) == 1 or size == 1:
+                    self._leaves.append((corner, size))
+                    continue
+
+                half = size // 2
+                for offset in itertools.product((0, half), repeat=num_dims):
+                    next_cells.append(
+                        (tuple(c + o for c, o in zip(corner, offset)), half)
+                    )
+            cells = next_cells
+
+        return self
+
+    def _evaluate(self, points: set, executor=None):
+        """ Runs the points that have not been run yet, in a single batch """
+        points = sorted(p for p in points if p not in self._summaries)
+        values = [self.values_of(p) for p in points]
+
+        summaries = (
+            executor.map(self._run_point, values)
+            if executor is not None
+            else map(self._run_point, values)
+        )
+        for point, summary in zip(points, summaries):
+            self._summaries[point] = summary
+
+            label = self._classify(summary)
+            if label not in self._classes:
+                self._classes.append(label)
+            self._labels[point] = self._classes.index(label)
+
+    @staticmethod
+    def _corners(corner: tuple, size: int):
+        """ Returns the grid points of the corners of a cell """
+        return [
+            tuple(c + o for c, o in zip(corner, offset))
+            for offset in itertools.product((0, size), repeat=len(corner))
+        ]
+
+    def values_of(self, point: tuple):
+        """ Returns the parameter values of a grid point """
+        return tuple(
+            low + (high - low) * c / self._resolution
+            for c, (low, high) in zip(point, self._bounds)
+        )
+
+    def phase_diagram(self):
+        """
+        Returns the class of the outcome in each point of the finest grid. Points inside cells whose corners
+        agree take the class of the corners, and the rest take the class of the nearest run corner
+        :return: integer array with one axis of size resolution + 1 per parameter, with the class indices
+        (see classes)
+        """
+        num_dims = len(self._bounds)
+        diagram = np.full((self._resolution + 1,) * num_dims, -1, dtype=np.int64)
+
+        for corner, size in self._leaves:
+            corners = self._corners(corner, size)
+            labels = [self._labels[p] for p in corners]
+            box = tuple(slice(c, c + size + 1) for c in corner)
+            if len(set(labels)) == 1:
+                diagram[box] = labels[0]
+                continue
+
+            # Cells at the finest resolution that still disagree: assign each point to its nearest corner
+            grid = np.stack(
+                np.meshgrid(
+                    *[np.arange(c, c + size + 1) for c in corner], indexing="ij"
+                ),
+                axis=-1,
+            )
+            distances = np.stack(
+                [np.sum(np.abs(grid - np.array(p)), axis=-1) for p in corners], axis=-1
+            )
+            diagram[box] = np.array(labels)[np.argmin(distances, axis=-1)]
+
+        for point, label in self._labels.items():
+            diagram[point] = label
+
+        return diagram
+
+    @property
+    def points(self):
+        """ Returns the run grid points, in the order in which they were run """
+        return list(self._summaries)
+
+    @property
+    def summaries(self):
+        """ Returns a dictionary of grid point -> summary of its run """
+        return self._summaries
+
+    @property
+    def labels(self):
+        """ Returns a dictionary of grid point -> index of the class of its outcome """
+        return self._labels
+
+    @property
+    def classes(self):
+        """ Returns the list of the classes of the outcomes found """
+        return self._classes
+
+    @property
+    def num_runs(self):
+        """ Returns the number of points run """
+        return len(self._summaries)
+
+    @property
+    def num_uniform_runs(self):
+        """ Returns the number of points that a uniform grid of the finest resolution would run """
+        return (self._resolution + 1) ** len(self._bounds)
+
+    @property
+    def num_levels(self):
+        """ Returns the number of levels (batches) of runs """
+        return self._num_levels
+
+    @property
+    def resolution(self):
+        """ Returns the number of intervals of the finest grid along each parameter """
+        return self._resolution
@@ -0,0 +1,123 @@
+from ensm.payoffs import PayoffTable
+from math import factorial
+import numpy as np
+import itertools
+
+
+class SymmetricReduction(object):
+    """
+    Reduction of the fitness computation of a symmetric game, where all roles have the same action space and the
+    payoff of a player only depends on its own action and on the multiset of actions of the other players, no
+    matter which role each of them plays. If the other players draw their actions from the same frequencies,
+    the probability of each multiset is multinomial, so the fitness of each action is a sum over the
+    C(|A| + k -2, k - 1) multisets of the actions of the k - 1 other players, instead of over the |A|^(k - 1)
+    ordered action combinations
+    """
+
+    def __init__(self, num_roles: int, actions: list):
+        """
+        Enumerates the multisets of actions of the other players of a symmetric game
+        :param num_roles: number of roles (players) of the game
+        :param actions: action space of every role
+        """
+        self._actions = list(actions)
+        num_actions = len(self._actions)
+
+        # Multisets of the actions of the other players, as sorted tuples of action indices
+        multisets = list(
+            itertools.combinations_with_replacement(range(num_actions), num_roles - 1)
+        )
+
+        # Number of times that each multiset contains each action, and number of ordered action
+        # combinations of each multiset (multinomial coefficient)
+        self._counts = np.zeros((len(multisets), num_actions), dtype=np.int64)
+        for i, multiset in enumerate(multisets):
+            for action in multiset:
+                self._counts[i, action] += 1
+        self._coefficients = np.array(
+            [
+                factorial(num_roles - 1) / np.prod([factorial(c) for c in counts])
+                for counts in self._counts
+            ],
+            dtype=np.float64,
+        )
+
+        # Index of the action combination of each (action of role 0, multiset of the other roles)
+        self._combinations = tuple(
+            np.array(
+                [
+                    [
+                        action if role == 0 else multiset[role - 1]
+                        for multiset in multisets
+                    ]
+                    for action in range(num_actions)
+                ]
+            )
+            for role in range(num_roles)
+        )
+
+        # Dictionary of id(PayoffTable) -> (PayoffTable, array of shape (actions, multisets))
+        self._payoff_matrices = {}
+
+    def payoff_matrix(self, table: PayoffTable):
+        """
+        Returns the payoff of a player for each of its actions against each multiset of actions of the others
+        :param table: PayoffTable of action combination -> payoff of each role of the game
+        :return: array of shape (actions, multisets)
+        """
+        if id(table) not in self._payoff_matrices:
+            assert (
+                table.action_spaces[0] == self._actions
+            ), "The payoff table must have the actions of the game in the same order"
+            matrix = np.asarray(table.array, dtype=np.float64)[self._combinations][
+                ..., 0
+            ]
+            self._payoff_matrices[id(table)] = (table, matrix)
+
+        return self._payoff_matrices[id(table)][1]
+
+    def fitness(self, table: PayoffTable, action_freqs: dict):
+        """
+        Computes the expected payoff of each action of a player against other players that draw their actions
+        from the same frequencies
+        :param table: PayoffTable of action combination -> payoff of each role of the game
+        :param action_freqs: dictionary of action -> frequency of the other players
+        :return: dictionary of action -> fitness
+        """
+        freqs = np.array([action_freqs[a] for a in self._actions], dtype=np.float64)
+        multiset_freqs = self._coefficients * np.prod(freqs ** self._counts, axis=1)
+
+        return dict(zip(self._actions, self.payoff_matrix(table) @ multiset_freqs))
+
+    @property
+    def num_multisets(self):
+        """ Returns the number of multisets of actions of the other players """
+        return len(self._coefficients)
+
+    @staticmethod
+    def is_symmetric(table: PayoffTable, tol: float = 1e-12):
+        """
+        Checks whether a payoff table is symmetric, that is, whether all roles have the same action space, the
+        payoff of the first role does not change when the actions of the other roles are permuted, and the payoff
+        of each role is that of the first role once their actions are swapped
+        :param table: PayoffTable of action combination -> payoff of each role of the game
+        :param tol: numerical tolerance of the comparisons
+        :return: True if the table is symmetric
+        """
+        if any(actions != table.action_spaces[0] for actions in table.action_spaces):
+            return False
+
+        array = np.asarray(table.array)
+        num_roles = table.num_roles
+        payoffs = array[..., 0]
+
+        for role in range(2, num_roles):
+            if not np.allclose(payoffs, np.swapaxes(payoffs, 1, role), atol=tol):
+                return False
+        for role in range(1, num_roles):
+            if not np.allclose(
+                array[..., role], np.swapaxes(payoffs, 0, role), atol=tol
+            ):
+                return False
+
+        return True
@@ -0,0 +1,308 @@
+from ensm.norms import Norm
+from ensm.ensm import ENSM
+from copy import deepcopy
+import itertools
+import numpy as np
+import time
+
+
+class ReferenceENSM(ENSM):
+    """
+    ENSM that evolves the strategies with plain loops over the games network, as the original engines did:
+    the fitness of each sub-population, context, norm and action is computed from every action combination
+    of the games played in the context, without grouping sub-populations by payoff profile, reducing symmetric
+    games, pruning extinct actions or iterating over the compiled topology. It is only meant to check the
+    optimised engines, so its games network must not declare symmetric games (the players of each role
+    are kept apart)
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        assert not any(
+            game.symmetric for game in self.games_net.games.values()
+        ), "The games network of a reference ENSM must not have symmetric games"
+        assert (
+            self._active_set is None
+        ), "A reference ENSM does not prune extinct actions"
+
+    def _evolve_strategies(self):
+        """ Evolve strategies """
+        for sub_population in self.mas.population:
+
+            # Backup sub-population action frequencies
+            self._old_action_freqs[sub_population] = deepcopy(
+                sub_population.action_freqs
+            )
+
+            # Update sub-population fitness and replicate
+            self._update_sub_population_fitness(sub_population)
+            self._replicate(sub_population)
+
+    def _update_sub_population_fitness(self, sub_population):
+        """
+        Computes the fitness of each action of a sub-population in each context and norm as the minimum of
+        its expected payoff in the games played in the context, minus the sanction of the norm if the action
+        violates it
+        :param sub_population: sub-population whose fitness is computed
+        """
+        for context in self.games_net.contexts:
+            for action in self.action_spaces[context]:
+                fitness = min(
+                    self._compute_fitness_in_game(game, role, action, sub_population)
+                    for game, role in self.games_net.played_roles(context)
+                )
+
+                for norm in self.norm_spaces[context]:
+                    penalty = 0.0
+                    if (
+                        norm is not None
+                        and norm.sanction is not None
+                        and norm.action != action
+                    ):
+                        penalty = norm.sanction
+                    sub_population.fitness[context][norm][action] = fitness - penalty
+
+    def _compute_fitness_in_game(self, game, role, action, sub_population):
+        """
+        Returns the expected payoff of a sub-population when playing a role of a game by performing an action
+        """
+        fitness = np.float64(0)
+
+        for action_combination in itertools.product(
+            *[game.action_space(r) for r in range(game.num_roles)]
+        ):
+            if action_combination[role] != action:
+                continue
+
+            joint_action_freq = np.float64(1)
+            for r, a in enumerate(action_combination):
+                if r != role:
+                    joint_action_freq *= self._mean_action_freqs_by_game[game][r][a]
+
+            fitness += (
+                sub_population.payoff[game][action_combination][role]
+                * joint_action_freq
+            )
+
+        return fitness
+
+    def _replicate(self, sub_population):
+        """
+        Replicates the action frequencies of a sub-population with the replicator equation of the ENSM
+        :param sub_population: sub-population whose action frequencies are replicated
+        """
+        for context in self.games_net.contexts:
+            action_space = self.action_spaces[context]
+
+            for norm in self.norm_spaces[context]:
+                action_fitnesses = sub_population.fitness[context][norm]
+                action_freqs = sub_population.action_freqs[context][norm]
+
+                if self._replicator == "log":
+                    for action in action_space:
+                        action_freqs[action] *= np.exp(
+                            self._selection_strength * action_fitnesses[action]
+                        )
+                else:
+                    mean_fitness = sum(
+                        action_fitnesses[action] * action_freqs[action]
+                        for action in action_space
+                    )
+                    for action in action_space:
+                        action_freqs[action] = max(
+                            action_freqs[action]
+                            * (action_fitnesses[action] / mean_fitness),
+                            1e-10,
+                        )
+
+                total_freq = sum(action_freqs[action] for action in action_space)
+                for action in action_space:
+                    action_freqs[action] /= total_freq
+
+    def _update_action_frequencies(self):
+        """
+        Computes the mean frequency of each action in each context (for each norm and across norms) and
+        in each role of each game, averaged across all sub-populations
+        """
+        for context in self.games_net.contexts:
+            for action in self.action_spaces[context]:
+                mean_action_freq = np.float64(0)
+
+                for norm in self.norm_spaces[context]:
+                    mean_action_freq_by_norm = np.float64(0)
+                    for sub_population in self.mas.population:
+                        mean_action_freq_by_norm += (
+                            sub_population.action_freqs[context][norm][action]
+                            * sub_population.proportion
+                        )
+
+                    self._mean_action_freqs_by_norm[context][norm][
+                        action
+                    ] = mean_action_freq_by_norm
+                    mean_action_freq += (
+                        mean_action_freq_by_norm * self._norm_freqs[context][norm]
+                    )
+
+                self._mean_action_freqs_by_context[context][action] = mean_action_freq
+
+        for game in self.games_net.games.values():
+            for role in range(game.num_roles):
+                contexts_playing = self.games_net.contexts_playing(game, role)
+
+                for action in game.action_space(role):
+                    self._mean_action_freqs_by_game[game][role][action] = np.float64(
+                        sum(
+                            self._mean_action_freqs_by_context[context][action]
+                            for context in contexts_playing
+                        )
+                        / np.float64(len(contexts_playing))
+                    )
+
+
+class DifferentialVerifier(object):
+    """
+    Verifier of an ENSM with optimised engines (the candidate) against an ENSM with the reference engines
+    (the reference) over the same MAS. Both ENSMs are evolved from the same state, and the action and norm
+    frequencies that they compute are compared entry by entry, timing the generations of each of them
+    """
+
+    def __init__(
+        self, reference: ReferenceENSM, candidate: ENSM, tolerance: float = 1e-9
+    ):
+        """
+        Creates a verifier. The reference is seeded with the current state of the candidate
+        :param reference: ReferenceENSM over its own games network and population, built from the same
+        MAS configuration
+        :param candidate: ENSM with the optimised engines, over the same MAS configuration
+        :param tolerance: maximum deviation (in absolute value) allowed between any two frequencies
+        """
+        self._reference = reference
+        self._candidate = candidate
+        self._tolerance = tolerance
+
+        self._reference.warm_start(snapshot=self._candidate.snapshot())
+
+        layout = candidate.layout
+        self._action_keys = layout.action_keys()
+        self._norm_keys = layout.norm_keys()
+        self._action_deviations = np.zeros(layout.num_actions, dtype=np.float64)
+        self._norm_deviations = np.zeros(layout.num_norms, dtype=np.float64)
+        self._num_actions = layout.num_actions
+
+        self._reference_time = 0.0
+        self._candidate_time = 0.0
+        self._num_generations = 0
+        self._num_checks = 0
+
+    def run(self, num_generations: int, sample_interval: int = None):
+        """
+        Evolves the candidate for a number of generations, comparing it with the reference
+        :param num_generations: number of generations to evolve the candidate
+        :param sample_interval: None to evolve both ENSMs side by side and compare every generation, or the
+        interval between the generations in which the reference is seeded with the state of the candidate
+        and both evolve one generation from it (one-step checks), so that deviations do not accumulate
+        :return: report of the verification (see report)
+        """
+        for generation in range(1, num_generations + 1):
+            if self._candidate.finished:
+                break
+
+            check = sample_interval is None or generation % sample_interval == 0
+            if sample_interval is not None and check:
+                self._reference.warm_start(snapshot=self._candidate.snapshot())
+
+            start = time.perf_counter()
+            self._candidate.evolve()
+            self._candidate_time += time.perf_counter() - start
+            self._num_generations += 1
+
+            if check:
+                start = time.perf_counter()
+                self._reference.evolve()
+                self._reference_time += time.perf_counter() - start
+                self._compare()
+
+        return self.report()
+
+    def _compare(self):
+        """ Accumulates the deviations between the current states of the reference and the candidate """
+        deviations = np.abs(
+            self._reference.state_vector() - self._candidate.state_vector()
+        )
+        np.maximum(
+            self._action_deviations,
+            deviations[: self._num_actions],
+            out=self._action_deviations,
+        )
+        np.maximum(
+            self._norm_deviations,
+            deviations[self._num_actions :],
+            out=self._norm_deviations,
+        )
+        self._num_checks += 1
+
+    def report(self):
+        """
+        Returns the report of the verification so far
+        :return: dictionary with:
+            'passed': whether all deviations are within the tolerance
+            'tolerance': the tolerance
+            'num_generations': number of generations evolved by the candidate
+            'num_checks': number of generations compared
+            'max_deviation': maximum deviation of any frequency
+            'action_deviations': dictionary of sub-population -> context -> norm -> action -> maximum deviation
+            'norm_deviations': dictionary of context -> norm -> maximum deviation
+            'violations': list of [sub-population, context, norm, action, deviation] of the action frequencies
+            (action is None for norm frequencies) that deviate more than the tolerance, largest first
+            'reference_time', 'candidate_time': seconds spent evolving the reference (in the compared
+            generations) and the candidate (in all generations)
+            'speedup': ratio between the time per generation of the reference and that of the candidate
+        """
+        action_deviations = {}
+        violations = []
+        for (sub_population, c, n, a), deviation in zip(
+            self._action_keys, self._action_deviations.tolist()
+        ):
+            action_deviations.setdefault(str(sub_population), {}).setdefault(
+                c, {}
+            ).setdefault(Norm.name_of(n), {})[a] = deviation
+            if deviation > self._tolerance:
+                violations.append(
+                    [str(sub_population), c, Norm.name_of(n), a, deviation]
+                )
+
+        norm_deviations = {}
+        for (c, n), deviation in zip(self._norm_keys, self._norm_deviations.tolist()):
+            norm_deviations.setdefault(c, {})[Norm.name_of(n)] = deviation
+            if deviation > self._tolerance:
+                violations.append([None, c, Norm.name_of(n), None, deviation])
+
+        violations.sort(key=lambda violation: -violation[-1])
+
+        # The candidate evolves every generation, and the reference only the compared ones
+        speedup = None
+        if self._num_checks > 0 and self._candidate_time > 0:
+            speedup = (self._reference_time / self._num_checks) / (
+                self._candidate_time / self._num_generations
+            )
+
+        max_deviation = float(
+            max(
+                np.max(self._action_deviations, initial=0.0),
+                np.max(self._norm_deviations, initial=0.0),
+            )
+        )
+
+        return {
+            "passed": not violations,
+            "tolerance": self._tolerance,
+            "num_generations": self._num_generations,
+            "num_checks": self._num_checks,
+            "max_deviation": max_deviation,
+            "action_deviations": action_deviations,
+            "norm_deviations": norm_deviations,
+            "violations": violations,
+            "reference_time": self._reference_time,
+            "candidate_time": self._candidate_time,
+            "speedup": speedup,
+        }
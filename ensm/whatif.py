@@ -0,0 +1,324 @@
+from ensm.strategies import StrategyReplicator
+from ensm.payoffs import PayoffTable
+from ensm.norms import Norm
+from ensm.ensm import ENSM
+from typing import List
+import numpy as np
+import string
+
+
+class WhatIfEvaluator(object):
+    """
+    Evaluator of hypothetical changes to the state of an ENSM (e.g., once it has converged) without simulating
+    them. The action frequencies of the state are held fixed, and the fitness that each sub-population would
+    obtain in each context is computed for a batch of candidate changes at once, by contracting the payoff arrays
+    of the games with the mean action frequencies of their roles. Candidate changes are either norms imposed in
+    a context or perturbations of the payoffs of a sub-population in a game
+    """
+
+    def __init__(self, ensm: ENSM):
+        """
+        Captures the current state of an ENSM
+        :param ensm: an ENSM
+        """
+        self._topology = ensm.games_net.topology
+        self._population = list(ensm.mas.population)
+        self._action_spaces = ensm.action_spaces
+        self._norm_spaces = ensm.norm_spaces
+        self._sanction_penalties = StrategyReplicator.sanction_penalties(
+            action_spaces=ensm.action_spaces, norm_spaces=ensm.norm_spaces
+        )
+
+        # Payoff arrays of each sub-population in each game, with their axes in the order of the action
+        # spaces of the game roles
+        self._payoffs = {
+            sub_population: {
+                game: self._game_ordered(table=sub_population.payoff[game], game=game)
+                for game in ensm.games_net.games.values()
+            }
+            for sub_population in self._population
+        }
+
+        # Action frequencies of each sub-population (averaged across norms) in each context
+        # and of each sub-population with each norm, as arrays in the order of the action space
+        self._context_freqs = {}
+        self._norm_action_freqs = {}
+        for sub_population in self._population:
+            for context in self._topology.contexts:
+                action_space = self._action_spaces[context]
+                norm_freqs = ensm.norm_freqs[context]
+                norm_action_freqs = np.array(
+                    [
+                        [
+                            sub_population.action_freqs[context][n][a]
+                            for a in action_space
+                        ]
+                        for n in self._norm_spaces[context]
+                    ],
+                    dtype=np.float64,
+                ).reshape(len(self._norm_spaces[context]), len(action_space))
+
+                self._norm_action_freqs[(sub_population, context)] = norm_action_freqs
+                self._context_freqs[(sub_population, context)] = np.dot(
+                    [norm_freqs[n] for n in self._norm_spaces[context]],
+                    norm_action_freqs,
+                )
+
+        # Positions of the actions of each game role in the action space of each context that plays it
+        self._role_indices = {
+            (context, game, role): np.array(
+                [self._action_spaces[context].index(a) for a in game.action_space(role)]
+            )
+            for game, role in self._topology.game_roles
+            for context in self._topology.contexts_playing(game, role)
+        }
+
+    @staticmethod
+    def _game_ordered(table: PayoffTable, game):
+        """ Returns the array of a payoff table with its actions in the order of the action spaces of a game """
+        array = np.asarray(table.array, dtype=np.float64)
+        for role, actions in enumerate(table.action_spaces):
+            if actions != game.action_space(role):
+                order = [actions.index(a) for a in game.action_space(role)]
+                array = np.take(array, order, axis=role)
+        return array
+
+    def evaluate_norms(self, norms: List[Norm], compliance: float = 1.0):
+        """
+        Evaluates a batch of norms, each imposed on all the agents in its context. The agents comply with the
+        norm (they perform the action that it prescribes) in the given proportion, and the ones that violate it
+        receive its sanction
+        :param norms: list of candidate norms
+        :param compliance: proportion of the agents that comply with the imposed norm
+        :return: dictionary with:
+            'fitness': dictionary of sub-population name -> context -> array of shape (norms, actions) with the
+            fitness of each action of the agents of the sub-population with each candidate norm
+            'mean_fitness': dictionary of context -> array of shape (norms,) with the mean fitness of the
+            population in the context with each candidate norm
+            'utilities': array of shape (norms,) with the utility of each candidate norm, that is, the mean
+            fitness of the population in the context of the norm
+        """
+        num_candidates = len(norms)
+
+        # Action frequencies of each sub-population in each context with each candidate norm imposed
+        context_freqs = {}
+        penalties = {}
+        for context in self._topology.contexts:
+            action_space = self._action_spaces[context]
+            rows = [i for i, norm in enumerate(norms) if norm.context == context]
+            imposed = np.zeros((len(rows), len(action_space)))
+            imposed[
+                np.arange(len(rows)),
+                np.array(
+                    [action_space.index(norms[i].action) for i in rows], dtype=int
+                ),
+            ] = 1
+
+            for sub_population in self._population:
+                freqs = np.tile(
+                    self._context_freqs[(sub_population, context)], (num_candidates, 1)
+                )
+                freqs[rows] = (1 - compliance) * freqs[rows] + compliance * imposed
+                context_freqs[(sub_population, context)] = freqs
+
+            penalties[context] = np.zeros((num_candidates, len(action_space)))
+            penalties[context][rows] = (1 - imposed) * np.array(
+                [norms[i].sanction or 0.0 for i in rows], dtype=np.float64
+            ).reshape(-1, 1)
+
+        fitness = self._fitness(
+            context_freqs=context_freqs,
+            payoffs={
+                sub_population: {
+                    game: array[np.newaxis] for game, array in tables.items()
+                }
+                for sub_population, tables in self._payoffs.items()
+            },
+        )
+        for sub_population in self._population:
+            for context in self._topology.contexts:
+                fitness[sub_population][context] -= penalties[context]
+
+        mean_fitness = {
+            context: sum(
+                sub_population.proportion
+                * np.einsum(
+                    "ba,ba->b",
+                    context_freqs[(sub_population, context)],
+                    fitness[sub_population][context],
+                )
+                for sub_population in self._population
+            )
+            for context in self._topology.contexts
+        }
+        utilities = np.array(
+            [mean_fitness[norm.context][i] for i, norm in enumerate(norms)]
+        )
+
+        return {
+            "fitness": self._by_name(fitness),
+            "mean_fitness": mean_fitness,
+            "utilities": utilities,
+        }
+
+    def evaluate_payoff_deltas(
+        self, sub_population: str, game: str, deltas: np.ndarray
+    ):
+        """
+        Evaluates a batch of perturbations of the payoffs of a sub-population in a game. For example, the deltas
+        of a ±10% change of the payoff of the first role in the first action combination are:
+
+            deltas = np.zeros((2,) + table.array.shape)
+            deltas[:, 0, 0, 0] = [0.1, -0.1] * table.array[0, 0, 0]
+
+        :param sub_population: name of the sub-population
+        :param game: name of the game
+        :param deltas: array of shape (candidates,) + the shape of the payoff array of the game with the changes
+        of each payoff, in the order of the action spaces of the game roles
+        :return: dictionary with:
+            'fitness': dictionary of sub-population name -> context -> norm -> array of shape (candidates, actions)
+            with the fitness of each action of the agents of the sub-population with the norm
+            'mean_fitness': dictionary of context -> array of shape (candidates,) with the mean fitness of the
+            population in the context
+            'norm_utilities': dictionary of context -> array of shape (candidates, norms) with the utility of
+            each norm of the context, that is, the mean fitness of the agents that have the norm
+        """
+        target = next(sp for sp in self._population if str(sp) == sub_population)
+        target_game = next(g for g in self._payoffs[target] if g.name == game)
+        assert (
+            deltas.shape[1:] == self._payoffs[target][target_game].shape
+        ), f"Payoff deltas of shape {deltas.shape[1:]} do not match the payoffs of {game}"
+
+        payoffs = {
+            sp: {
+                g: array[np.newaxis] + deltas
+                if sp is target and g is target_game
+                else array[np.newaxis]
+                for g, array in tables.items()
+            }
+            for sp, tables in self._payoffs.items()
+        }
+        context_freqs = {
+            key: freqs[np.newaxis] for key, freqs in self._context_freqs.items()
+        }
+        base_fitness = self._fitness(context_freqs=context_freqs, payoffs=payoffs)
+
+        # Fitness of the agents with each norm (sanctioned when they violate it), and its mean over the agents
+        # that have the norm, which are all the sub-populations in the proportions of the norm
+        fitness = {}
+        norm_utilities = {}
+        mean_fitness = {}
+        for context in self._topology.contexts:
+            num_candidates = len(deltas)
+            norm_utilities[context] = np.zeros(
+                (num_candidates, len(self._norm_spaces[context]))
+            )
+            mean_fitness[context] = np.zeros(num_candidates)
+
+            for sp in self._population:
+                norm_fitness = (
+                    np.broadcast_to(
+                        base_fitness[sp][context][:, np.newaxis],
+                        (num_candidates,) + self._sanction_penalties[context].shape,
+                    )
+                    - self._sanction_penalties[context]
+                )
+                fitness.setdefault(sp, {})[context] = {
+                    norm: norm_fitness[:, i]
+                    for i, norm in enumerate(self._norm_spaces[context])
+                }
+                norm_utilities[context] += sp.proportion * np.einsum(
+                    "na,bna->bn", self._norm_action_freqs[(sp, context)], norm_fitness
+                )
+                mean_fitness[context] += sp.proportion * np.einsum(
+                    "a,ba->b",
+                    self._context_freqs[(sp, context)],
+                    base_fitness[sp][context],
+                )
+
+        return {
+            "fitness": self._by_name(fitness),
+            "mean_fitness": mean_fitness,
+            "norm_utilities": norm_utilities,
+        }
+
+    def _fitness(self, context_freqs: dict, payoffs: dict):
+        """
+        Computes the fitness of each action of each sub-population in each context, for a batch of states
+        :param context_freqs: dictionary of (sub-population, context) -> array of shape (batch, actions)
+        with the action frequencies of the sub-population in the context (batch may be 1 to broadcast)
+        :param payoffs: dictionary of sub-population -> game -> array of shape (batch,) + payoff array shape
+        :return: dictionary of sub-population -> context -> array of shape (batch, actions)
+        """
+        # Mean action frequencies of each game role, averaged across sub-populations and the contexts playing it
+        mean_context_freqs = {
+            context: sum(
+                sp.proportion * context_freqs[(sp, context)] for sp in self._population
+            )
+            for context in self._topology.contexts
+        }
+        role_freqs = {}
+        for game, role in self._topology.game_roles:
+            contexts_playing = self._topology.contexts_playing(game, role)
+            role_freqs[(game, role)] = sum(
+                mean_context_freqs[c][:, self._role_indices[(c, game, role)]]
+                for c in contexts_playing
+            ) / len(contexts_playing)
+
+        # The players of symmetric games may play any role, so their frequencies are averaged across roles
+        for game in {game for game, _ in self._topology.game_roles if game.symmetric}:
+            shared_freqs = (
+                sum(role_freqs[(game, r)] for r in range(game.num_roles))
+                / game.num_roles
+            )
+            for role in range(game.num_roles):
+                role_freqs[(game, role)] = shared_freqs
+
+        fitness = {}
+        for sp in self._population:
+            role_fitness = {
+                (game, role): self._role_fitness(
+                    payoffs=payoffs[sp][game][..., role],
+                    freqs=[role_freqs[(game, r)] for r in range(game.num_roles)],
+                    role=role,
+                )
+                for game, role in self._topology.game_roles
+            }
+
+            # Aggregate the fitness of the games played in each context as the ENSM does (minimum)
+            fitness[sp] = {}
+            for context in self._topology.contexts:
+                game_fitness = []
+                for game, role in self._topology.played_roles(context):
+                    values = role_fitness[(game, role)]
+                    context_values = np.zeros(
+                        values.shape[:1] + (len(self._action_spaces[context]),)
+                    )
+                    context_values[
+                        :, self._role_indices[(context, game, role)]
+                    ] = values
+                    game_fitness.append(context_values)
+                fitness[sp][context] = np.min(
+                    np.broadcast_arrays(*game_fitness), axis=0
+                )
+
+        return fitness
+
+    @staticmethod
+    def _role_fitness(payoffs: np.ndarray, freqs: list, role: int):
+        """
+        Computes the expected payoff of each action of a game role against the mean frequencies of the other roles
+        :param payoffs: array of shape (batch, |A_0|, ..., |A_n-1|) with the payoffs of the role
+        :param freqs: list with an array of shape (batch, |A_i|) with the action frequencies of each role
+        :param role: the role
+        :return: array of shape (batch, |A_role|)
+        """
+        axes = string.ascii_lowercase[: len(freqs)]
+        operands = [payoffs] + [f for r, f in enumerate(freqs) if r != role]
+        subscripts = ",".join(
+            ["..." + axes] + ["..." + axes[r] for r in range(len(freqs)) if r != role]
+        )
+        return np.einsum(f"{subscripts}->...{axes[role]}", *operands)
+
+    def _by_name(self, values: dict):
+        return {str(sp): values[sp] for sp in self._population}
@@ -1,22 +1,67 @@
+from ensm.catalog import RunCatalog
+
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
 from dash.dependencies import Input, Output, State
 
+import numpy as np
+import argparse
+import os
+
 app = dash.Dash()
 
+# Catalog of the registered runs (see RunCatalog), which is the data source of the dashboard. It is opened
+# when the dashboard starts
+catalog = None
+
+GRAPH_LAYOUT = {
+    "margin": {"l": 30, "r": 0, "b": 30, "t": 0},
+    "legend": {"x": 0, "y": 1},
+}
+
 
 def app_layout():
+    actions = catalog.actions()
+
     return html.Div(
         [
+            html.Div(
+                [
+                    dcc.Dropdown(
+                        id="outcome",
+                        options=[
+                            {"label": outcome, "value": outcome}
+                            for outcome in ["converged", "cycling", "timed out"]
+                        ],
+                        placeholder="Outcome",
+                    ),
+                    dcc.Dropdown(
+                        id="sub_population",
+                        options=[
+                            {"label": name, "value": name}
+                            for name in catalog.sub_populations()
+                        ],
+                        placeholder="Whole population",
+                    ),
+                    dcc.Dropdown(
+                        id="context",
+                        options=[{"label": c, "value": c} for c in actions],
+                        placeholder="Context",
+                    ),
+                    dcc.Dropdown(id="action", placeholder="Dominant action"),
+                    html.Button("Find runs", id="find"),
+                ]
+            ),
+            dcc.Checklist(id="runs", options=[], value=[]),
             dcc.Tabs(
                 id="tabs",
                 value=1,
                 parent_className="custom-tabs",
                 className="custom-tabs-container",
                 children=[
-                    dcc.Tab(label="Page 1", value=1, className="custom-tab"),
-                    dcc.Tab(label="Page 2", value=2, className="custom-tab"),
+                    dcc.Tab(label="Generations", value=1, className="custom-tab"),
+                    dcc.Tab(label="Trajectories", value=2, className="custom-tab"),
                 ],
             ),
             html.Div(id="tabs-content-classes"),
@@ -24,40 +69,107 @@ def app_layout():
     )
 
 
-app.layout = app_layout()
+app.layout = app_layout
 
 
-@app.callback(Output("tabs-content-classes", "children"), [Input("tabs", "value")])
-def render_content(tab):
-    data = [
-        {"values": [[10, 90], [5, 95], [15, 85], [20, 80]][int(tab) - 2], "type": "pie"}
+@app.callback(Output("action", "options"), [Input("context", "value")])
+def update_actions(context):
+    return [{"label": a, "value": a} for a in catalog.actions().get(context, [])]
+
+
+@app.callback(
+    Output("runs", "options"),
+    [Input("find", "n_clicks")],
+    [
+        State("outcome", "value"),
+        State("sub_population", "value"),
+        State("context", "value"),
+        State("action", "value"),
+    ],
+)
+def find_runs(n_clicks, outcome, sub_population, context, action):
+    dominant_actions = None
+    if context is not None and action is not None:
+        dominant_actions = [(sub_population, context, action)]
+
+    return [
+        {
+            "label": f"{run['id']}: {run['name']} (seed {run['seed']}), {run['outcome']} "
+            f"after {run['num_generations']} generations",
+            "value": run["id"],
+        }
+        for run in catalog.query(
+            outcome=outcome, dominant_actions=dominant_actions, limit=1000
+        )
     ]
 
-    return html.Div(
-        [
-            dcc.Graph(
-                id="game_1",
-                figure={
-                    "data": data,
-                    "layout": {
-                        "margin": {"l": 30, "r": 0, "b": 30, "t": 0},
-                        "legend": {"x": 0, "y": 1},
-                    },
-                },
-            ),
-            dcc.Graph(
-                id="game_2",
-                figure={
-                    "data": data,
-                    "layout": {
-                        "margin": {"l": 30, "r": 0, "b": 30, "t": 0},
-                        "legend": {"x": 0, "y": 1},
-                    },
-                },
-            ),
+
+@app.callback(
+    Output("tabs-content-classes", "children"),
+    [Input("tabs", "value"), Input("runs", "value")],
+    [State("context", "value")],
+)
+def render_content(tab, run_ids, context):
+    runs = catalog.describe(run_ids or [])
+
+    if int(tab) == 1:
+        data = [
+            {
+                "x": [str(run["id"]) for run in runs],
+                "y": [run["num_generations"] for run in runs],
+                "text": [run["outcome"] for run in runs],
+                "type": "bar",
+            }
         ]
+        return html.Div(
+            [
+                dcc.Graph(
+                    id="generations", figure={"data": data, "layout": GRAPH_LAYOUT}
+                ),
+                html.Table(
+                    [html.Tr([html.Th("Run"), html.Th("Context"), html.Th("Action")])]
+                    + [
+                        html.Tr([html.Td(run["id"]), html.Td(c), html.Td(action)])
+                        for run in runs
+                        for c, action in run["dominant_actions"].get(None, {}).items()
+                    ]
+                ),
+            ]
+        )
+
+    # Norm frequencies of the selected context over the saved trajectory of each run
+    data = []
+    for run in runs:
+        if run["trajectory_path"] is None or not os.path.exists(run["trajectory_path"]):
+            continue
+
+        trajectory = np.load(run["trajectory_path"])
+        for column, (c, norm) in enumerate(trajectory["norm_columns"]):
+            if context is not None and c != context:
+                continue
+            data.append(
+                {
+                    "x": trajectory["generations"].tolist(),
+                    "y": trajectory["norm_freqs"][:, column].tolist(),
+                    "name": f"{run['id']}: {c} / {norm}",
+                    "type": "scatter",
+                }
+            )
+
+    return html.Div(
+        [dcc.Graph(id="trajectories", figure={"data": data, "layout": GRAPH_LAYOUT})]
     )
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--catalog",
+        type=str,
+        help="Catalog of the runs to compare (SQLite file)",
+        required=True,
+    )
+    args = parser.parse_args()
+    catalog = RunCatalog(args.catalog)
+
     app.server.run(debug=True)
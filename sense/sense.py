@@ -1,28 +1,220 @@
-from ensm.agents import AgentSubPopulation
+from ensm.agents import AgentSubPopulation, FrequencyDistribution
+from ensm.basins import BasinMapper
+from ensm.cache import ResultCache
+from ensm.catalog import RunCatalog
 from ensm.games import Game, GamesNetwork
 from ensm.ensm import ENSM
+from ensm.equilibria import EquilibriumSolver
 from ensm.mas import MAS
+from ensm.payoffs import PayoffTable, is_table_file, load_payoff_table
+from ensm.store import ModelStore
+from ensm.sweeps import AdaptiveSweep
+from ensm.symmetry import SymmetricReduction
+from ensm.verify import DifferentialVerifier, ReferenceENSM
 from ensm.norms import Norm
 
+from concurrent.futures import ProcessPoolExecutor
 from collections import defaultdict
+from functools import partial
 from ast import literal_eval
+from copy import deepcopy
 
 from pprint import pprint
 import ruamel.yaml as ruamel
+import numpy as np
 import argparse
 import logging
+import json
+import os
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
-def main(config):
+def main(
+    config,
+    data_path,
+    seed=None,
+    cache=None,
+    model_store=None,
+    initial_state=None,
+    catalog=None,
+    table_cache_dir=None,
+):
+    result = run(
+        config=config,
+        seed=seed,
+        cache=cache,
+        model_store=model_store,
+        table_cache_dir=table_cache_dir,
+        initial_state=initial_state,
+        verbose=True,
+        catalog=catalog,
+        result_path=os.path.join(data_path, "result.json"),
+        trajectory_path=os.path.join(data_path, "trajectory.npz"),
+    )
+    summary = result["summary"]
+
+    if summary["outcome"] == "cycling":
+        pprint(
+            f"Evolutionary process found cycling with period {summary['cycle_period']} after "
+            f"{summary['num_generations']} generations."
+        )
+        pprint(summary["cycle_amplitudes"])
+    elif summary["outcome"] == "timed out":
+        pprint(
+            f"Evolutionary process timed out after {summary['num_generations']} generations."
+        )
+    else:
+        pprint(
+            f"Evolutionary process converged in "
+            f"{summary['num_generations'] - config['minNumStableGenerations']} generations."
+        )
+    pprint(result["state"]["action_freqs"])
+
+    if "equilibria" in result:
+        for sub_population, checks in result["equilibria"].items():
+            for game, check in checks.items():
+                logger.info(
+                    f"{sub_population} in {game}: {len(check['equilibria'])} equilibria, "
+                    f"nearest {check['nearest']} at distance {check['distance']}"
+                )
+
+    if cache is not None:
+        logger.info(f"Result cache: {cache.hits} hits, {cache.misses} misses")
+
+    _save_result(result=result, path=os.path.join(data_path, "result.json"))
+
+
+def continuation(
+    config,
+    data_path,
+    parameter,
+    values,
+    seed=None,
+    cache=None,
+    model_store=None,
+    initial_state=None,
+    catalog=None,
+    table_cache_dir=None,
+):
+    """
+    Walks a path of values of a configuration parameter, seeding the run of each value with the final
+    state of the run of the previous value. Saves the result of each run (continuation_<i>.json) and the
+    summaries of all runs (continuation.json) to the data path
+    :param config: configuration file
+    :param data_path: local path to save data to
+    :param parameter: dotted path of the parameter in the configuration (e.g., 'population.0.proportion')
+    :param values: list of values of the parameter
+    :param seed: seed of the random initialisation of the population of the first run
+    :param cache: ResultCache with the results of previous runs (None to always run)
+    :param model_store: ModelStore with the compiled model shared by several processes (None to create it)
+    :param initial_state: state to seed the first run with (None for a random initialisation)
+    :param catalog: RunCatalog to register the runs in (None to not register them)
+    :param table_cache_dir: directory of the .npy copies of the tables stored in .npz and .csv files (None to
+    load them in memory, see load_payoff_table)
+    """
+    steps = []
+
+    for i, value in enumerate(values):
+        step_config = deepcopy(config)
+        _set_config_value(config=step_config, parameter=parameter, value=value)
+        result_path = os.path.join(data_path, f"continuation_{i}.json")
+
+        result = run(
+            config=step_config,
+            seed=seed,
+            cache=cache,
+            model_store=model_store,
+            table_cache_dir=table_cache_dir,
+            initial_state=initial_state,
+            catalog=catalog,
+            result_path=result_path,
+            trajectory_path=os.path.join(
+                data_path, "trajectories", f"continuation_{i}.npz"
+            ),
+        )
+        _save_result(result=result, path=result_path)
+        summary = result["summary"]
+        logger.info(
+            f"{parameter} = {value}: {summary['outcome']} after {summary['num_generations']} generations"
+        )
+        pprint(summary["dominant_actions"])
+
+        steps.append({"value": value, "summary": summary})
+        initial_state = result["state"]
+
+    if cache is not None:
+        logger.info(f"Result cache: {cache.hits} hits, {cache.misses} misses")
+
+    _save_result(
+        result={"parameter": parameter, "steps": steps},
+        path=os.path.join(data_path, "continuation.json"),
+    )
+
+
+def run(
+    config,
+    seed=None,
+    cache=None,
+    model_store=None,
+    initial_state=None,
+    verbose=False,
+    catalog=None,
+    result_path=None,
+    trajectory_path=None,
+    table_cache_dir=None,
+):
+    """
+    Runs the Evolutionary Norm Synthesis Machine on a MAS until it converges, times out or cycles
+    :param config: configuration file
+    :param seed: seed of the random initialisation of the population
+    :param cache: ResultCache with the results of previous runs (None to always run). It is bypassed by
+    unseeded runs, whose random initialisation differs from run to run
+    :param model_store: ModelStore with the compiled model shared by several processes (None to create it)
+    :param initial_state: state of a previous run to seed the run with (see ENSM.warm_start). The entries
+    that are not in the state are randomly initialised
+    :param verbose: whether to log the action frequencies of each generation
+    :param catalog: RunCatalog to register the run in (None to not register it)
+    :param result_path: path of the file where the caller saves the result of the run, to register it
+    :param trajectory_path: path of the file to save the trajectory history of the run to, if the configuration
+    keeps a history (see historySize)
+    :param table_cache_dir: directory of the .npy copies of the tables stored in .npz and .csv files (None to
+    load them in memory, see load_payoff_table)
+    :return: dictionary with the final 'state' of the run (see ENSM.snapshot), its 'summary' (see ENSM.summary)
+    and the absolute 'trajectory_path' of its trajectory history, if it was saved
+    """
+    if seed is None:
+        cache = None
+
+    if cache is not None:
+        key = ResultCache.key(config=config, seed=seed, initial_state=initial_state)
+        result = cache.get(key)
+        if result is not None:
+            # The trajectory of a stored result is only registered if the run that stored it saved it to the
+            # same path, and it has not been overwritten by other runs since
+            if not _is_stored_trajectory(
+                result=result, key=key, trajectory_path=trajectory_path
+            ):
+                trajectory_path = None
+            _register_run(
+                catalog=catalog,
+                config=config,
+                result=result,
+                seed=seed,
+                initial_state=initial_state,
+                result_path=result_path,
+                trajectory_path=trajectory_path,
+            )
+            return result
 
     # Create the games network, get the action spaces and norm spaces of each possible coordination context
     # that the agents can play in the games of the MAS, and create an agent population as a set of homogeneous
     # sub-populations, each with a given proportion in the population
-    games_net = _create_games(config=config)
+    games_net, payoffs = _create_model(
+        config=config, model_store=model_store, table_cache_dir=table_cache_dir
+    )
     action_spaces, norm_spaces = _create_action_spaces_and_norms(
         games_net=games_net, regulate=config["regulate"]
     )
@@ -31,11 +223,443 @@ def main(config):
         action_spaces=action_spaces,
         norm_spaces=norm_spaces,
         config=config,
+        payoffs=payoffs,
+        seed_sequence=np.random.SeedSequence(seed),
     )
 
     # Create the MAS, the Evolutionary Norm Synthesis Machine, and run evolution until convergence
+    ensm = _create_ensm(
+        games_net=games_net,
+        action_spaces=action_spaces,
+        norm_spaces=norm_spaces,
+        population=population,
+        config=config,
+    )
+    if initial_state is not None:
+        ensm.warm_start(snapshot=initial_state)
+
+    # Solve the equilibria of the games of each sub-population, seeding the run near one of them
+    equilibria_cfg = config.get("equilibria")
+    if equilibria_cfg is not None:
+        equilibria = EquilibriumSolver.population_equilibria(ensm=ensm)
+        assert (
+            "seed" not in equilibria_cfg
+        ), "The equilibrium to seed the run near is set with 'equilibrium'"
+        if "equilibrium" in equilibria_cfg:
+            index = equilibria_cfg["equilibrium"]
+            EquilibriumSolver.seed(
+                ensm=ensm,
+                equilibria={
+                    k: eqs[index] for k, eqs in equilibria.items() if len(eqs) > index
+                },
+                mixing=float(equilibria_cfg.get("mixing", 0.01)),
+            )
+
+    while not ensm.finished:
+        action_freqs = ensm.evolve()
+        if verbose:
+            logger.info(action_freqs)
+
+    result = {"state": ensm.snapshot(), "summary": ensm.summary()}
+    if equilibria_cfg is not None:
+        result["equilibria"] = _check_equilibria(ensm=ensm, equilibria=equilibria)
+
+    if trajectory_path is not None and ensm.history is not None:
+        ensm.history.save(trajectory_path, key=None if cache is None else key)
+        result["trajectory_path"] = os.path.abspath(trajectory_path)
+    else:
+        trajectory_path = None
+
+    if cache is not None:
+        cache.put(key, result)
+    _register_run(
+        catalog=catalog,
+        config=config,
+        result=result,
+        seed=seed,
+        initial_state=initial_state,
+        result_path=result_path,
+        trajectory_path=trajectory_path,
+    )
+
+    return result
+
+
+def _is_stored_trajectory(result, key, trajectory_path):
+    """
+    Returns whether the trajectory of a stored result is saved in a path (see run)
+    :param result: result of a run, stored in a ResultCache
+    :param key: key of the run in the cache
+    :param trajectory_path: path of the trajectory history (None if not requested)
+    :return: True if the run saved its trajectory to the path, and the trajectory at the path is still its own
+    """
+    if (
+        trajectory_path is None
+        or result.get("trajectory_path") != os.path.abspath(trajectory_path)
+        or not os.path.exists(trajectory_path)
+    ):
+        return False
+
+    with np.load(trajectory_path) as trajectory:
+        return "key" in trajectory and str(trajectory["key"]) == key
+
+
+def _register_run(
+    catalog, config, result, seed, initial_state, result_path, trajectory_path
+):
+    """ Registers a run in a RunCatalog, if any (see run) """
+    if catalog is None:
+        return
+
+    catalog.register(
+        config=config,
+        result=result,
+        seed=seed,
+        initial_state=initial_state,
+        result_path=os.path.abspath(result_path) if result_path else None,
+        trajectory_path=os.path.abspath(trajectory_path) if trajectory_path else None,
+    )
+
+
+def sweep(
+    config,
+    data_path,
+    parameters,
+    bounds,
+    initial_points=5,
+    max_depth=3,
+    seed=None,
+    cache=None,
+    num_workers=None,
+    catalog=None,
+    model_store=None,
+    table_cache_dir=None,
+):
+    """
+    Maps the outcome of the evolutionary process over a box of values of some configuration parameters with an
+    adaptive sweep (see AdaptiveSweep), which only refines the grid where the outcome (converged, cycling or timed
+    out) or the dominant actions and norms change. Saves the summary of each run and the phase diagram over the
+    finest grid to the data path
+    :param config: configuration file
+    :param data_path: local path to save data to
+    :param parameters: list of dotted paths of the parameters in the configuration (see _set_config_value)
+    :param bounds: list with the (lowest, highest) value of each parameter
+    :param initial_points: number of points of the coarse grid along each parameter
+    :param max_depth: maximum number of subdivisions of the cells of the coarse grid
+    :param seed: seed of the random initialisation of the population of each run
+    :param cache: ResultCache with the results of previous runs (None to always run)
+    :param num_workers: number of worker processes that run each batch of points (None for one per CPU)
+    :param catalog: RunCatalog to register the runs in (None to not register them)
+    :param model_store: ModelStore with the compiled model shared by the worker processes (None to create it
+    in each run). Points whose parameters change the model fall back to a private model
+    :param table_cache_dir: directory of the .npy copies of the tables stored in .npz and .csv files (None to
+    load them in memory, see load_payoff_table)
+    """
+    adaptive_sweep = AdaptiveSweep(
+        run_point=partial(
+            _run_sweep_point,
+            config=config,
+            parameters=parameters,
+            seed=seed,
+            cache=cache,
+            catalog=catalog,
+            model_store=model_store,
+            table_cache_dir=table_cache_dir,
+            data_path=data_path,
+        ),
+        bounds=bounds,
+        initial_points=initial_points,
+        max_depth=max_depth,
+    )
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        adaptive_sweep.run(executor=executor)
+
+    logger.info(
+        f"Swept {adaptive_sweep.num_runs} points in {adaptive_sweep.num_levels} batches "
+        f"(a uniform grid of the same resolution has {adaptive_sweep.num_uniform_runs}), "
+        f"found {len(adaptive_sweep.classes)} outcomes"
+    )
+    if cache is not None:
+        num_hits = sum(s["cached"] for s in adaptive_sweep.summaries.values())
+        logger.info(
+            f"Result cache: {num_hits} hits, {adaptive_sweep.num_runs - num_hits} misses"
+        )
+
+    os.makedirs(data_path, exist_ok=True)
+    _save_result(
+        result={
+            "parameters": parameters,
+            "bounds": bounds,
+            "classes": [
+                {"outcome": outcome, "dominant": [list(entry) for entry in dominant]}
+                for outcome, dominant in adaptive_sweep.classes
+            ],
+            "runs": [
+                {
+                    "values": adaptive_sweep.values_of(point),
+                    "class": adaptive_sweep.labels[point],
+                    "summary": adaptive_sweep.summaries[point],
+                }
+                for point in adaptive_sweep.points
+            ],
+        },
+        path=os.path.join(data_path, "sweep.json"),
+    )
+    np.savez(
+        os.path.join(data_path, "sweep.npz"),
+        phase_diagram=adaptive_sweep.phase_diagram(),
+        axes=np.array(
+            [
+                np.linspace(low, high, adaptive_sweep.resolution + 1)
+                for low, high in bounds
+            ]
+        ),
+    )
+
+
+def _run_sweep_point(
+    values,
+    config,
+    parameters,
+    seed,
+    cache,
+    catalog,
+    model_store,
+    table_cache_dir,
+    data_path,
+):
+    """
+    Runs a point of a sweep (see sweep)
+    :param values: tuple with the value of each parameter
+    :return: summary of the run, with whether it was 'cached'
+    """
+    point_config = deepcopy(config)
+    for parameter, value in zip(parameters, values):
+        _set_config_value(config=point_config, parameter=parameter, value=value)
+
+    num_hits = cache.hits if cache is not None else 0
+    result = run(
+        config=point_config,
+        seed=seed,
+        cache=cache,
+        catalog=catalog,
+        model_store=model_store,
+        table_cache_dir=table_cache_dir,
+        result_path=os.path.join(data_path, "sweep.json"),
+        trajectory_path=os.path.join(
+            data_path,
+            "trajectories",
+            "sweep_" + "_".join(f"{v:g}" for v in values) + ".npz",
+        ),
+    )
+
+    return dict(result["summary"], cached=cache is not None and cache.hits > num_hits)
+
+
+def map_basins(
+    config,
+    data_path,
+    num_samples,
+    radius,
+    batch_size,
+    seed=None,
+    model_store=None,
+    table_cache_dir=None,
+):
+    """
+    Maps the basins of attraction of the evolutionary dynamics by running the ENSM from a number of
+    random initial conditions. Saves the initial state and the attractor label of each sample to the data path
+    :param config: configuration file
+    :param data_path: local path to save data to
+    :param num_samples: number of initial conditions to sample
+    :param radius: radius of the neighbourhood of each attractor
+    :param batch_size: number of trajectories evolved together
+    :param seed: seed of the random initialisation of the populations of the samples
+    :param model_store: ModelStore with the compiled model shared by several processes (None to create it)
+    :param table_cache_dir: directory of the .npy copies of the tables stored in .npz and .csv files (None to
+    load them in memory, see load_payoff_table)
+    """
+    games_net, payoffs = _create_model(
+        config=config, model_store=model_store, table_cache_dir=table_cache_dir
+    )
+    action_spaces, norm_spaces = _create_action_spaces_and_norms(
+        games_net=games_net, regulate=config["regulate"]
+    )
+
+    # Each sample is run by a new ENSM over a population initialised from its own stream of random numbers
+    seed_sequence = np.random.SeedSequence(seed)
+
+    def ensm_factory():
+        return _create_ensm(
+            games_net=games_net,
+            action_spaces=action_spaces,
+            norm_spaces=norm_spaces,
+            population=_create_population(
+                games_net=games_net,
+                action_spaces=action_spaces,
+                norm_spaces=norm_spaces,
+                config=config,
+                payoffs=payoffs,
+                seed_sequence=seed_sequence.spawn(1)[0],
+            ),
+            config=config,
+        )
+
+    mapper = BasinMapper(
+        ensm_factory=ensm_factory, radius=radius, batch_size=batch_size
+    )
+    initial_states, labels, num_generations = mapper.map(num_samples=num_samples)
+
+    for attractor in mapper.attractors:
+        logger.info(
+            f"Attractor {attractor.label}: {attractor.num_samples} samples, "
+            f"{attractor.mean_generations:.1f} generations on average"
+        )
+        pprint(attractor.summary)
+
+    num_unresolved = int(np.sum(labels == BasinMapper.UNRESOLVED))
+    if num_unresolved:
+        logger.info(f"{num_unresolved} samples did not reach any attractor")
+    num_cycling = int(np.sum(labels == BasinMapper.CYCLING))
+    if num_cycling:
+        logger.info(f"{num_cycling} samples were found to cycle")
+
+    os.makedirs(data_path, exist_ok=True)
+    np.savez(
+        os.path.join(data_path, "basins.npz"),
+        initial_states=initial_states,
+        labels=labels,
+        num_generations=num_generations,
+        attractor_states=np.array([a.state for a in mapper.attractors]),
+    )
+
+
+def verify(
+    config, data_path, num_generations, sample_interval=None, tolerance=1e-9, seed=None
+):
+    """
+    Verifies the optimised engines of a configuration against the reference engines (see ReferenceENSM),
+    evolving both from the same state and comparing their action and norm frequencies. Saves the report
+    of the verification to the data path
+    :param config: configuration file
+    :param data_path: local path to save data to
+    :param num_generations: number of generations to verify
+    :param sample_interval: None to compare every generation of both runs side by side, or the interval
+    between the generations compared with one-step checks from the state of the optimised run
+    :param tolerance: maximum deviation allowed between any two frequencies. With extinction pruning, it is at
+    least twice the extinction threshold, since the pruned frequencies are frozen below the threshold while the
+    reference keeps evolving them. These deviations accumulate when both runs evolve side by side, so runs with
+    pruning should be verified with one-step checks. Games declared symmetric are verified against the same
+    games with their roles apart, which only match if all the roles of each game are played in the same contexts
+    :param seed: seed of the random initialisation of the population
+    """
+    pruning_params = _extinction_pruning_params(config)
+    if pruning_params:
+        tolerance = max(tolerance, 2 * pruning_params["extinction_threshold"])
+
+    # Each ENSM evolves its own model and population, and the reference is seeded with the state of the
+    # candidate. The reference keeps the roles of all games apart, even those declared symmetric
+    reference_config = deepcopy(config)
+    for game_cfg in reference_config["games"]:
+        game_cfg["symmetric"] = False
+
+    candidate, reference = [
+        _create_verified_ensm(
+            config=model_config, reference=is_reference, seed_sequence=child
+        )
+        for model_config, is_reference, child in zip(
+            (config, reference_config),
+            (False, True),
+            np.random.SeedSequence(seed).spawn(2),
+        )
+    ]
+
+    verifier = DifferentialVerifier(
+        reference=reference, candidate=candidate, tolerance=tolerance
+    )
+    report = verifier.run(
+        num_generations=num_generations, sample_interval=sample_interval
+    )
+
+    logger.info(
+        f"Verified {report['num_checks']} of {report['num_generations']} generations: maximum deviation "
+        f"{report['max_deviation']:.3g} (tolerance {tolerance:.3g}), speed-up {report['speedup'] or 0:.2f}x"
+    )
+    for sub_population, context, norm, action, deviation in report["violations"][:10]:
+        logger.warning(
+            f"Deviation {deviation:.3g} in {sub_population} / {context} / {norm} / {action}"
+        )
+    if not report["passed"]:
+        logger.warning(f"{len(report['violations'])} frequencies exceed the tolerance")
+
+    _save_result(result=report, path=os.path.join(data_path, "verify.json"))
+
+
+def _create_verified_ensm(
+    config: dict, reference: bool, seed_sequence: np.random.SeedSequence
+) -> ENSM:
+    """
+    Creates an ENSM over its own model and population of a configuration, to be verified (see verify)
+    :param config: configuration file
+    :param reference: whether to create a ReferenceENSM
+    :param seed_sequence: SeedSequence of the random initialisation of the population
+    :return: an ENSM ready to evolve
+    """
+    games_net, payoffs = _create_model(config=config)
+    action_spaces, norm_spaces = _create_action_spaces_and_norms(
+        games_net=games_net, regulate=config["regulate"]
+    )
+
+    return _create_ensm(
+        games_net=games_net,
+        action_spaces=action_spaces,
+        norm_spaces=norm_spaces,
+        population=_create_population(
+            games_net=games_net,
+            action_spaces=action_spaces,
+            norm_spaces=norm_spaces,
+            config=config,
+            payoffs=payoffs,
+            seed_sequence=seed_sequence,
+        ),
+        config=config,
+        reference=reference,
+    )
+
+
+def _create_ensm(
+    games_net: GamesNetwork,
+    action_spaces: dict,
+    norm_spaces: dict,
+    population: list,
+    config: dict,
+    reference: bool = False,
+) -> ENSM:
+    """
+    Creates the MAS and the Evolutionary Norm Synthesis Machine that evolves it
+    :param games_net: the games network of the MAS
+    :param action_spaces: dictionary of context -> actions
+    :param norm_spaces: dictionary of context -> norms
+    :param population: list of AgentSubPopulation
+    :param config: configuration file
+    :param reference: whether to create a ReferenceENSM, which evolves the strategies with the plain
+    engines (with the replicator of the configuration, but without pruning extinct strategies)
+    :return: an ENSM ready to evolve
+    """
     mas = MAS(games_net=games_net, population=population)
-    ensm = ENSM(
+
+    engine_params = {
+        "replicator": config.get("replicator", "standard"),
+        "selection_strength": float(config.get("selectionStrength", 1.0)),
+        **_extinction_pruning_params(config),
+    }
+    if reference:
+        engine_params = {
+            "replicator": engine_params["replicator"],
+            "selection_strength": engine_params["selection_strength"],
+        }
+
+    return (ReferenceENSM if reference else ENSM)(
         mas=mas,
         games_net=games_net,
         action_spaces=action_spaces,
@@ -43,23 +667,86 @@ def main(config):
         max_generations=config["maxGenerations"],
         stability_margin=config["stabilityMargin"],
         min_num_stable_generations=config["minNumStableGenerations"],
+        history_size=config.get("historySize", 0),
+        **_cycle_detection_params(config),
+        **engine_params,
     )
 
-    while not ensm.converged and not ensm.timed_out:
-        action_freqs = ensm.evolve()
-        logger.info(action_freqs)
-        # pprint(action_freqs)
 
-    pprint(
-        f"Evolutionary process converged in {ensm.num_generations - config['minNumStableGenerations']} generations."
-    )
-    pprint(action_freqs)
+def _cycle_detection_params(config: dict) -> dict:
+    """
+    Returns the parameters of the cycle detection of the ENSM from the optional configuration block:
+
+        cycleDetection:
+          tolerance: 1e-4
+          window: 1000
+          repetitions: 2
+
+    :param config: configuration file
+    :return: dictionary of ENSM parameters
+    """
+    if "cycleDetection" not in config:
+        return {}
+
+    cycle_cfg = config["cycleDetection"]
+    return {
+        "cycle_tolerance": float(cycle_cfg.get("tolerance", 1e-4)),
+        "cycle_window": cycle_cfg.get("window", 1000),
+        "cycle_repetitions": cycle_cfg.get("repetitions", 2),
+    }
+
+
+def _extinction_pruning_params(config: dict) -> dict:
+    """
+    Returns the parameters of the pruning of extinct actions of the ENSM from the optional configuration block:
+
+        extinctionPruning:
+          threshold: 1e-10   # exact at the floor of the replicator (see ActiveSet)
+
+    :param config: configuration file
+    :return: dictionary of ENSM parameters
+    """
+    if "extinctionPruning" not in config:
+        return {}
+
+    pruning_cfg = config["extinctionPruning"] or {}
+    return {"extinction_threshold": float(pruning_cfg.get("threshold", 1e-10))}
+
 
+def _check_equilibria(ensm: ENSM, equilibria: dict) -> dict:
+    """
+    Cross-checks the outcome of an ENSM with the equilibria of the games of each sub-population
+    (see EquilibriumSolver.cross_check), configured with the optional block:
+
+        equilibria:
+          equilibrium: 0   # index of the equilibrium of each game to seed the run near (optional, see
+                           # EquilibriumSolver.seed)
+          mixing: 0.01     # weight of the random initialisation in the seeded frequencies
 
-def _create_games(config) -> GamesNetwork:
+    :param ensm: an ENSM that has finished evolving
+    :param equilibria: dictionary of (sub-population name, game name) -> list of equilibria
+    :return: dictionary of sub-population name -> game name -> equilibria, nearest equilibrium and distance
+    """
+    checks = defaultdict(dict)
+    nearest = EquilibriumSolver.cross_check(ensm=ensm, equilibria=equilibria)
+
+    for (sub_population, game), game_equilibria in equilibria.items():
+        index, distance = nearest.get((sub_population, game), (None, None))
+        checks[sub_population][game] = {
+            "equilibria": game_equilibria,
+            "nearest": index,
+            "distance": distance,
+        }
+
+    return dict(checks)
+
+
+def _create_games(config, table_cache_dir: str = None) -> GamesNetwork:
     """
     Creates a games network adding the games defined in a configuration file
     :param config: configuration file
+    :param table_cache_dir: directory of the .npy copies of the tables stored in .npz and .csv files (None to
+    load them in memory, see load_payoff_table)
     :return: a GamesNetwork containing the games to be played in the MAS
     """
     games = {}
@@ -67,12 +754,23 @@ def _create_games(config) -> GamesNetwork:
 
     for game_cfg in config["games"]:
         name = game_cfg["name"]
+        if is_table_file(game_cfg["utilities"]):
+            utilities = load_payoff_table(
+                table_cfg=game_cfg["utilities"],
+                num_roles=len(game_cfg["contexts"]),
+                cache_dir=table_cache_dir,
+            )
+        else:
+            utilities = {
+                literal_eval(ac_comb): u for ac_comb, u in game_cfg["utilities"].items()
+            }
+
         games[name] = Game(
             name=name,
             contexts=game_cfg["contexts"],
-            utilities={
-                literal_eval(ac_comb): u for ac_comb, u in game_cfg["utilities"].items()
-            },
+            utilities=utilities,
+            sanctions=game_cfg.get("sanctions"),
+            symmetric=game_cfg.get("symmetric", False) is True,
         )
 
     if "gameDependencies" in config:
@@ -81,7 +779,11 @@ def _create_games(config) -> GamesNetwork:
             name_b, role_b = literal_eval(game_role_b)
             dependencies.append(((games[name_a], role_a), (games[name_b], role_b)))
 
-    return GamesNetwork(games=games, dependencies=dependencies)
+    # The network is complete, so compile it into its immutable topology
+    games_net = GamesNetwork(games=games, dependencies=dependencies)
+    games_net.freeze()
+
+    return games_net
 
 
 def _create_action_spaces_and_norms(games_net, regulate):
@@ -89,18 +791,14 @@ def _create_action_spaces_and_norms(games_net, regulate):
     norm_spaces = defaultdict(list)
 
     # Get all possible pairs of (game, role) that the agents can play
-    game_roles = [
-        (game, role)
-        for game in games_net.games.values()
-        for role in range(game.num_roles)
-    ]
-    for game, role in game_roles:
+    topology = games_net.freeze()
+    for game, role in topology.game_roles:
         sanctions = [None] if game.sanctions is None else game.sanctions
 
         # Get all possible pairs (context, action) of actions that the agents can perform in each context
         context_actions = [
             (context, action)
-            for context in games_net.contexts_playing(game, role)
+            for context in topology.contexts_playing(game, role)
             for action in game.action_space(role)
         ]
 
@@ -120,29 +818,44 @@ def _create_action_spaces_and_norms(games_net, regulate):
 
 
 def _create_population(
-    games_net: GamesNetwork, action_spaces: dict, norm_spaces: dict, config: dict
+    games_net: GamesNetwork,
+    action_spaces: dict,
+    norm_spaces: dict,
+    config: dict,
+    payoffs: dict = None,
+    seed_sequence: np.random.SeedSequence = None,
 ):
+    """
+    Creates the sub-populations of agents of a MAS, drawing the initial frequencies of each sub-population from
+    its own stream of random numbers (see _frequency_distribution)
+    :param games_net: the games network of the MAS
+    :param action_spaces: dictionary of context -> actions
+    :param norm_spaces: dictionary of context -> norms
+    :param config: configuration file
+    :param payoffs: dictionary of sub-population name -> game -> PayoffTable (e.g., attached from a
+    ModelStore). If None, the payoffs are read from the configuration file
+    :param seed_sequence: SeedSequence from which the stream of each sub-population is spawned (None to seed
+    them with fresh entropy from the operating system)
+    :return: list of AgentSubPopulation
+    """
     population = []
+    distribution = _frequency_distribution(config)
+    seed_sequences = (seed_sequence or np.random.SeedSequence()).spawn(
+        len(config["population"])
+    )
 
-    for sub_population in config["population"]:
+    for sub_population, child in zip(config["population"], seed_sequences):
         assert "name" in sub_population, "Missing 'name' in sub-population"
         assert (
             "proportion" in sub_population
         ), f'Missing \'frequency\' in sub-population {sub_population["name"]}'
 
-        all_payoffs = defaultdict(lambda: defaultdict(tuple))
-        for game_payoffs in sub_population["gamePayoffs"]:
-            assert (
-                "gameName" in game_payoffs
-            ), f'Missing \'gameName\' in sub-population {sub_population["name"]}'
-            assert (
-                "payoffs" in game_payoffs
-            ), f'Missing \'payoffs\' in sub-population {sub_population["name"]}'
-
-            game = games_net.games[game_payoffs["gameName"]]
-
-            for ac_combination, payoffs in game_payoffs["payoffs"].items():
-                all_payoffs[game][literal_eval(ac_combination)] = payoffs
+        if payoffs is not None:
+            all_payoffs = payoffs[sub_population["name"]]
+        else:
+            all_payoffs = _create_payoffs(
+                games_net=games_net, sub_population=sub_population
+            )
 
         population.append(
             AgentSubPopulation(
@@ -151,12 +864,234 @@ def _create_population(
                 payoffs=all_payoffs,
                 action_spaces=action_spaces,
                 norm_spaces=norm_spaces,
+                rng=np.random.default_rng(child),
+                distribution=distribution,
             )
         )
 
     return population
 
 
+def _frequency_distribution(config: dict) -> FrequencyDistribution:
+    """
+    Returns the distribution of the initial frequencies of the sub-populations from the optional configuration
+    block (by default, integer weights drawn uniformly from [70, 100]):
+
+        initialisation:
+          distribution: dirichlet   # uniform or dirichlet
+          low: 70                   # range of the weights of the uniform distribution
+          high: 100
+          alpha: 1.0                # concentration of the Dirichlet distribution
+
+    :param config: configuration file
+    :return: a FrequencyDistribution
+    """
+    init_cfg = config.get("initialisation", {})
+    return FrequencyDistribution(
+        distribution=init_cfg.get("distribution", "uniform"),
+        low=init_cfg.get("low", 70),
+        high=init_cfg.get("high", 100),
+        alpha=float(init_cfg.get("alpha", 1.0)),
+    )
+
+
+def _create_payoffs(
+    games_net: GamesNetwork, sub_population: dict, table_cache_dir: str = None
+):
+    """
+    Creates the payoff tables of a sub-population in each game
+    :param games_net: the games network of the MAS
+    :param sub_population: configuration of the sub-population
+    :param table_cache_dir: directory of the .npy copies of the tables stored in .npz and .csv files (None to
+    load them in memory, see load_payoff_table)
+    :return: dictionary of game -> PayoffTable
+    """
+    all_payoffs = {}
+    for game_payoffs in sub_population["gamePayoffs"]:
+        assert (
+            "gameName" in game_payoffs
+        ), f'Missing \'gameName\' in sub-population {sub_population["name"]}'
+        assert (
+            "payoffs" in game_payoffs
+        ), f'Missing \'payoffs\' in sub-population {sub_population["name"]}'
+
+        game = games_net.games[game_payoffs["gameName"]]
+        game_action_spaces = [game.action_space(r) for r in range(game.num_roles)]
+
+        # Payoff tables stored in files are used as they are, whereas payoffs listed in the
+        # configuration file are packed into a payoff table with the action ordering of the game
+        if is_table_file(game_payoffs["payoffs"]):
+            all_payoffs[game] = load_payoff_table(
+                table_cfg=game_payoffs["payoffs"],
+                num_roles=game.num_roles,
+                action_spaces=game_action_spaces,
+                cache_dir=table_cache_dir,
+            )
+        else:
+            all_payoffs[game] = PayoffTable.from_mapping(
+                mapping={
+                    literal_eval(ac_combination): payoffs
+                    for ac_combination, payoffs in game_payoffs["payoffs"].items()
+                },
+                action_spaces=game_action_spaces,
+            )
+
+    return all_payoffs
+
+
+def _create_model(
+    config: dict, model_store: ModelStore = None, table_cache_dir: str = None
+):
+    """
+    Creates the compiled model of a MAS, that is, its games network and the payoffs of each sub-population.
+    If a model store is given, the model is attached from the store, without copying its tables. The model is
+    published to the store first if the store does not hold the model of the configuration yet
+    :param config: configuration file
+    :param model_store: ModelStore shared by several processes (None to create a private model)
+    :param table_cache_dir: directory of the .npy copies of the tables stored in .npz and .csv files (None to
+    load them in memory, see load_payoff_table)
+    :return: tuple (games_net, payoffs) where payoffs is a dictionary of sub-population name -> game -> PayoffTable
+    """
+    if model_store is not None:
+        key = ResultCache.key(
+            config={
+                "games": config["games"],
+                "gameDependencies": config.get("gameDependencies"),
+                "gamePayoffs": [
+                    [sub_population["name"], sub_population["gamePayoffs"]]
+                    for sub_population in config["population"]
+                ],
+            }
+        )
+        model = model_store.attach(key=key)
+        if model is not None:
+            return model
+
+    games_net = _create_games(config=config, table_cache_dir=table_cache_dir)
+    payoffs = {
+        sub_population["name"]: _create_payoffs(
+            games_net=games_net,
+            sub_population=sub_population,
+            table_cache_dir=table_cache_dir,
+        )
+        for sub_population in config["population"]
+    }
+
+    # Games declared with 'symmetric: auto' are symmetric if the payoffs of all sub-populations are and all
+    # their roles are played by the same contexts, and those declared with 'symmetric: true' must have
+    # symmetric payoffs in all sub-populations, since the symmetric reduction only reads the payoffs of the
+    # first role
+    for game_cfg in config["games"]:
+        game = games_net.games[game_cfg["name"]]
+        if game_cfg.get("symmetric") == "auto":
+            role_contexts = [
+                games_net.contexts_playing(game, role) for role in range(game.num_roles)
+            ]
+            if not game.detect_symmetry(
+                payoff_tables=[tables[game] for tables in payoffs.values()],
+                role_contexts=role_contexts,
+            ):
+                if any(set(c) != set(role_contexts[0]) for c in role_contexts):
+                    reason = f"its roles are played by different contexts {[sorted(c) for c in role_contexts]}"
+                else:
+                    reason = "its payoffs are not symmetric"
+                logger.info(f"Game {game.name} is kept asymmetric: {reason}")
+        elif game_cfg.get("symmetric") is True:
+            for name, tables in payoffs.items():
+                assert SymmetricReduction.is_symmetric(
+                    tables[game]
+                ), f"The payoffs of sub-population {name} in symmetric game {game.name} are not symmetric"
+
+    if model_store is None:
+        return games_net, payoffs
+
+    # Another process may publish a different model (e.g., another point of a sweep) before attaching, in
+    # which case the private model is used
+    model_store.publish(games_net=games_net, payoffs=payoffs, key=key)
+    return model_store.attach(key=key) or (games_net, payoffs)
+
+
+def _set_config_value(config: dict, parameter: str, value):
+    """
+    Sets the value of a parameter of a configuration
+    :param config: configuration file
+    :param parameter: dotted path of the parameter, where list items are referenced by their index and
+    action combinations by their tuple (e.g., 'population.1.gamePayoffs.0.payoffs.('go', 'stop').0')
+    :param value: new value of the parameter
+    """
+    keys = []
+    for key in parameter.split("."):
+        # Action combinations may contain dots, so join the parts of a tuple until it is closed
+        if keys and keys[-1].startswith("(") and not keys[-1].endswith(")"):
+            keys[-1] = f"{keys[-1]}.{key}"
+        else:
+            keys.append(key)
+
+    container = config
+    for i, key in enumerate(keys):
+        if isinstance(container, list):
+            key = int(key)
+        elif key not in container and key.startswith("("):
+            # Match action combinations no matter how they are spaced or quoted
+            key = next(k for k in container if literal_eval(k) == literal_eval(key))
+
+        if i == len(keys) - 1:
+            container[key] = value
+        else:
+            container = container[key]
+
+
+def _save_result(result: dict, path: str):
+    """
+    Saves a result (or any other dictionary) as a JSON file
+    :param result: dictionary to save
+    :param path: path of the file
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+
+
+def _load_state(path: str):
+    """
+    Loads the final state of a run saved with _save_result
+    :param path: path of the file
+    :return: the state of the run (see ENSM.snapshot)
+    """
+    with open(path, "r") as f:
+        state = json.load(f)["state"]
+
+    # JSON turns the name of the empty norm of unregulated contexts (None) into 'null'
+    for contexts in state["action_freqs"].values():
+        for context, norms in contexts.items():
+            contexts[context] = {
+                None if n == "null" else n: freqs for n, freqs in norms.items()
+            }
+    for context, norms in state["norm_freqs"].items():
+        state["norm_freqs"][context] = {
+            None if n == "null" else n: freq for n, freq in norms.items()
+        }
+
+    return state
+
+
+def _resolve_table_files(config: dict, base_dir: str):
+    """
+    Makes the paths of the utility and payoff tables stored in files relative to a base directory
+    :param config: configuration file
+    :param base_dir: directory of the configuration file
+    """
+    tables = [game_cfg["utilities"] for game_cfg in config["games"]] + [
+        game_payoffs["payoffs"]
+        for sub_population in config["population"]
+        for game_payoffs in sub_population["gamePayoffs"]
+    ]
+    for table_cfg in tables:
+        if is_table_file(table_cfg):
+            table_cfg["file"] = os.path.join(base_dir, table_cfg["file"])
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -165,11 +1100,195 @@ if __name__ == "__main__":
     parser.add_argument(
         "-d", "--data-path", type=str, help="Local path to save data to", required=True
     )
+    parser.add_argument(
+        "-s",
+        "--seed",
+        type=int,
+        help="Seed of the random initialisation of the population",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        help="Local path of the store of results of previous runs and of the copies of the tables stored "
+        "in .npz and .csv files",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=1024,
+        help="Maximum size (in MB) of the store of results of previous runs",
+    )
+    parser.add_argument(
+        "--catalog",
+        type=str,
+        help="Local path of the catalog (SQLite file) to register the runs in",
+    )
+    parser.add_argument(
+        "--model-store",
+        type=str,
+        help="File of the compiled model shared by several processes (e.g., in /dev/shm)",
+    )
+    parser.add_argument(
+        "--warm-start",
+        type=str,
+        help="Result file (result.json) of a previous run to seed the run with",
+    )
+    parser.add_argument(
+        "--continuation-param",
+        type=str,
+        help="Dotted path of a parameter to walk, seeding each run with the previous one "
+        "(e.g., population.0.proportion)",
+    )
+    parser.add_argument(
+        "--continuation-values",
+        type=str,
+        help="Values of the continuation parameter, as a comma-separated list or as start:stop:num",
+    )
+    parser.add_argument(
+        "--basin-samples",
+        type=int,
+        help="Map the basins of attraction from this number of random initial conditions",
+    )
+    parser.add_argument(
+        "--basin-radius",
+        type=float,
+        default=1e-3,
+        help="Radius of the neighbourhood of each attractor when mapping basins",
+    )
+    parser.add_argument(
+        "--basin-batch-size",
+        type=int,
+        default=64,
+        help="Number of trajectories evolved together when mapping basins",
+    )
+
+    parser.add_argument(
+        "--verify",
+        type=int,
+        help="Verify the optimised engines against the reference engines for this number of generations",
+    )
+    parser.add_argument(
+        "--verify-every",
+        type=int,
+        help="Verify one-step checks every this number of generations, instead of every generation",
+    )
+    parser.add_argument(
+        "--verify-tolerance",
+        type=float,
+        default=1e-9,
+        help="Maximum deviation allowed between the frequencies of the optimised and reference engines "
+        "(at least twice the extinction threshold if pruning is enabled, verified with --verify-every)",
+    )
+
+    parser.add_argument(
+        "--sweep-param",
+        type=str,
+        action="append",
+        help="Parameter to sweep adaptively, as path:low:high (e.g., population.0.proportion:0.1:0.9). "
+        "Can be given once per parameter",
+    )
+    parser.add_argument(
+        "--sweep-points",
+        type=int,
+        default=5,
+        help="Number of points of the coarse grid of the sweep along each parameter",
+    )
+    parser.add_argument(
+        "--sweep-depth",
+        type=int,
+        default=3,
+        help="Maximum number of subdivisions of the cells of the coarse grid of the sweep",
+    )
+    parser.add_argument(
+        "--workers", type=int, help="Number of worker processes of the sweep",
+    )
 
     args = parser.parse_args()
 
     yaml = ruamel.YAML()
     with open(args.config_file, "r") as f:
         cfg = yaml.load(f)
+    _resolve_table_files(config=cfg, base_dir=os.path.dirname(args.config_file))
 
-    main(cfg)
+    model_store = ModelStore(args.model_store) if args.model_store else None
+    table_cache_dir = os.path.join(args.cache_dir, "tables") if args.cache_dir else None
+    if args.verify:
+        verify(
+            config=cfg,
+            data_path=args.data_path,
+            num_generations=args.verify,
+            sample_interval=args.verify_every,
+            tolerance=args.verify_tolerance,
+            seed=args.seed,
+        )
+    elif args.basin_samples:
+        map_basins(
+            config=cfg,
+            data_path=args.data_path,
+            num_samples=args.basin_samples,
+            radius=args.basin_radius,
+            batch_size=args.basin_batch_size,
+            seed=args.seed,
+            model_store=model_store,
+            table_cache_dir=table_cache_dir,
+        )
+    else:
+        result_cache = None
+        if args.cache_dir and args.seed is None:
+            logger.warning(
+                "Unseeded runs are randomly initialised, so the result cache is bypassed (set --seed to use it)"
+            )
+        elif args.cache_dir:
+            result_cache = ResultCache(
+                path=os.path.join(args.cache_dir, "results.sqlite"),
+                max_size=args.cache_size << 20,
+            )
+        run_catalog = RunCatalog(args.catalog) if args.catalog else None
+        initial_state = _load_state(args.warm_start) if args.warm_start else None
+
+        if args.sweep_param:
+            sweep_params = [p.rsplit(":", 2) for p in args.sweep_param]
+            sweep(
+                config=cfg,
+                data_path=args.data_path,
+                parameters=[path for path, _, _ in sweep_params],
+                bounds=[(float(low), float(high)) for _, low, high in sweep_params],
+                initial_points=args.sweep_points,
+                max_depth=args.sweep_depth,
+                seed=args.seed,
+                cache=result_cache,
+                num_workers=args.workers,
+                catalog=run_catalog,
+                model_store=model_store,
+                table_cache_dir=table_cache_dir,
+            )
+        elif args.continuation_param:
+            if ":" in args.continuation_values:
+                start, stop, num = args.continuation_values.split(":")
+                values = np.linspace(float(start), float(stop), int(num)).tolist()
+            else:
+                values = [float(v) for v in args.continuation_values.split(",")]
+
+            continuation(
+                config=cfg,
+                data_path=args.data_path,
+                parameter=args.continuation_param,
+                values=values,
+                seed=args.seed,
+                cache=result_cache,
+                model_store=model_store,
+                table_cache_dir=table_cache_dir,
+                initial_state=initial_state,
+                catalog=run_catalog,
+            )
+        else:
+            main(
+                cfg,
+                data_path=args.data_path,
+                seed=args.seed,
+                cache=result_cache,
+                model_store=model_store,
+                table_cache_dir=table_cache_dir,
+                initial_state=initial_state,
+                catalog=run_catalog,
+            )
@@ -0,0 +1,46 @@
+from ensm.cache import ResultCache
+
+import sqlite3
+import time
+import os
+
+
+def test_put_and_get(tmp_path):
+    cache = ResultCache(path=str(tmp_path / "results.sqlite"))
+    cache.put("key", {"summary": {"outcome": "converged"}})
+
+    assert cache.get("key") == {"summary": {"outcome": "converged"}}
+    assert cache.get("other key") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_reads_do_not_wait_for_writers(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    cache = ResultCache(path=path, timeout=5.0)
+    cache.put("key", "result")
+
+    # Another process holds the write lock
+    writer = sqlite3.connect(path, isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        start = time.perf_counter()
+        assert cache.get("other key") is None
+        assert len(cache) == 1
+        assert time.perf_counter() - start < 1.0
+    finally:
+        writer.execute("ROLLBACK")
+        writer.close()
+
+
+def test_key_of_payoff_files(tmp_path):
+    path = tmp_path / "payoffs.npy"
+    path.write_bytes(b"payoffs")
+    config = {"games": [{"utilities": {"file": str(path)}}]}
+
+    key = ResultCache.key(config=config, seed=0)
+    assert ResultCache.key(config=config, seed=0) == key
+
+    # Files are hashed again once they change
+    path.write_bytes(b"other payoffs")
+    os.utime(path, ns=(0, 0))
+    assert ResultCache.key(config=config, seed=0) != key
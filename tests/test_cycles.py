@@ -0,0 +1,47 @@
+from ensm.cycles import CycleDetector
+
+import numpy as np
+
+CONTEXTS = ["left", "right"]
+ACTION_SPACES = {"left": ["go", "stop"], "right": ["go", "stop"]}
+
+
+def _observe(trajectory, tolerance=1e-6):
+    """ Observes a trajectory of go frequencies, returning the detector and the first generation found cycling """
+    detector = CycleDetector(
+        contexts=CONTEXTS, action_spaces=ACTION_SPACES, tolerance=tolerance, window=200
+    )
+    for generation, go_freqs in enumerate(trajectory):
+        state = np.ravel([[freq, 1 - freq] for freq in go_freqs])
+        context_freqs = {
+            c: {"go": freq, "stop": 1 - freq} for c, freq in zip(CONTEXTS, go_freqs)
+        }
+        if detector.observe(
+            generation=generation, state=state, context_freqs=context_freqs
+        ):
+            return detector, generation
+
+    return detector, None
+
+
+def _oscillation(num_generations, period, damping=1.0):
+    generations = np.arange(num_generations)[:, np.newaxis]
+    phases = np.array([0.0, np.pi / 2])
+    return 0.5 + 0.3 * damping ** generations * np.sin(
+        2 * np.pi * generations / period + phases
+    )
+
+
+def test_periodic_trajectory():
+    detector, generation = _observe(_oscillation(num_generations=500, period=25))
+
+    assert generation is not None
+    assert detector.period == 25
+    for amplitude in detector.amplitudes.values():
+        assert abs(amplitude - 0.6) < 0.01
+
+
+def test_convergent_trajectory():
+    _, generation = _observe(_oscillation(num_generations=500, period=25, damping=0.9))
+
+    assert generation is None
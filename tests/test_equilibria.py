@@ -0,0 +1,140 @@
+from ensm.equilibria import EquilibriumSolver
+from ensm.payoffs import PayoffTable
+from sense.sense import _create_verified_ensm
+
+import ruamel.yaml as ruamel
+import numpy as np
+import pytest
+
+ACTION_SPACES = [["heads", "tails"], ["heads", "tails"]]
+
+MATCHING_PENNIES = PayoffTable.from_mapping(
+    mapping={
+        ("heads", "heads"): [1.0, -1.0],
+        ("heads", "tails"): [-1.0, 1.0],
+        ("tails", "heads"): [-1.0, 1.0],
+        ("tails", "tails"): [1.0, -1.0],
+    },
+    action_spaces=ACTION_SPACES,
+)
+
+COORDINATION = PayoffTable.from_mapping(
+    mapping={
+        ("heads", "heads"): [2.0, 2.0],
+        ("heads", "tails"): [0.0, 0.0],
+        ("tails", "heads"): [0.0, 0.0],
+        ("tails", "tails"): [1.0, 1.0],
+    },
+    action_spaces=ACTION_SPACES,
+)
+
+# A coordination game played by two contexts, one of which also plays a second game
+CONFIG = """
+name: Coordination
+stabilityMargin: 1e-10
+maxGenerations: 10000
+minNumStableGenerations: 200
+regulate: false
+games:
+  - name: Coordination game
+    contexts: [row, column]
+    utilities:
+      ('heads', 'heads'): 2.0
+      ('heads', 'tails'): 0.0
+      ('tails', 'heads'): 0.0
+      ('tails', 'tails'): 1.0
+  - name: Other game
+    contexts: [other, other]
+    utilities:
+      ('heads', 'heads'): 1.0
+      ('heads', 'tails'): 0.0
+      ('tails', 'heads'): 0.0
+      ('tails', 'tails'): 1.0
+gameDependencies:
+  ('Coordination game', 1): ('Other game', 0)
+population:
+  - name: Players
+    proportion: 1.0
+    gamePayoffs:
+      - gameName: Coordination game
+        payoffs:
+          ('heads', 'heads'): [2.0, 2.0]
+          ('heads', 'tails'): [0.0, 0.0]
+          ('tails', 'heads'): [0.0, 0.0]
+          ('tails', 'tails'): [1.0, 1.0]
+      - gameName: Other game
+        payoffs:
+          ('heads', 'heads'): [1.0, 1.0]
+          ('heads', 'tails'): [0.0, 0.0]
+          ('tails', 'heads'): [0.0, 0.0]
+          ('tails', 'tails'): [1.0, 1.0]
+"""
+
+
+def _strategies(equilibria):
+    """ Returns the equilibria as a sorted list of tuples of the probability of heads of each role """
+    return sorted(
+        (round(row["heads"], 9), round(column["heads"], 9))
+        for row, column in equilibria
+    )
+
+
+def test_matching_pennies():
+    assert _strategies(EquilibriumSolver.solve(MATCHING_PENNIES)) == [(0.5, 0.5)]
+
+
+def test_coordination_game():
+    assert _strategies(EquilibriumSolver.solve(COORDINATION)) == [
+        (0.0, 0.0),
+        (round(1 / 3, 9), round(1 / 3, 9)),
+        (1.0, 1.0),
+    ]
+
+
+def test_solve_batch():
+    payoffs = np.stack([MATCHING_PENNIES.array, COORDINATION.array])
+    row_strategies, col_strategies = EquilibriumSolver.solve_batch(
+        row_payoffs=payoffs[..., 0], col_payoffs=payoffs[..., 1]
+    )
+
+    assert [len(xs) for xs in row_strategies] == [1, 3]
+    np.testing.assert_allclose(row_strategies[0], [[0.5, 0.5]])
+    np.testing.assert_allclose(col_strategies[0], [[0.5, 0.5]])
+    for x, y in zip(row_strategies[1], col_strategies[1]):
+        np.testing.assert_allclose(x, y)
+
+
+def test_seed_and_cross_check():
+    config = ruamel.YAML().load(CONFIG)
+    ensm = _create_verified_ensm(
+        config=config, reference=False, seed_sequence=np.random.SeedSequence(0)
+    )
+    (sub_population,) = ensm.mas.population
+    equilibria = EquilibriumSolver.population_equilibria(ensm=ensm)
+    coordination = equilibria[(str(sub_population), "Coordination game")]
+    unseeded_freqs = {
+        context: dict(sub_population.action_freqs[context][None])
+        for context in ("other", "column & other")
+    }
+
+    # The row and column contexts only play the coordination game, and are seeded near the equilibrium where
+    # both play heads. The contexts that play several game roles keep their frequencies
+    index = [i for i, eq in enumerate(coordination) if eq[0]["heads"] == 1.0][0]
+    EquilibriumSolver.seed(
+        ensm=ensm,
+        equilibria={k: eqs[index] for k, eqs in equilibria.items() if len(eqs) > index},
+        mixing=0.01,
+    )
+    assert sub_population.action_freqs["row"][None]["heads"] >= 0.99
+    assert sub_population.action_freqs["column"][None]["heads"] >= 0.99
+    for context, freqs in unseeded_freqs.items():
+        assert dict(sub_population.action_freqs[context][None]) == pytest.approx(freqs)
+
+    while not ensm.finished:
+        ensm.evolve()
+
+    nearest, distance = EquilibriumSolver.cross_check(ensm=ensm, equilibria=equilibria)[
+        (str(sub_population), "Coordination game")
+    ]
+    assert coordination[nearest][0]["heads"] in (0.0, 1.0)
+    assert distance < 1e-6
@@ -0,0 +1,31 @@
+from sense.sense import _create_games
+
+import ruamel.yaml as ruamel
+import os
+
+EXAMPLE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "config",
+    "mas",
+    "examples",
+    "2_games-2-sub_populations.yaml",
+)
+
+
+def test_topology_matches_network():
+    with open(EXAMPLE_PATH, "r") as f:
+        games_net = _create_games(config=ruamel.YAML().load(f))
+    topology = games_net.freeze()
+
+    for context in topology.contexts:
+        played_roles = games_net.played_roles(context)
+        assert isinstance(played_roles, tuple)
+        assert set(played_roles) == set(topology.played_roles(context))
+
+    for game, role in topology.game_roles:
+        contexts_playing = games_net.contexts_playing(game, role)
+        assert isinstance(contexts_playing, tuple)
+        assert set(contexts_playing) == set(topology.contexts_playing(game, role))
+        assert set(topology.dependencies(game, role)) == games_net.dependencies(
+            game, role
+        )
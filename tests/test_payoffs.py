@@ -0,0 +1,58 @@
+from ensm.payoffs import load_payoff_table
+
+import numpy as np
+import pytest
+import os
+
+ACTION_SPACES = [["go", "stop"], ["go", "stop", "acc"]]
+
+
+def _write_csv(path):
+    """ Writes a table with the payoff of each role of each action combination, returning its array """
+    array = np.arange(12, dtype=np.float64).reshape(2, 3, 2)
+    np.savetxt(path, array.reshape(6, 2), delimiter=",")
+    return array
+
+
+def test_csv_table_in_memory(tmp_path):
+    array = _write_csv(tmp_path / "payoffs.csv")
+
+    table = load_payoff_table(
+        table_cfg={"file": str(tmp_path / "payoffs.csv")},
+        num_roles=2,
+        action_spaces=ACTION_SPACES,
+    )
+    assert not isinstance(table.array, np.memmap)
+    assert list(table[("stop", "acc")]) == list(array[1, 2])
+    assert os.listdir(tmp_path) == ["payoffs.csv"]
+
+
+def test_csv_table_in_cache_dir(tmp_path):
+    data_dir, cache_dir = tmp_path / "data", tmp_path / "cache"
+    data_dir.mkdir()
+    array = _write_csv(data_dir / "payoffs.csv")
+
+    table = load_payoff_table(
+        table_cfg={"file": str(data_dir / "payoffs.csv")},
+        num_roles=2,
+        action_spaces=ACTION_SPACES,
+        cache_dir=str(cache_dir),
+    )
+    assert isinstance(table.array, np.memmap)
+    np.testing.assert_array_equal(table.array, array)
+    assert os.listdir(data_dir) == ["payoffs.csv"]
+    assert len(os.listdir(cache_dir)) == 1
+
+
+def test_table_with_other_actions(tmp_path):
+    _write_csv(tmp_path / "payoffs.csv")
+
+    with pytest.raises(AssertionError, match="do not match the actions"):
+        load_payoff_table(
+            table_cfg={
+                "file": str(tmp_path / "payoffs.csv"),
+                "actions": [["stop", "go"], ["go", "stop", "acc"]],
+            },
+            num_roles=2,
+            action_spaces=ACTION_SPACES,
+        )
@@ -0,0 +1,61 @@
+from sense.sense import _create_verified_ensm
+
+import numpy as np
+import ruamel.yaml as ruamel
+import pytest
+import copy
+import os
+
+EXAMPLE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "config",
+    "mas",
+    "examples",
+    "2_games-2-sub_populations.yaml",
+)
+
+
+def _load_example():
+    with open(EXAMPLE_PATH, "r") as f:
+        return ruamel.YAML().load(f)
+
+
+def _run(config, seed):
+    """ Evolves a configuration until it finishes, returning the engine """
+    ensm = _create_verified_ensm(
+        config=config, reference=False, seed_sequence=np.random.SeedSequence(seed)
+    )
+    while not ensm.finished:
+        ensm.evolve()
+    return ensm
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_pruned_run_matches_unpruned_run(seed):
+    config = _load_example()
+    pruned_config = copy.deepcopy(config)
+    pruned_config["extinctionPruning"] = {}
+
+    unpruned = _run(config, seed)
+    pruned = _run(pruned_config, seed)
+
+    assert pruned.active_set.num_actions < sum(
+        len(actions) for actions in pruned.action_spaces.values()
+    )
+    assert pruned.outcome == unpruned.outcome
+    assert pruned.num_generations == unpruned.num_generations
+    assert pruned.dominant_actions() == unpruned.dominant_actions()
+    np.testing.assert_allclose(
+        pruned.state_vector(), unpruned.state_vector(), rtol=0, atol=1e-8
+    )
+
+
+def test_pruning_requires_standard_replicator():
+    config = _load_example()
+    config["extinctionPruning"] = {}
+    config["replicator"] = "log"
+
+    with pytest.raises(AssertionError, match="standard"):
+        _create_verified_ensm(
+            config=config, reference=False, seed_sequence=np.random.SeedSequence(0)
+        )
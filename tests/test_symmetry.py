@@ -0,0 +1,56 @@
+from sense.sense import _create_model
+
+import ruamel.yaml as ruamel
+import pytest
+import os
+
+EXAMPLE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "config",
+    "mas",
+    "examples",
+    "2_games-2-sub_populations.yaml",
+)
+
+
+def _load_example(symmetric_game):
+    with open(EXAMPLE_PATH, "r") as f:
+        config = ruamel.YAML().load(f)
+    for game_cfg in config["games"]:
+        if game_cfg["name"] == symmetric_game:
+            game_cfg["symmetric"] = True
+    return config
+
+
+def test_declared_symmetric_game():
+    games_net, _ = _create_model(config=_load_example("Intersection game"))
+    assert games_net.games["Intersection game"].symmetric
+    assert not games_net.games["Prevention game"].symmetric
+
+
+def test_declared_symmetric_game_with_asymmetric_payoffs():
+    with pytest.raises(AssertionError, match="Aggressive drivers in symmetric game"):
+        _create_model(config=_load_example("Prevention game"))
+
+
+def test_auto_symmetric_game_with_asymmetric_contexts():
+    # The payoffs of the Intersection game are symmetric, but its roles are played by different contexts
+    config = _load_example("Intersection game")
+    for game_cfg in config["games"]:
+        if game_cfg["name"] == "Intersection game":
+            game_cfg["symmetric"] = "auto"
+
+    games_net, _ = _create_model(config=config)
+    assert not games_net.games["Intersection game"].symmetric
+
+
+def test_auto_symmetric_game_with_symmetric_contexts():
+    config = _load_example("Intersection game")
+    for game_cfg in config["games"]:
+        if game_cfg["name"] == "Intersection game":
+            game_cfg["contexts"] = ["front(car-crossing)", "front(car-crossing)"]
+            game_cfg["symmetric"] = "auto"
+    config["gameDependencies"] = {}
+
+    games_net, _ = _create_model(config=config)
+    assert games_net.games["Intersection game"].symmetric
@@ -0,0 +1,81 @@
+from sense.sense import verify
+
+import ruamel.yaml as ruamel
+import pytest
+import json
+import os
+
+EXAMPLES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "config",
+    "mas",
+    "examples",
+)
+
+
+def _load_example(name):
+    with open(os.path.join(EXAMPLES_PATH, name), "r") as f:
+        return ruamel.YAML().load(f)
+
+
+def _verify(config, data_path, num_generations=300, sample_interval=None):
+    """ Verifies the optimised engines of a configuration against the reference ones, returning the report """
+    verify(
+        config=config,
+        data_path=str(data_path),
+        num_generations=num_generations,
+        sample_interval=sample_interval,
+        seed=0,
+    )
+    with open(os.path.join(data_path, "verify.json"), "r") as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("name", sorted(os.listdir(EXAMPLES_PATH)))
+def test_examples(name, tmp_path):
+    report = _verify(_load_example(name), tmp_path)
+    assert report["num_checks"] > 0
+    assert report["passed"], report["violations"][:5]
+
+
+def test_log_replicator(tmp_path):
+    config = _load_example("2_games-2-sub_populations.yaml")
+    config["replicator"] = "log"
+    config["selectionStrength"] = 2.0
+
+    report = _verify(config, tmp_path)
+    assert report["passed"], report["violations"][:5]
+
+
+def test_sanctions(tmp_path):
+    config = _load_example("2_games-2-sub_populations.yaml")
+    config["regulate"] = True
+    for game_cfg in config["games"]:
+        game_cfg["sanctions"] = [0.0, 0.5]
+
+    report = _verify(config, tmp_path)
+    assert report["passed"], report["violations"][:5]
+
+
+def test_extinction_pruning(tmp_path):
+    # The frozen frequencies of the pruned actions deviate from the reference by less than the threshold in
+    # each generation, but the deviations accumulate when both runs evolve side by side
+    config = _load_example("2_games-2-sub_populations.yaml")
+    config["extinctionPruning"] = {"threshold": 1e-9}
+
+    report = _verify(config, tmp_path, sample_interval=1)
+    assert report["tolerance"] == 2e-9
+    assert report["passed"], report["violations"][:5]
+
+
+def test_symmetric_games(tmp_path):
+    # Pooling the roles of a symmetric game is exact when all its roles are played in the same contexts
+    config = _load_example("2_games-2-sub_populations.yaml")
+    for game_cfg in config["games"]:
+        if game_cfg["name"] == "Intersection game":
+            game_cfg["contexts"] = ["front(car-crossing)", "front(car-crossing)"]
+            game_cfg["symmetric"] = True
+    config["gameDependencies"] = {}
+
+    report = _verify(config, tmp_path)
+    assert report["passed"], report["violations"][:5]
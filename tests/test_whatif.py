@@ -0,0 +1,107 @@
+from ensm.whatif import WhatIfEvaluator
+from ensm.norms import Norm
+from sense.sense import _create_verified_ensm
+
+import ruamel.yaml as ruamel
+import numpy as np
+import pytest
+import os
+
+EXAMPLE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "config",
+    "mas",
+    "examples",
+    "2_games-2-sub_populations.yaml",
+)
+
+# A coordination game where the row player is regulated
+CONFIG = """
+name: Coordination
+stabilityMargin: 1e-10
+maxGenerations: 10000
+minNumStableGenerations: 200
+regulate: false
+games:
+  - name: Coordination game
+    contexts: [row, column]
+    utilities:
+      ('a', 'a'): 1.0
+      ('a', 'b'): 0.0
+      ('b', 'a'): 0.0
+      ('b', 'b'): 2.0
+population:
+  - name: Players
+    proportion: 1.0
+    gamePayoffs:
+      - gameName: Coordination game
+        payoffs:
+          ('a', 'a'): [1.0, 1.0]
+          ('a', 'b'): [0.0, 0.0]
+          ('b', 'a'): [0.0, 0.0]
+          ('b', 'b'): [2.0, 2.0]
+"""
+
+
+def _create_ensm(config):
+    return _create_verified_ensm(
+        config=config, reference=False, seed_sequence=np.random.SeedSequence(0)
+    )
+
+
+def test_zero_payoff_deltas():
+    with open(EXAMPLE_PATH, "r") as f:
+        config = ruamel.YAML().load(f)
+    config["regulate"] = True
+    for game_cfg in config["games"]:
+        game_cfg["sanctions"] = [0.0, 0.5]
+
+    # Evolve some generations, and then update the fitness of the ENSM with its current frequencies
+    ensm = _create_ensm(config)
+    for _ in range(20):
+        ensm.evolve()
+    ensm._update_fitness()
+
+    evaluator = WhatIfEvaluator(ensm=ensm)
+    for sub_population in ensm.mas.population:
+        game = ensm.games_net.games["Intersection game"]
+        result = evaluator.evaluate_payoff_deltas(
+            sub_population=str(sub_population),
+            game=game.name,
+            deltas=np.zeros((1,) + sub_population.payoff[game].array.shape),
+        )
+
+        for context, norm_fitness in result["fitness"][str(sub_population)].items():
+            for norm, fitness in norm_fitness.items():
+                expected = [
+                    sub_population.fitness[context][norm][a]
+                    for a in ensm.action_spaces[context]
+                ]
+                # Both compute the same sums, up to the rounding of their order
+                np.testing.assert_allclose(fitness[0], expected, rtol=0, atol=1e-15)
+
+
+def test_sanctioned_norm():
+    ensm = _create_ensm(ruamel.YAML().load(CONFIG))
+    ensm.warm_start(
+        snapshot={
+            "action_freqs": {
+                "Players": {
+                    "row": {None: {"a": 0.2, "b": 0.8}},
+                    "column": {None: {"a": 0.6, "b": 0.4}},
+                }
+            },
+            "norm_freqs": {},
+        }
+    )
+
+    # Half of the row players comply with the norm, so they play a with frequency 0.5 * 0.2 + 0.5 = 0.6. Against
+    # the column players, a earns 1 * 0.6 and b earns 2 * 0.4 - 0.3, since b violates the norm
+    result = WhatIfEvaluator(ensm=ensm).evaluate_norms(
+        norms=[Norm("row", "a", 0.3)], compliance=0.5
+    )
+
+    np.testing.assert_allclose(result["fitness"]["Players"]["row"], [[0.6, 0.5]])
+    np.testing.assert_allclose(result["fitness"]["Players"]["column"], [[0.6, 0.8]])
+    assert result["utilities"] == pytest.approx([0.6 * 0.6 + 0.4 * 0.5])
+    assert result["mean_fitness"]["column"] == pytest.approx([0.6 * 0.6 + 0.4 * 0.8])